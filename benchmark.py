@@ -0,0 +1,619 @@
+"""Throughput and latency benchmark for the Autonomous Brand Agent endpoints.
+
+By default every scenario runs in-process: requests go through
+``httpx.ASGITransport`` straight into ``main.app`` and all provider traffic is
+served by the local simulator (``SIMULATE_PROVIDERS=True``), so no quota is
+spent. Pass ``--target http://host:port`` to drive an already running server
+instead.
+
+``--cold-start`` measures startup instead: fresh interpreters import the app,
+run its startup hook and answer a health check and a first campaign request,
+and one extra run under ``python -X importtime`` lists the slowest imports.
+
+``--serialization`` compares encoding a multi-demographic response the way
+FastAPI does by default (validate against the response model, then the
+standard JSON encoder) with the app's fast path, and reports payload sizes
+raw, compressed and with a ``fields=`` projection.
+
+Examples:
+    python benchmark.py --scenario response-ad --concurrency 32 --requests 500
+    python benchmark.py --scenario multi --rate 2 --duration 60
+    python benchmark.py --compare bench_results/previous.json --fail-on-regression
+    python benchmark.py --cold-start --compare bench_results/previous-cold.json
+    python benchmark.py --serialization
+    python benchmark.py --scenario multi --batch-concurrency 16   # interactive latency under a batch job
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+# --- 1. SCENARIOS ---
+
+CITIES: List[Tuple[str, str]] = [
+    ("New York", "US"),
+    ("Sydney", "AU"),
+    ("London", "GB"),
+]
+
+COMPETITOR_ADS = [
+    "Fuel your hustle with rivals' iced blend. Limited time offer, all buzz, no crash.",
+    "The only cold brew that keeps up with you. Now 2 for 1.",
+    "Smooth, bold and brewed for summer. Taste the difference today.",
+]
+
+
+def _response_ad_payload(index: int) -> Dict[str, Any]:
+    return {"competitor_ad_text": COMPETITOR_ADS[index % len(COMPETITOR_ADS)]}
+
+
+def _opportunity_payload(index: int) -> Dict[str, Any]:
+    city, _ = CITIES[index % len(CITIES)]
+    return {"brand_rules": "Premium, sustainable, modern on-the-go lifestyle.", "city": city}
+
+
+def _multi_payload(index: int) -> Dict[str, Any]:
+    city, country = CITIES[index % len(CITIES)]
+    return {"city": city, "country_code": country}
+
+
+SCENARIOS: Dict[str, Tuple[str, Callable[[int], Dict[str, Any]]]] = {
+    "response-ad": ("/generate-response-ad", _response_ad_payload),
+    "opportunity": ("/generate_opportunity_campaign", _opportunity_payload),
+    "multi": ("/generate_multi_demographic_campaign", _multi_payload),
+}
+
+# Compared against a previous run: (metric path, True if higher is better)
+REGRESSION_METRICS = [
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("latency_ms", "p99"), False),
+    (("throughput_rps",), True),
+    (("import_ms", "p50"), False),
+    (("ready_ms", "p50"), False),
+    (("first_request_ms", "p50"), False),
+    (("encode_us", "p50"), False),
+    (("payload_bytes", "compressed"), False),
+]
+
+# Projection a list view would request: identifiers and headlines, no long text.
+LIST_VIEW_FIELDS = "id,created_at,city,season,segment,campaign.headline,campaign.image_url"
+MULTI_SUMMARY_FIELDS = "city,season,recommended_product,campaigns.demographic_segment,campaigns.headline"
+
+# Runs in a fresh interpreter; phases are measured from the start of the script.
+COLD_START_PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import httpx
+import main
+imported = time.perf_counter()
+
+async def probe():
+    async with main.app.router.lifespan_context(main.app):
+        started_up = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600.0) as client:
+            await client.get("/")
+            ready = time.perf_counter()
+            response = await client.post("/generate-response-ad", json={payload!r})
+            answered = time.perf_counter()
+    return started_up, ready, answered, response.status_code
+
+started_up, ready, answered, status = asyncio.run(probe())
+print("COLD_START " + json.dumps({{
+    "import": imported - started, "startup": started_up - started, "ready": ready - started,
+    "first_request": answered - started, "status": status,
+}}))
+"""
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark endpoint throughput and latency percentiles.")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="Endpoint scenario to run (repeatable; default: all).",
+    )
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum in-flight requests (default: 8).")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Open-loop arrival rate in requests/second (Poisson). Default: closed loop at full concurrency.",
+    )
+    parser.add_argument("--requests", type=int, default=50, help="Requests per scenario (default: 50).")
+    parser.add_argument("--duration", type=float, default=None, help="Stop each scenario after N seconds.")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured warm-up requests per scenario.")
+    parser.add_argument("--target", default=None, help="Base URL of a running server (default: in-process).")
+    parser.add_argument("--output", default=None, help="Where to write the JSON results.")
+    parser.add_argument("--compare", default=None, help="Previous results file to compare against.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.10,
+        help="Relative change treated as a regression when comparing (default: 0.10).",
+    )
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on regressions.")
+    parser.add_argument("--verbose", action="store_true", help="Show the application's own log output.")
+    parser.add_argument(
+        "--priority", default=None, help="X-Priority header sent with measured requests (interactive or batch)."
+    )
+    parser.add_argument(
+        "--batch-concurrency",
+        type=int,
+        default=0,
+        help="Unmeasured X-Priority: batch requests kept in flight alongside the measured ones (default: 0).",
+    )
+    parser.add_argument(
+        "--cold-start",
+        action="store_true",
+        help="Measure import, startup and time-to-first-request in fresh processes instead of load.",
+    )
+    parser.add_argument("--cold-start-runs", type=int, default=5, help="Fresh processes to time (default: 5).")
+    parser.add_argument(
+        "--serialization",
+        action="store_true",
+        help="Measure response encoding CPU and payload sizes instead of load.",
+    )
+    parser.add_argument(
+        "--serialization-iterations", type=int, default=2000, help="Encodings timed per path (default: 2000)."
+    )
+    return parser.parse_args()
+
+
+# --- 2. MEASUREMENT ---
+
+async def _monitor_loop_lag(samples: List[float], stop: asyncio.Event, interval: float = 0.05) -> None:
+    """Samples how late the event loop wakes up; large values mean something blocked it."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+
+async def _run_scenario(
+    client: httpx.AsyncClient,
+    name: str,
+    args: argparse.Namespace,
+    in_process: bool,
+) -> Dict[str, Any]:
+    from utils.metrics import reset_stages, snapshot_stages, summarize
+
+    path, make_payload = SCENARIOS[name]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    headers = {"X-Priority": args.priority} if args.priority else {}
+
+    async def send(index: int, record: bool = True) -> None:
+        started = time.perf_counter()
+        try:
+            response = await client.post(path, json=make_payload(index), headers=headers)
+            outcome = str(response.status_code)
+        except httpx.HTTPError as exc:
+            outcome = type(exc).__name__
+        if record:
+            statuses[outcome] += 1
+            if outcome == "200":
+                latencies.append(time.perf_counter() - started)
+
+    for index in range(args.warmup):
+        await send(index, record=False)
+
+    simulator_before = _simulator_stats() if in_process else {}
+    reset_stages()
+    lag_samples: List[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_monitor_loop_lag(lag_samples, stop))
+
+    # Background batch load competing for the same provider capacity.
+    batch_done: Counter = Counter()
+
+    async def batch_worker(offset: int) -> None:
+        batch_headers = {"X-Priority": "batch", "X-Tenant-ID": "benchmark-batch"}
+        for index in range(offset, sys.maxsize, max(args.batch_concurrency, 1)):
+            try:
+                response = await client.post(path, json=make_payload(index), headers=batch_headers)
+                batch_done[str(response.status_code)] += 1
+            except httpx.HTTPError as exc:
+                batch_done[type(exc).__name__] += 1
+
+    batch_tasks = [asyncio.create_task(batch_worker(offset)) for offset in range(args.batch_concurrency)]
+
+    started = time.perf_counter()
+    deadline = started + args.duration if args.duration else None
+
+    def keep_going(sent: int) -> bool:
+        if deadline is not None:
+            return time.perf_counter() < deadline
+        return sent < args.requests
+
+    if args.rate:
+        # Open loop: arrivals follow a Poisson process regardless of completions.
+        semaphore = asyncio.Semaphore(args.concurrency)
+        pending = []
+
+        async def limited(index: int) -> None:
+            async with semaphore:
+                await send(index)
+
+        sent = 0
+        next_arrival = started
+        while keep_going(sent):
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            pending.append(asyncio.create_task(limited(sent)))
+            sent += 1
+            next_arrival += random.expovariate(args.rate)
+        await asyncio.gather(*pending)
+    else:
+        # Closed loop: each worker sends its next request as soon as the last one finishes.
+        counter = iter(range(sys.maxsize))
+
+        async def worker() -> None:
+            while True:
+                index = next(counter)
+                if not keep_going(index):
+                    return
+                await send(index)
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+    for task in batch_tasks:
+        task.cancel()
+    await asyncio.gather(*batch_tasks, return_exceptions=True)
+
+    result: Dict[str, Any] = {
+        "endpoint": path,
+        "requests": sum(statuses.values()),
+        "succeeded": statuses.get("200", 0),
+        "statuses": dict(statuses),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(statuses.get("200", 0) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": summarize(latencies),
+        "event_loop_lag_ms": summarize(lag_samples),
+    }
+    if batch_tasks:
+        result["batch_statuses"] = dict(batch_done)
+    if in_process:
+        result["stages_ms"] = snapshot_stages()
+        result["provider_calls"] = _diff_stats(simulator_before, _simulator_stats())
+    return result
+
+
+def _spawn_probe(extra_flags: List[str]) -> Tuple[Dict[str, Any], str, float]:
+    """Runs the cold-start probe once; returns its phases, its stderr and the process wall time."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    script = COLD_START_PROBE.format(root=root, payload=_response_ad_payload(0))
+    env = dict(os.environ)
+    env.setdefault("SIMULATE_PROVIDERS", "True")
+    env.setdefault("SIMULATOR_LLM_LATENCY_MS", "0")  # Time the app, not the simulated provider
+    env.setdefault("ANALYTICS_SINK", "none")
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, *extra_flags, "-c", script], capture_output=True, text=True, env=env, cwd=root
+    )
+    wall = time.perf_counter() - started
+    for line in completed.stdout.splitlines():
+        if line.startswith("COLD_START "):
+            return json.loads(line[len("COLD_START "):]), completed.stderr, wall
+    raise RuntimeError(f"Cold-start probe failed:\n{completed.stderr[-2000:]}")
+
+
+def _slowest_imports(importtime_log: str, limit: int = 15) -> List[Dict[str, Any]]:
+    """Packages by cumulative import time (including what they import), from ``-X importtime`` output."""
+    entries = []  # (depth, module, cumulative microseconds), children listed before their parent
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, raw_name = line[len("import time:"):].split("|")
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        entries.append((depth, raw_name.strip(), int(cumulative)))
+
+    totals: Dict[str, int] = {}
+    parents: List[str] = []
+    for depth, module, cumulative in reversed(entries):
+        del parents[depth:]
+        package = module.split(".")[0]
+        # Count a package where it is entered from another one, not again for its own submodules.
+        if package != "main" and (not parents or parents[-1] != package):
+            totals[package] = totals.get(package, 0) + cumulative
+        parents.append(package)
+    ranked = sorted(totals.items(), key=lambda item: -item[1])[:limit]
+    return [{"module": name, "cumulative_ms": round(micros / 1000, 1)} for name, micros in ranked]
+
+
+def _run_cold_start(args: argparse.Namespace) -> Dict[str, Any]:
+    from utils.metrics import summarize
+
+    phases: Dict[str, List[float]] = {"import": [], "startup": [], "ready": [], "first_request": [], "process": []}
+    statuses: Counter = Counter()
+    for _ in range(args.cold_start_runs):
+        result, _, wall = _spawn_probe([])
+        for phase in ("import", "startup", "ready", "first_request"):
+            phases[phase].append(result[phase])
+        phases["process"].append(wall)
+        statuses[str(result["status"])] += 1
+    _, importtime_log, _ = _spawn_probe(["-X", "importtime"])
+    return {
+        "endpoint": "cold start",
+        "runs": args.cold_start_runs,
+        "statuses": dict(statuses),
+        **{f"{phase}_ms": summarize(samples) for phase, samples in phases.items()},
+        "slowest_imports": _slowest_imports(importtime_log),
+    }
+
+
+def _finish(coroutine: Any) -> Any:
+    """Result of a coroutine that never suspends, without an event-loop round trip."""
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("coroutine suspended")
+
+
+def _time_encoding(encode: Callable[[], bytes], iterations: int) -> Tuple[Dict[str, float], float]:
+    """Per-encoding wall time in microseconds, and total CPU milliseconds, over ``iterations`` runs."""
+    from utils.metrics import summarize
+
+    samples = []
+    cpu_started = time.process_time()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        encode()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples, scale=1_000_000), round((time.process_time() - cpu_started) * 1000, 1)
+
+
+async def _run_serialization(args: argparse.Namespace, quiet: Any) -> Dict[str, Any]:
+    from fastapi.routing import serialize_response
+
+    os.environ.setdefault("SIMULATE_PROVIDERS", "True")
+    with quiet:
+        import main
+    from utils.serialization import brotli, compress, dumps, parse_fields, project
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600.0) as client:
+            with quiet:
+                for index in range(len(CITIES)):
+                    response = await client.post(SCENARIOS["multi"][0], params={"fresh": "true"}, json=_multi_payload(index))
+                    response.raise_for_status()
+                await main.flush_pending_writes()
+            payload = response.json()
+
+            # Wire sizes of the stored-campaign list view as a client sees them.
+            list_bytes = {}
+            for label, params, encoding in (
+                ("full", {}, "identity"),
+                ("full_compressed", {}, "br, gzip"),
+                ("projected", {"fields": LIST_VIEW_FIELDS}, "identity"),
+                ("projected_compressed", {"fields": LIST_VIEW_FIELDS}, "br, gzip"),
+            ):
+                listing = await client.get("/campaigns", params={"limit": 50, **params}, headers={"Accept-Encoding": encoding})
+                await listing.aread()
+                list_bytes[label] = listing.num_bytes_downloaded
+
+    model = main.MultiDemographicResponse.model_validate(payload)
+    route = next(route for route in main.app.routes if getattr(route, "path", None) == SCENARIOS["multi"][0])
+
+    def legacy() -> bytes:
+        # FastAPI's default: validate against response_model, then JSONResponse's encoder.
+        content = _finish(serialize_response(field=route.response_field, response_content=model))
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def fast() -> bytes:
+        return dumps(model)
+
+    legacy_us, legacy_cpu = _time_encoding(legacy, args.serialization_iterations)
+    fast_us, fast_cpu = _time_encoding(fast, args.serialization_iterations)
+    body = fast()
+    summary = dumps(project(model, parse_fields(MULTI_SUMMARY_FIELDS, main.MultiDemographicResponse)))
+    best = "br" if brotli is not None else "gzip"
+    return {
+        "endpoint": SCENARIOS["multi"][0],
+        "iterations": args.serialization_iterations,
+        "legacy_encode_us": legacy_us,
+        "encode_us": fast_us,
+        "cpu_ms": {"legacy": legacy_cpu, "fast": fast_cpu},
+        "payload_bytes": {
+            "legacy": len(legacy()),
+            "json": len(body),
+            "gzip": len(compress(body, "gzip")),
+            **({"br": len(compress(body, "br"))} if brotli is not None else {}),
+            "compressed": len(compress(body, best)),
+            "projected": len(summary),
+            "projected_compressed": len(compress(summary, best)),
+        },
+        "list_bytes": list_bytes,
+    }
+
+
+def _simulator_stats() -> Dict[str, Dict[str, int]]:
+    from utils.provider_simulator import SIMULATE_PROVIDERS, get_simulator
+
+    if not SIMULATE_PROVIDERS:
+        return {}
+    return {name: dict(counters) for name, counters in get_simulator().stats.items()}
+
+
+def _diff_stats(before: Dict[str, Dict[str, int]], after: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, int]]:
+    return {
+        provider: {key: value - before.get(provider, {}).get(key, 0) for key, value in counters.items()}
+        for provider, counters in after.items()
+    }
+
+
+# --- 3. REPORTING ---
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_result(name: str, result: Dict[str, Any]) -> None:
+    latency = result["latency_ms"]
+    lag = result["event_loop_lag_ms"]
+    print(f"\n=== {name} ({result['endpoint']}) ===")
+    print(f"Requests: {result['requests']} | OK: {result['succeeded']} | Statuses: {result['statuses']}")
+    print(f"Throughput: {result['throughput_rps']} req/s over {result['elapsed_seconds']}s")
+    print(f"Latency ms: p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} max={latency['max']}")
+    print(f"Event-loop lag ms: p50={lag['p50']} p99={lag['p99']} max={lag['max']}")
+    if "batch_statuses" in result:
+        print(f"Background batch requests completed: {result['batch_statuses']}")
+    for stage, summary in result.get("stages_ms", {}).items():
+        print(f"  {stage:<28} n={summary['count']:<6} p50={summary['p50']:<10} p95={summary['p95']}")
+
+
+def _print_cold_start(result: Dict[str, Any]) -> None:
+    print(f"\n=== cold start ({result['runs']} fresh processes, statuses {result['statuses']}) ===")
+    for phase in ("import", "startup", "ready", "first_request", "process"):
+        summary = result[f"{phase}_ms"]
+        print(f"  {phase:<16} p50={summary['p50']:<10} max={summary['max']}")
+    print("  Slowest imports (cumulative ms):")
+    for entry in result["slowest_imports"]:
+        print(f"    {entry['module']:<28} {entry['cumulative_ms']}")
+
+
+def _print_serialization(result: Dict[str, Any]) -> None:
+    print(f"\n=== serialization ({result['endpoint']}, {result['iterations']} encodings per path) ===")
+    for label, key in (("default (validate + json)", "legacy_encode_us"), ("fast path", "encode_us")):
+        summary = result[key]
+        print(f"  {label:<26} p50={summary['p50']:<10} p99={summary['p99']:<10} us")
+    print(f"  CPU ms total: {result['cpu_ms']}")
+    print(f"  Response bytes: {result['payload_bytes']}")
+    print(f"  /campaigns list bytes on the wire: {result['list_bytes']}")
+
+
+def _metric(result: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    value: Any = result
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return float(value)
+
+
+def _compare(current: Dict[str, Any], previous: Dict[str, Any], tolerance: float) -> List[str]:
+    """Prints metric deltas against a previous run and returns the regressions found."""
+    regressions = []
+    print(f"\n=== Comparison against {previous.get('meta', {}).get('git_revision') or 'previous run'} ===")
+    for name, result in current["scenarios"].items():
+        baseline = previous.get("scenarios", {}).get(name)
+        if not baseline:
+            continue
+        for path, higher_is_better in REGRESSION_METRICS:
+            new, old = _metric(result, path), _metric(baseline, path)
+            if new is None or not old:
+                continue
+            change = (new - old) / old
+            worse = change < -tolerance if higher_is_better else change > tolerance
+            label = ".".join(path)
+            flag = "  REGRESSION" if worse else ""
+            print(f"  {name:<12} {label:<22} {old:>10.2f} -> {new:>10.2f} ({change:+.1%}){flag}")
+            if worse:
+                regressions.append(f"{name}.{label}")
+    return regressions
+
+
+# --- 4. ENTRY POINT ---
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    scenarios = args.scenario or list(SCENARIOS)
+    results: Dict[str, Any] = {}
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+
+    if args.target:
+        async with httpx.AsyncClient(base_url=args.target, timeout=600.0) as client:
+            for name in scenarios:
+                results[name] = await _run_scenario(client, name, args, in_process=False)
+                _print_result(name, results[name])
+        return results
+
+    os.environ.setdefault("SIMULATE_PROVIDERS", "True")
+    with quiet:
+        import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600.0) as client:
+            for name in scenarios:
+                with quiet:
+                    results[name] = await _run_scenario(client, name, args, in_process=True)
+                _print_result(name, results[name])
+    return results
+
+
+def run() -> None:
+    args = _parse_args()
+    if args.cold_start:
+        scenarios = {"cold-start": _run_cold_start(args)}
+        _print_cold_start(scenarios["cold-start"])
+    elif args.serialization:
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+        scenarios = {"serialization": asyncio.run(_run_serialization(args, quiet))}
+        _print_serialization(scenarios["serialization"])
+    else:
+        scenarios = asyncio.run(_run(args))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "target": args.target or "in-process",
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "requests": args.requests,
+            "duration": args.duration,
+            "priority": args.priority,
+            "batch_concurrency": args.batch_concurrency,
+            "simulator_settings": {
+                key: value for key, value in sorted(os.environ.items())
+                if key.startswith("SIMULATOR_") or key in ("SIMULATE_PROVIDERS", "FREEPIK_POLLING_INTERVAL_SECONDS")
+            },
+        },
+        "scenarios": scenarios,
+    }
+
+    output = args.output or os.path.join(
+        "bench_results", f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = _compare(report, json.load(handle), args.tolerance)
+        if regressions:
+            print(f"\nRegressions detected: {', '.join(regressions)}")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,93 @@
+"""Process-wide settings, read once from the environment and ``.env``.
+
+Every module reads its configuration through the shared ``settings`` object
+instead of calling ``load_dotenv()`` and ``os.getenv`` itself. The first lookup
+loads the repository's ``.env`` file. Variables that are already set in the
+environment win, as with ``load_dotenv``. Each value is parsed once and then
+remembered, so later lookups are dict reads and changing ``os.environ`` after
+startup has no effect.
+
+Print the effective configuration (secrets masked) with::
+
+    python -m config.settings
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOTENV_PATH = os.path.join(_REPO_ROOT, ".env")
+
+_SECRET_MARKERS = ("KEY", "TOKEN", "SECRET", "PASSWORD")
+_TRUE_VALUES = ("true", "1", "yes", "on")
+
+
+class Settings:
+    """
+    Read-once, typed view of the environment.
+
+    Example:
+        settings.get_float("WEATHER_CACHE_TTL_SECONDS", 600)
+        settings.get_bool("SIMULATE_PROVIDERS", False)
+    """
+
+    def __init__(self, dotenv_path: Optional[str] = DOTENV_PATH) -> None:
+        self.dotenv_path = dotenv_path
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._values: Dict[str, Any] = {}
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                if self.dotenv_path and os.path.exists(self.dotenv_path):
+                    from dotenv import load_dotenv
+
+                    load_dotenv(self.dotenv_path, override=False)
+                self._loaded = True
+
+    def _lookup(self, name: str, default: Any, parse: Callable[[str], Any], keep_empty: bool = False) -> Any:
+        if name in self._values:
+            return self._values[name]
+        self._ensure_loaded()
+        raw = os.environ.get(name)
+        value = default if raw is None or (raw == "" and not keep_empty) else parse(raw)
+        self._values[name] = value
+        return value
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """The raw string value; as with ``os.getenv``, a variable set to "" stays ""."""
+        return self._lookup(name, default, str, keep_empty=True)
+
+    def get_bool(self, name: str, default: bool = False) -> bool:
+        return self._lookup(name, default, lambda raw: raw.strip().lower() in _TRUE_VALUES)
+
+    def get_int(self, name: str, default: int = 0) -> int:
+        return self._lookup(name, int(default), int)
+
+    def get_float(self, name: str, default: float = 0.0) -> float:
+        return self._lookup(name, float(default), float)
+
+    def report(self) -> Dict[str, Any]:
+        """Every setting looked up so far and its effective value (secrets masked)."""
+        return {
+            name: "***" if value and name.endswith(_SECRET_MARKERS) else value
+            for name, value in sorted(self._values.items())
+        }
+
+
+settings = Settings()
+
+
+if __name__ == "__main__":
+    import main  # noqa: F401  (importing the app reads every module's settings)
+    from config.settings import settings as app_settings  # the instance the app used, not this __main__ copy
+
+    print(f"Settings read by the application (.env: {app_settings.dotenv_path}):\n")
+    for key, value in app_settings.report().items():
+        print(f"  {key:<36} {value!r}")
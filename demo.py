@@ -75,10 +75,10 @@ async def _run_multi_demo(city: str, country_code: str) -> None:
     print()
 
 
-def _run_competitor_demo(competitor_ad: str) -> None:
+async def _run_competitor_demo(competitor_ad: str) -> None:
     print("=== Competitor Response Demo ===")
     request = main.AdRequest(competitor_ad_text=competitor_ad)
-    response = main.generate_ad(request)
+    response = await main.generate_ad(request)
     print(f"Status: {response.status} | Confidence: {response.confidence_score}")
     print(f"Tagline: {response.generated_tagline}")
     print(f"Ad Copy: {response.ad_copy}")
@@ -91,12 +91,12 @@ async def _run_demo(args: argparse.Namespace) -> None:
     brand_rules = args.brand_rules or main.BRAND_RULES_TEXT
 
     try:
-        if main.tfy_client is None:
+        if not main.llm_configured():
             print("⚠️ Missing TRUEFOUNDRY_API_KEY: skipping campaign generation demos.")
         else:
             await _run_opportunity_demo(args.city, brand_rules)
             await _run_multi_demo(args.city, args.country)
-        _run_competitor_demo(args.competitor_ad)
+        await _run_competitor_demo(args.competitor_ad)
     except HTTPException as exc:
         print(f"Demo failed with status {exc.status_code}: {exc.detail}")
 
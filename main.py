@@ -1,30 +1,57 @@
 # --- 1. IMPORTS ---
 from __future__ import annotations
+import asyncio
 import os
 import time
-import requests
-import json
-from fastapi import FastAPI, HTTPException
+from datetime import date
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response
 from pydantic import BaseModel
-from dotenv import load_dotenv
-from typing import Optional, List
+from typing import Any, Dict, Optional, List, Tuple
 from dataclasses import dataclass
-from openai import OpenAI
 
 # Import your custom utility functions.
 # Make sure you have these files:
-# ./utils/linkup_utils.py -> contains perform_web_search(city: str)
+# ./utils/event_index.py -> contains find_event(city: str, country_code: str)
 # ./utils/freepik_utils.py -> contains create_image(keywords: list)
-from utils.linkup_utils import perform_web_search
-from utils.freepik_utils import create_image
-from utils.weather_utils import get_weather_context
+from utils.event_index import event_index_stats, find_event, get_event_index
+from utils.freepik_utils import (
+    FREEPIK_MAX_VARIANTS,
+    create_image,
+    create_image_variants,
+    render_signature,
+)
+from utils.image_dedup import ImageGroup, ImageGroups
+from utils.image_mirror import blob_path, is_valid_image_id, mirror_image, resolve_image, wait_for_downloads
+from utils.image_derivatives import DerivativeError, DerivativeRenderError, get_derivative, shutdown_executor
+from utils.weather_utils import get_weather_context, temperature_bucket
+from utils.geocoding import LocationNotFoundError, get_city_index, resolve_location
 from utils.cultural_utils import (
     analyze_competitor_themes,
     get_demographic_segments,
     generate_demographic_insights,
-    detect_strategic_mismatches
+    detect_strategic_mismatches,
+)
+from utils.transports import OFFLINE_PROVIDERS
+from utils.llm_client import LLMResult, close_llm_client, complete_json, llm_configured, preload_llm_sdk
+from utils.model_routing import model_stats
+from utils.analytics import get_pipeline, track
+from utils.campaign_store import (
+    KIND_MULTI_DEMOGRAPHIC,
+    KIND_OPPORTUNITY,
+    flush_pending_writes,
+    get_campaign_store,
+    save_in_background,
 )
+from utils.metrics import stage_timer
+from utils.pregeneration import get_scheduler
+from utils.cache import CACHE_BACKEND, cache_stats, close_cache_backend
+from utils.capacity import PriorityMiddleware, capacity_stats
+from utils.idempotency import IdempotencyKeyError, IdempotencyKeyReused, request_fingerprint, run_idempotent
+from utils.serialization import COMPRESSION_ENABLED, CompressionMiddleware, FastJSONResponse, parse_fields, project
 from config.company_profile import get_company_profile, get_brand_rules_text, get_product_for_season
+from config.settings import settings
 
 
 # --- Company metadata helpers -------------------------------------------------
@@ -77,38 +104,60 @@ BRAND_RULES_TEXT = get_brand_rules_text()
 
 # --- 2. INITIAL SETUP & CONFIGURATION ---
 
-# Load environment variables from a .env file
-load_dotenv()
-
 CONFIDENCE_THRESHOLD = 85
 # DEMO_MODE ensures a fast and reliable demo by returning a pre-built response.
 # Set this to "False" in your TrueFoundry environment variables to use the live API.
-DEMO_MODE = os.getenv("DEMO_MODE", "True").lower() == "true"
+# Offline providers (SIMULATE_PROVIDERS=True or cassette replay) always exercise the
+# live code paths, so every endpoint can be load tested without network access.
+DEMO_MODE = settings.get_bool("DEMO_MODE", True) and not OFFLINE_PROVIDERS
+
+DEEPL_API_KEY = settings.get("DEEPL_API_KEY")  # Kept for future integration
+
+# Startup check for the most critical API key.
+# All endpoints share the pooled TrueFoundry client in utils/llm_client.py, so make
+# sure your .env file has TRUEFOUNDRY_API_KEY="your-key-here".
+if not llm_configured():
+    if not DEMO_MODE:
+        raise ValueError("FATAL ERROR: TRUEFOUNDRY_API_KEY environment variable not set and not in DEMO_MODE.")
+    print("ERROR: TRUEFOUNDRY_API_KEY not found in .env file.")
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-DEEPL_API_KEY = os.getenv("DEEPL_API_KEY")  # Kept for future integration
+# Multi-worker deployments (WEB_CONCURRENCY > 1) need a cache the workers share,
+# otherwise each one calls the providers for the same cities and prompts.
+if settings.get_int("WEB_CONCURRENCY", 1) > 1 and CACHE_BACKEND == "local":
+    print("WARNING: WEB_CONCURRENCY > 1 with CACHE_BACKEND=local; workers will not share caches (use file or redis).")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown hook: runs the analytics flusher and pre-generation scheduler, releases pooled connections."""
+    if llm_configured():
+        preload_llm_sdk()
+    analytics = get_pipeline()
+    await analytics.start()
+    scheduler = get_scheduler()
+    await scheduler.start(_pregenerate_campaigns)
+    yield
+    await scheduler.stop()
+    await wait_for_downloads()
+    shutdown_executor()
+    await flush_pending_writes()
+    await analytics.stop()
+    await close_llm_client()
+    await close_cache_backend()
 
-# Startup check for the most critical API key
-if not OPENAI_API_KEY and not DEMO_MODE:
-    raise ValueError("FATAL ERROR: OPENAI_API_KEY environment variable not set and not in DEMO_MODE.")
 
 # Initialize the FastAPI application
 app = FastAPI(
     title="Autonomous Brand Agent (Aura Cold Brew)",
     description="An AI agent that generates on-brand, competitive marketing responses.",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
-
-# Configure the TrueFoundry LLM Client
-# Make sure your .env file has TRUEFOUNDRY_API_KEY="your-key-here"
-try:
-    tfy_client = OpenAI(
-        api_key=os.getenv("TRUEFOUNDRY_API_KEY"),
-        base_url="https://llm-gateway.truefoundry.com/"
-    )
-except TypeError:
-    print("ERROR: TRUEFOUNDRY_API_KEY not found in .env file.")
-    tfy_client = None
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+# X-Priority (interactive | batch) and X-Tenant-ID order provider calls when capacity is short.
+app.add_middleware(PriorityMiddleware)
 
 
 # --- 3. DEFINE API DATA MODELS ---
@@ -123,6 +172,7 @@ class CampaignResponse(BaseModel):
     body: str
     tagline: Optional[str] = None
     image_url: str
+    image_variants: Optional[List[str]] = None  # All variants (image_url is the first) when more were requested
 
 class AdRequest(BaseModel):
     competitor_ad_text: str
@@ -147,6 +197,7 @@ class DemographicCampaign(BaseModel):
     body: str
     tagline: Optional[str] = None
     image_url: str
+    image_group: Optional[int] = None  # Campaigns of one response with the same number share one render
     strategic_notes: str
 
 class MultiDemographicResponse(BaseModel):
@@ -162,22 +213,99 @@ class MultiDemographicResponse(BaseModel):
     campaigns: List[DemographicCampaign]
     total_campaigns: int
 
+class LocationSuggestion(BaseModel):
+    city: str
+    country_code: str
+    lat: float
+    lon: float
+    timezone: str
+    hemisphere: str
+
+class StoredCampaign(BaseModel):
+    id: int
+    created_at: float
+    kind: str
+    city: str
+    country: Optional[str] = None
+    season: Optional[str] = None
+    temperature_bucket: Optional[str] = None
+    event: Optional[str] = None
+    product: Optional[str] = None
+    segment: Optional[str] = None
+    campaign: Dict[str, Any]
+    context: Dict[str, Any]
+
+class IndexedEvent(BaseModel):
+    city: str
+    country: Optional[str] = None
+    name: str
+    start_date: date
+    end_date: date
+    venue: Optional[str] = None
+    expected_audience: Optional[int] = None
+    source_url: Optional[str] = None
+
 
 # --- 4. CREATE THE CORE API ENDPOINT ---
 
+IDEMPOTENCY_KEY_HEADER = Header(
+    None, description="Retries with the same key reuse the first request's execution and result"
+)
+REPLAYED_HEADERS = {"Idempotent-Replayed": "true"}
+
+
+async def _idempotent(
+    endpoint: str, idempotency_key: Optional[str], body: BaseModel, compute, *extra_inputs: Any
+) -> Tuple[Any, bool]:
+    """Runs an endpoint under its Idempotency-Key, if any; returns (result, replayed)."""
+    try:
+        result, replayed = await run_idempotent(
+            endpoint, idempotency_key, request_fingerprint(body, *extra_inputs), compute
+        )
+    except IdempotencyKeyError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        track("campaign_served", endpoint=endpoint, status="idempotent_replay")
+    return result, replayed
+
+
 @app.post("/generate_opportunity_campaign", response_model=CampaignResponse)
-async def generate_campaign(request: CampaignRequest):
+async def generate_campaign(
+    request: CampaignRequest,
+    response: Response,
+    variants: int = Query(
+        1, ge=1, le=FREEPIK_MAX_VARIANTS,
+        description="Image variants for A/B tests, rendered in one Freepik task (listed in image_variants)",
+    ),
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER,
+):
     """
     This endpoint orchestrates the entire autonomous marketing workflow.
     """
+    result, replayed = await _idempotent(
+        "/generate_opportunity_campaign", idempotency_key, request,
+        lambda: _generate_campaign(request, variants), {"variants": variants},
+    )
+    if replayed:
+        response.headers.update(REPLAYED_HEADERS)
+    return result
+
+
+async def _generate_campaign(request: CampaignRequest, variants: int = 1) -> CampaignResponse:
+    start_time = time.perf_counter()
+    city, country_code = _validated_location(request.city)
+    request = request.model_copy(update={"city": city})
     print("--- New Campaign Generation Request ---")
     print(f"City: {request.city} | Brand Rules: {request.brand_rules}")
 
     # == STEP 1: DISCOVER A REAL-TIME OPPORTUNITY ==
-    # Use the LinkUp function to find a timely local event.
+    # Find a timely local event: from the local event index, or LinkUp when it is not covered.
     print("\n[1/3] 🕵️  Discovering local opportunities with LinkUp...")
     try:
-        discovered_event = await perform_web_search(request.city)
+        with stage_timer("opportunity.linkup"):
+            discovered_event = await find_event(request.city, country_code)
         if not discovered_event:
             raise ValueError("No event found.")
         print(f"  > Opportunity Found: {discovered_event}")
@@ -188,7 +316,7 @@ async def generate_campaign(request: CampaignRequest):
     # == STEP 2: GENERATE AD COPY WITH THE LLM ==
     # Craft a detailed prompt and get the LLM to generate the campaign.
     print("\n[2/3] 🧠  Generating creative campaign with TrueFoundry LLM...")
-    if not tfy_client:
+    if not llm_configured():
          raise HTTPException(status_code=500, detail="TrueFoundry client not initialized. Check API key.")
 
     prompt = f"""
@@ -203,26 +331,33 @@ async def generate_campaign(request: CampaignRequest):
     Generate a complete ad campaign based on this opportunity.
     Respond ONLY with a valid JSON object in the following format:
     {{
-        "headline": "A short, catchy headline (max 10 words).",
-        "body": "A compelling body text (2-3 sentences).",
         "tagline": "A fresh tagline customized for this opportunity and city.",
-        "image_keywords": ["A list of", "5 descriptive keywords", "for a stock photo"]
+        "image_keywords": ["A list of", "5 descriptive keywords", "for a stock photo"],
+        "headline": "A short, catchy headline (max 10 words).",
+        "body": "A compelling body text (2-3 sentences)."
     }}
     """
 
-    try:
-        response = tfy_client.chat.completions.create(
-            model="autonomous-marketer/gpt-5", # Your specified model
-            messages=[
-                {"role": "system", "content": "You are a marketing expert that only responds in JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"} # Use JSON mode for reliability
+    async def render(keywords: Any, tagline: Optional[str]) -> List[str]:
+        # Use brand defaults but swap in the contextual tagline; all variants come from one task
+        return await create_image_variants(
+            keywords=keywords,
+            count=variants,
+            company_name=COMPANY_METADATA.company_name,
+            product_name=COMPANY_METADATA.default_product_name,
+            tagline_prompt=tagline or COMPANY_METADATA.tagline,
         )
-        llm_output = response.choices[0].message.content
-        ad_content = json.loads(llm_output)
+
+    # The tagline and keywords come first in the reply, so the render starts while the copy streams.
+    renders = ImageGroups(render)
+    image = _StreamedImage(renders)
+    try:
+        with stage_timer("opportunity.llm"):
+            llm_result = await complete_json(prompt, task="opportunity_campaign", on_field=image.on_field)
+        ad_content = llm_result.data
         print(f"  > Ad Content Generated: {ad_content}")
     except Exception as e:
+        renders.close()
         raise HTTPException(status_code=500, detail=f"Failed to get response from LLM: {e}")
 
 
@@ -232,42 +367,131 @@ async def generate_campaign(request: CampaignRequest):
     try:
         image_keywords = ad_content.get("image_keywords", ["default", "image"])
         tagline = ad_content.get("tagline") or COMPANY_METADATA.tagline
-        # Use brand defaults but swap in the contextual tagline
-        image_url = await create_image(
-            keywords=image_keywords,
-            company_name=COMPANY_METADATA.company_name,
-            product_name=COMPANY_METADATA.default_product_name,
-            tagline_prompt=tagline,
-        )
+        with stage_timer("opportunity.image"):
+            image_urls = await image.result(image_keywords, ad_content.get("tagline"))
+        image_urls = [mirror_image(url) for url in image_urls]  # Serve from our own /images route
+        image_url = image_urls[0]
         print(f"  > Image URL: {image_url}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create image with Freepik: {e}")
 
     print("\n--- ✅ Campaign Generation Complete! ---")
+    track(
+        "campaign_generated",
+        endpoint="/generate_opportunity_campaign",
+        status="completed",
+        latency_ms=(time.perf_counter() - start_time) * 1000,
+        prompt_tokens=llm_result.prompt_tokens,
+        completion_tokens=llm_result.completion_tokens,
+        model=llm_result.model,
+        city=request.city,
+    )
 
-    # == STEP 4: RETURN THE FINAL CAMPAIGN ==
-    return CampaignResponse(
+    # == STEP 4: PERSIST AND RETURN THE FINAL CAMPAIGN ==
+    campaign_response = CampaignResponse(
         discovered_opportunity=discovered_event,
         headline=ad_content["headline"],
         body=ad_content["body"],
         tagline=tagline,
         image_url=image_url,
+        image_variants=image_urls if variants > 1 else None,
     )
+    save_in_background(
+        KIND_OPPORTUNITY,
+        {"city": request.city, "event": discovered_event, "brand_rules": request.brand_rules},
+        [campaign_response.model_dump()],
+    )
+    return campaign_response
 
 
 # --- 5. HELPER FUNCTIONS FOR AD GENERATION ---
 
-def _log_mock(data: AdGenerationResponse):
+def _log_analytics(data: AdGenerationResponse, start_time: float, llm_result: Optional[LLMResult] = None):
     """
-    Mocks logging for the hackathon demo. In a real application, this would
-    write to a live database (ClickHouse) and send metrics (Datadog).
+    Queues an analytics event for a generated ad. The event is written in the
+    background (file store or ClickHouse, see utils/analytics.py), so the
+    response never waits on it.
     """
-    print("--- MOCK ANALYTICS LOG ---")
-    print(f"Timestamp: {time.time()}")
-    print(f"Status: {data.status}")
-    print(f"Confidence: {data.confidence_score}")
-    print(f"Ad Copy: {data.ad_copy[:50]}...")
-    print("--------------------------")
+    track(
+        "ad_generated",
+        endpoint="/generate-response-ad",
+        status=data.status,
+        confidence_score=data.confidence_score,
+        latency_ms=(time.perf_counter() - start_time) * 1000,
+        prompt_tokens=llm_result.prompt_tokens if llm_result else 0,
+        completion_tokens=llm_result.completion_tokens if llm_result else 0,
+        model=llm_result.model if llm_result else "demo",
+    )
+
+
+class _StreamedImage:
+    """
+    Starts the image render for a streamed LLM reply as soon as the reply's
+    ``image_keywords`` and ``tagline`` fields are complete, while the headline,
+    body and notes are still being generated.
+
+    Renders go through the request's :class:`ImageGroups`, so segments sending
+    Freepik the same payload share one.
+
+    Example:
+        image = _StreamedImage(ImageGroups(render, describe), label=segment)
+        llm_result = await complete_json(prompt, task=..., on_field=image.on_field)
+        image_url = await image.result(keywords, tagline)
+    """
+
+    def __init__(self, groups: ImageGroups, label: str = "") -> None:
+        self._groups = groups
+        self._label = label
+        self._fields: Dict[str, Any] = {}
+        self.group: Optional[ImageGroup] = None
+        self._inputs: Optional[Tuple[Any, Optional[str]]] = None
+
+    def on_field(self, key: str, value: Any) -> None:
+        self._fields[key] = value
+        if "image_keywords" in self._fields and "tagline" in self._fields and self.group is None:
+            self._settle(self._fields["image_keywords"], self._fields["tagline"])
+
+    def _settle(self, keywords: Any, tagline: Optional[str]) -> None:
+        """Keeps the current render if it fits (keywords, tagline), otherwise switches to the right one."""
+        if self.group is not None and (
+            self._inputs == (keywords, tagline) or self.group.key == self._groups.key(keywords, tagline)
+        ):
+            self._inputs = (keywords, tagline)
+            return  # Same payload, e.g. only keywords the prompt does not use changed
+        previous = self.group  # A fallback model's reply that does not fit
+        self._inputs = (keywords, tagline)
+        self.group = self._groups.acquire(keywords, tagline, self._label)
+        if previous is not None:
+            self._groups.release(previous)
+
+    async def result(self, keywords: Any, tagline: Optional[str]) -> Any:
+        """The image (whatever the render returns) for the final reply; reuses an earlier render when its inputs fit."""
+        self._settle(keywords, tagline)
+        return await self._groups.url(self.group)
+
+
+def _validated_location(city: str, country_code: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """
+    Checks a location against the offline city index before any provider call.
+
+    Returns the canonical (city, country_code), e.g. ("sydny", "au") -> ("Sydney", "AU").
+    Cities missing from the index pass through unchanged unless GEOCODER_STRICT is set.
+
+    Raises:
+        HTTPException: 422 with suggestions for misspelled or unknown locations.
+    """
+    try:
+        place = resolve_location(city, country_code)
+    except LocationNotFoundError as e:
+        raise HTTPException(
+            status_code=422,
+            detail={"message": str(e), "suggestions": [s.to_dict() for s in e.suggestions]},
+        )
+    if place is None:
+        return city, country_code
+    if place.name != city:
+        print(f"  > Location normalized: {city!r} -> {place.name}, {place.country}")
+    return place.name, place.country if country_code else country_code
 
 
 def _get_brand_rules() -> str:
@@ -304,8 +528,21 @@ def _build_openai_prompt(competitor_ad: str, brand_rules: str) -> str:
 # --- 6. COMPETITIVE AD GENERATION ENDPOINT ---
 
 @app.post("/generate-response-ad", response_model=AdGenerationResponse, summary="Generate a competitive response ad")
-def generate_ad(request: AdRequest):
-    start_time = time.time()
+async def generate_ad(
+    request: AdRequest,
+    response: Response,
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER,
+):
+    result, replayed = await _idempotent(
+        "/generate-response-ad", idempotency_key, request, lambda: _generate_ad(request)
+    )
+    if replayed:
+        response.headers.update(REPLAYED_HEADERS)
+    return result
+
+
+async def _generate_ad(request: AdRequest) -> AdGenerationResponse:
+    start_time = time.perf_counter()
 
     # --- HACKATHON DEMO SHORTCUT ---
     # If in DEMO_MODE, return a pre-built, high-quality response instantly.
@@ -320,9 +557,7 @@ def generate_ad(request: AdRequest):
             "competitor_ad_text": request.competitor_ad_text
         }
         response_data = AdGenerationResponse(**mock_response)
-        _log_mock(response_data)
-        duration_ms = (time.time() - start_time) * 1000
-        print(f"DATADOG METRIC (MOCKED): ad_generation.status.approved, duration: {duration_ms:.2f}ms")
+        _log_analytics(response_data, start_time)
         return response_data
 
     # --- LIVE API CALL LOGIC (Disabled in Demo Mode) ---
@@ -330,24 +565,19 @@ def generate_ad(request: AdRequest):
     openai_prompt = _build_openai_prompt(request.competitor_ad_text, brand_rules)
 
     try:
-        openai_response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
-            json={"model": "gpt-4-turbo", "messages": [{"role": "user", "content": openai_prompt}],
-                  "response_format": {"type": "json_object"}},
-            timeout=30
-        )
-        openai_response.raise_for_status()
-        content = openai_response.json()['choices'][0]['message']['content']
-        ad_data = json.loads(content)
+        with stage_timer("response_ad.llm"):
+            llm_result = await complete_json(openai_prompt, task="response_ad", system_prompt=None)
+        ad_data = llm_result.data
 
         confidence_score = ad_data.get("confidence_score", 0)
         ad_copy = ad_data.get("ad_copy", "Error: No ad copy.")
         generated_tagline = ad_data.get("generated_tagline", "Error: No tagline.")
         image_keywords = ad_data.get("image_keywords", "Minimalist coffee can")
+        if isinstance(image_keywords, list):
+            image_keywords = ", ".join(str(keyword) for keyword in image_keywords)
 
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Error communicating with OpenAI API: {e}")
+        raise HTTPException(status_code=502, detail=f"Error communicating with the LLM gateway: {e}")
 
     # The rest of the logic for confidence check, translation, etc. would go here...
     final_ad_package = AdGenerationResponse(
@@ -355,14 +585,19 @@ def generate_ad(request: AdRequest):
         generated_tagline=generated_tagline, translated_copy=f"(ES) {ad_copy}",
         image_prompt=image_keywords, competitor_ad_text=request.competitor_ad_text
     )
-    _log_mock(final_ad_package)
+    _log_analytics(final_ad_package, start_time, llm_result)
     return final_ad_package
 
 
 # --- 7. MULTI-DEMOGRAPHIC CAMPAIGN GENERATION ---
 
 @app.post("/generate_multi_demographic_campaign", response_model=MultiDemographicResponse)
-async def generate_multi_demographic_campaign(request: MultiDemographicRequest):
+async def generate_multi_demographic_campaign(
+    request: MultiDemographicRequest,
+    fresh: bool = Query(False, description="Skip pre-generated results and run the full pipeline"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. 'city,campaigns.headline'"),
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER,
+):
     """
     Advanced autonomous marketing workflow that generates location-aware,
     multi-demographic campaigns with weather and cultural context.
@@ -373,6 +608,64 @@ async def generate_multi_demographic_campaign(request: MultiDemographicRequest):
     3. Understanding cultural nuances
     4. Detecting strategic mismatches
     5. Generating tailored campaigns for each demographic segment
+    
+    Cities on the pre-generation list (PREGEN_CITIES) are answered from the
+    scheduler's latest results while those are fresh.
+
+    The response is assembled from already validated parts, so it is encoded
+    directly instead of being re-validated against the response model.
+    Clients that may retry should send an ``Idempotency-Key`` header: a retry
+    attaches to the running pipeline, or gets its stored result.
+    """
+    selected = _field_tree(fields, MultiDemographicResponse)
+    result, replayed = await _idempotent(
+        "/generate_multi_demographic_campaign",
+        idempotency_key,
+        request,
+        lambda: _generate_multi_demographic_campaign(request, fresh),
+        {"fresh": fresh},
+    )
+    return FastJSONResponse(project(result, selected), headers=REPLAYED_HEADERS if replayed else None)
+
+
+async def _generate_multi_demographic_campaign(request: MultiDemographicRequest, fresh: bool) -> Any:
+    """The pre-generated result for the city if there is one (JSON form), otherwise a pipeline run."""
+    city, country_code = _validated_location(request.city, request.country_code)
+    request = request.model_copy(update={"city": city, "country_code": country_code})
+
+    if not fresh:
+        precomputed = await get_scheduler().lookup(request.city, request.country_code)
+        if precomputed is not None:
+            track(
+                "campaign_served",
+                endpoint="/generate_multi_demographic_campaign",
+                status="precomputed",
+                city=request.city,
+                country=request.country_code,
+                season=precomputed["season"],
+            )
+            return precomputed
+
+    return await run_multi_demographic_pipeline(request)
+
+
+def _field_tree(fields: Optional[str], model: type) -> Optional[Dict[str, Any]]:
+    """Parses a ``fields=`` query parameter, answering unknown fields with 422."""
+    try:
+        return parse_fields(fields, model)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+async def run_multi_demographic_pipeline(
+    request: MultiDemographicRequest,
+    weather: Optional[Dict[str, Any]] = None,
+    discovered_event: Optional[str] = None,
+) -> MultiDemographicResponse:
+    """
+    The full multi-demographic pipeline, shared by the endpoint and the
+    pre-generation scheduler (which passes in weather and the event it has
+    already fetched, so they are not requested twice).
     """
     print("="*80)
     print("🤖 AUTONOMOUS MULTI-DEMOGRAPHIC CAMPAIGN GENERATION")
@@ -386,7 +679,9 @@ async def generate_multi_demographic_campaign(request: MultiDemographicRequest):
     # == STEP 1: GATHER CONTEXTUAL INTELLIGENCE ==
     print("\n[1/5] 🌤️  Gathering weather and seasonal context...")
     try:
-        weather = await get_weather_context(request.city, request.country_code)
+        if weather is None:
+            with stage_timer("multi.weather"):
+                weather = await get_weather_context(request.city, request.country_code)
         print(f"  > Temperature: {weather['temperature_celsius']}°C / {weather['temperature_fahrenheit']}°F")
         print(f"  > Conditions: {weather['weather_description']}")
         print(f"  > Season: {weather['season']} ({weather['hemisphere']} hemisphere)")
@@ -396,11 +691,12 @@ async def generate_multi_demographic_campaign(request: MultiDemographicRequest):
     # == STEP 2: ANALYZE COMPETITOR LANDSCAPE ==
     print("\n[2/5] 🔍  Analyzing competitor themes and cultural context...")
     try:
-        competitor_analysis = await analyze_competitor_themes(
-            request.country_code, 
-            weather['season'], 
-            weather
-        )
+        with stage_timer("multi.competitor_analysis"):
+            competitor_analysis = analyze_competitor_themes(
+                request.country_code, 
+                weather['season'], 
+                weather
+            )
         print("  > Analysis complete")
         print(competitor_analysis)
     except Exception as e:
@@ -409,8 +705,10 @@ async def generate_multi_demographic_campaign(request: MultiDemographicRequest):
     # == STEP 3: DISCOVER LOCAL OPPORTUNITIES ==
     print("\n[3/5] 🕵️  Discovering local events and opportunities...")
     try:
-        discovered_event = await perform_web_search(request.city)
-        print(f"  > Event Found: {discovered_event[:100]}...")
+        if discovered_event is None:
+            with stage_timer("multi.linkup"):
+                discovered_event = await find_event(request.city, request.country_code)
+        print(f"  > Event Found: {discovered_event}")
     except Exception as e:
         print(f"  > Warning: Could not find events: {e}")
         discovered_event = f"General local marketing opportunity in {request.city}"
@@ -418,12 +716,13 @@ async def generate_multi_demographic_campaign(request: MultiDemographicRequest):
     # == STEP 4: DETECT STRATEGIC MISMATCHES ==
     print("\n[4/5] ⚠️  Detecting strategic mismatches...")
     try:
-        mismatch_analysis = await detect_strategic_mismatches(
-            request.country_code,
-            weather['season'],
-            weather,
-            "cold brew"
-        )
+        with stage_timer("multi.strategy"):
+            mismatch_analysis = detect_strategic_mismatches(
+                request.country_code,
+                weather['season'],
+                weather,
+                "cold brew"
+            )
         print(f"  > Strategic Action: {mismatch_analysis['strategic_action']}")
         if mismatch_analysis['recommendations']:
             for rec in mismatch_analysis['recommendations']:
@@ -441,14 +740,36 @@ async def generate_multi_demographic_campaign(request: MultiDemographicRequest):
     # == STEP 5: GENERATE CAMPAIGNS FOR EACH DEMOGRAPHIC ==
     print("\n[5/5] 🎨  Generating campaigns for each demographic segment...")
     
-    if not tfy_client:
+    if not llm_configured():
         raise HTTPException(status_code=500, detail="TrueFoundry client not initialized. Check API key.")
     
+    product_display_name = _strip_company_prefix(
+        recommended_product['name'], COMPANY_METADATA.company_name
+    ) or COMPANY_METADATA.default_product_name
+
+    async def render(keywords: Any, tagline: Optional[str]) -> str:
+        # Pass brand information to image generator
+        return await create_image(
+            keywords=keywords,
+            company_name=COMPANY_METADATA.company_name,
+            product_name=product_display_name,
+            tagline_prompt=tagline or COMPANY_METADATA.tagline,
+        )
+
+    def describe(keywords: Any, tagline: Optional[str]) -> str:
+        return render_signature(
+            COMPANY_METADATA.company_name, product_display_name, tagline or COMPANY_METADATA.tagline
+        )
+
+    # Segments sending Freepik the same payload share one render (utils/image_dedup.py)
+    renders = ImageGroups(render, describe)
     try:
-        demographic_segments = await get_demographic_segments(request.country_code)
+        demographic_segments = get_demographic_segments(request.country_code)
         campaigns = []
-        
+        images = [_StreamedImage(renders, label=demographic['segment']) for demographic in demographic_segments]
+
         for idx, demographic in enumerate(demographic_segments, 1):
+            segment_start = time.perf_counter()
             print(f"\n  [{idx}/{len(demographic_segments)}] Generating for: {demographic['segment']}")
             
             # Generate demographic-specific insights
@@ -492,41 +813,29 @@ Create a highly targeted ad campaign for this specific demographic that:
 
 Respond ONLY with a valid JSON object:
 {{
-    "headline": "A compelling headline (max 12 words) that resonates with this demographic",
-    "body": "Engaging body copy (2-3 sentences) that connects the product to their lifestyle and the local context",
     "tagline": "A short tagline tailored to this demographic and context",
     "image_keywords": ["5-7 specific keywords", "for product photography", "that appeals to this demographic"],
+    "headline": "A compelling headline (max 12 words) that resonates with this demographic",
+    "body": "Engaging body copy (2-3 sentences) that connects the product to their lifestyle and the local context",
     "strategic_notes": "Brief notes on how this campaign addresses the demographic's needs and any strategic pivots made"
 }}
 """
             
-            # Call the LLM
-            response = tfy_client.chat.completions.create(
-                model="autonomous-marketer/gpt-5",
-                messages=[
-                    {"role": "system", "content": "You are a marketing expert that only responds in JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"}
-            )
+            # Call the LLM; the image render starts once the tagline and keywords have streamed in
+            image = images[idx - 1]
+            with stage_timer("multi.llm"):
+                llm_result = await complete_json(prompt, task="multi_campaign", on_field=image.on_field)
             
-            campaign_data = json.loads(response.choices[0].message.content)
+            campaign_data = llm_result.data
             
             # Generate image for this campaign
             print("    > Generating image...")
             image_keywords = campaign_data.get("image_keywords", ["Aura Cold Brew", "premium coffee"])
-            product_display_name = _strip_company_prefix(
-                recommended_product['name'], COMPANY_METADATA.company_name
-            )
             campaign_tagline = campaign_data.get("tagline") or COMPANY_METADATA.tagline
 
-            # Pass brand information to image generator
-            image_url = await create_image(
-                keywords=image_keywords,
-                company_name=COMPANY_METADATA.company_name,
-                product_name=product_display_name or COMPANY_METADATA.default_product_name,
-                tagline_prompt=campaign_tagline,
-            )
+            with stage_timer("multi.image"):
+                image_url = await image.result(image_keywords, campaign_data.get("tagline"))
+            image_url = mirror_image(image_url)
 
             # Create campaign object
             campaign = DemographicCampaign(
@@ -536,21 +845,38 @@ Respond ONLY with a valid JSON object:
                 body=campaign_data['body'],
                 tagline=campaign_tagline,
                 image_url=image_url,
+                image_group=image.group.number,
                 strategic_notes=campaign_data.get('strategic_notes', '')
             )
             campaigns.append(campaign)
+            track(
+                "campaign_generated",
+                endpoint="/generate_multi_demographic_campaign",
+                status="completed",
+                latency_ms=(time.perf_counter() - segment_start) * 1000,
+                prompt_tokens=llm_result.prompt_tokens,
+                completion_tokens=llm_result.completion_tokens,
+                model=llm_result.model,
+                city=request.city,
+                country=request.country_code,
+                season=weather['season'],
+                segment=demographic['segment'],
+            )
             
             print(f"    ✓ Campaign complete for {demographic['segment']}")
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate campaigns: {e}")
+    finally:
+        renders.close()  # Renders of segments that were never reached
     
     print("\n" + "="*80)
     print(f"✅ COMPLETE: Generated {len(campaigns)} demographic-specific campaigns")
     print("="*80 + "\n")
     
-    # == STEP 6: RETURN COMPREHENSIVE RESPONSE ==
-    return MultiDemographicResponse(
+    # == STEP 6: PERSIST AND RETURN COMPREHENSIVE RESPONSE ==
+    # Every part was validated above (campaigns) or built here, so skip re-validation.
+    response = MultiDemographicResponse.model_construct(
         city=request.city,
         country=weather.get('country_code', request.country_code),
         weather_context=weather['context'],
@@ -563,9 +889,166 @@ Respond ONLY with a valid JSON object:
         campaigns=campaigns,
         total_campaigns=len(campaigns)
     )
+    save_in_background(
+        KIND_MULTI_DEMOGRAPHIC,
+        {
+            "city": request.city,
+            "country": response.country,
+            "season": weather['season'],
+            "temperature_bucket": temperature_bucket(weather['temperature_celsius']),
+            "event": discovered_event,
+            "product": recommended_product['name'],
+            "weather_context": response.weather_context,
+            "temperature": response.temperature,
+            "strategic_action": response.strategic_action,
+        },
+        [campaign.model_dump() for campaign in campaigns],
+    )
+    return response
+
+
+async def _pregenerate_campaigns(
+    city: str, country_code: str, weather: Dict[str, Any], discovered_event: str
+) -> MultiDemographicResponse:
+    """Generator used by the pre-generation scheduler (utils/pregeneration.py)."""
+    request = MultiDemographicRequest(city=city, country_code=country_code)
+    return await run_multi_demographic_pipeline(request, weather=weather, discovered_event=discovered_event)
 
 
 # --- 8. CREATE A ROOT ENDPOINT FOR HEALTH CHECKS ---
 @app.get("/", summary="Check service status")
 def read_root():
     return {"message": "Aura Cold Brew Brand Agent (Enhanced Multi-Demographic Version) is online!"}
+
+
+@app.get("/locations/suggest", response_model=List[LocationSuggestion], summary="Autocomplete city names")
+def suggest_locations(
+    q: str = Query(..., min_length=1, description="City name or prefix, e.g. 'syd'"),
+    country: Optional[str] = Query(None, description="Restrict to a 2-letter country code"),
+    limit: int = Query(5, ge=1, le=25),
+):
+    """Prefix and typo-tolerant matches from the offline city index."""
+    return [city.to_dict() for city in get_city_index().suggest(q, country, limit)]
+
+
+@app.get("/campaigns", response_model=List[StoredCampaign], summary="Look up previously generated campaigns")
+async def list_campaigns(
+    city: Optional[str] = None,
+    country: Optional[str] = None,
+    season: Optional[str] = None,
+    segment: Optional[str] = Query(None, description="Case-insensitive prefix, e.g. 'Gen Z'"),
+    temperature_bucket: Optional[str] = Query(None, description="freezing, cold, mild, warm or hot"),
+    product: Optional[str] = None,
+    kind: Optional[str] = Query(None, description="opportunity or multi_demographic"),
+    limit: int = Query(20, ge=1, le=500),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return, e.g. 'id,city,segment,campaign.headline'"
+    ),
+):
+    """
+    Latest stored campaigns matching the filters, e.g. Sydney + summer + Gen Z.
+    List views can pass ``fields`` to skip the heavy campaign and context text.
+    """
+    selected = _field_tree(fields, StoredCampaign)
+    rows = await asyncio.to_thread(
+        get_campaign_store().latest,
+        city=city, country=country, season=season, segment=segment,
+        temperature_bucket=temperature_bucket, product=product, kind=kind, limit=limit,
+    )
+    return FastJSONResponse(project(rows, selected))
+
+
+@app.get("/events", response_model=List[IndexedEvent], summary="Search the local index of upcoming events")
+async def list_events(
+    city: Optional[str] = None,
+    country: Optional[str] = Query(None, description="2-letter country code, e.g. AU to tell Sydney AU from Sydney CA"),
+    from_date: Optional[date] = Query(None, description="Events still running on or after this day (default: today)"),
+    to_date: Optional[date] = Query(None, description="Events starting on or before this day"),
+    min_audience: Optional[int] = Query(None, ge=0, description="Smallest expected audience"),
+    limit: int = Query(20, ge=1, le=500),
+):
+    """
+    Upcoming events found by earlier Linkup searches, largest expected audience
+    first. Only indexed events are returned; this never calls Linkup.
+    """
+    events = await asyncio.to_thread(
+        get_event_index().search,
+        city=city, country=country, from_date=from_date, to_date=to_date, min_audience=min_audience, limit=limit,
+    )
+    return FastJSONResponse([event.to_dict() for event in events])
+
+
+@app.get("/images/{image_id}", summary="Serve a mirrored campaign image")
+async def get_image(
+    image_id: str,
+    request: Request,
+    w: Optional[int] = Query(None, description="Thumbnail width in pixels, e.g. 256"),
+    fmt: Optional[str] = Query(None, alias="format", description="webp, avif, jpeg or png"),
+):
+    """
+    Serves images mirrored from Freepik. Supports byte ranges and conditional
+    requests (ETag / If-None-Match); redirects to the source URL while the
+    mirror download is still pending. ``w`` and ``format`` select a cached
+    derivative (e.g. ``?w=256&format=webp`` for list previews).
+    """
+    if not is_valid_image_id(image_id):
+        raise HTTPException(status_code=404, detail="Image not found.")
+    ref = await resolve_image(image_id)
+    if ref is None:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    if not ref.get("sha256"):
+        return RedirectResponse(ref["source_url"], status_code=307)
+
+    path = blob_path(ref["sha256"], ref.get("content_type"))
+    media_type = ref.get("content_type")
+    etag = f'"{ref["sha256"]}"'
+    if w is not None or fmt is not None:
+        try:
+            path, media_type = await get_derivative(path, ref["sha256"], w, fmt)
+        except DerivativeRenderError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+        except DerivativeError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        etag = f'"{os.path.basename(path)}"'
+
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+@app.get("/pregeneration/stats", summary="Pre-generation scheduler status and result ages")
+async def pregeneration_stats():
+    return await get_scheduler().snapshot()
+
+
+@app.get("/capacity/stats", summary="LLM and Freepik slots, queue lengths and queue waits per priority class")
+def capacity_stats_endpoint():
+    return capacity_stats()
+
+
+@app.get("/llm/stats", summary="LLM routes plus per-model latency and quality counters of this worker")
+def llm_stats():
+    return model_stats()
+
+
+@app.get("/events/stats", summary="Event index size, index hits and Linkup searches")
+def event_stats():
+    return event_index_stats()
+
+
+@app.get("/cache/stats", summary="Shared cache backend and per-namespace hit rates of this worker")
+def cache_stats_endpoint():
+    return cache_stats()
+
+
+@app.get("/analytics/stats", summary="Analytics pipeline queue and drop counters")
+def analytics_stats():
+    return get_pipeline().snapshot()
@@ -0,0 +1,128 @@
+"""Tests for single-flight computation in utils/cache.py, on every backend."""
+
+import asyncio
+import itertools
+
+import pytest
+
+from utils.cache import FileCacheBackend, LocalCacheBackend, RedisCacheBackend, SharedCache
+from utils.resp_server import RespServer
+
+BACKENDS = ["local", "file", "redis"]
+_names = itertools.count()
+
+
+def run(kind, tmp_path, scenario):
+    """Runs ``scenario(backend)`` in a fresh event loop against a backend of the given kind."""
+
+    async def main():
+        listener = None
+        if kind == "local":
+            backend = LocalCacheBackend()
+        elif kind == "file":
+            backend = FileCacheBackend(str(tmp_path))
+        else:
+            listener = await asyncio.start_server(RespServer().handle, "127.0.0.1", 0)
+            backend = RedisCacheBackend(f"redis://127.0.0.1:{listener.sockets[0].getsockname()[1]}/0")
+        try:
+            return await scenario(backend)
+        finally:
+            await backend.close()
+            if listener is not None:
+                await asyncio.sleep(0.01)  # Let the server see the connections close
+                listener.close()
+                await listener.wait_closed()
+
+    return asyncio.run(main())
+
+
+def workers(backend, count=2):
+    """SharedCaches over one backend, standing in for separate worker processes."""
+    namespace = f"test-{next(_names)}"
+    return [SharedCache(namespace, ttl_seconds=60, backend=backend) for _ in range(count)]
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_concurrent_misses_compute_once(kind, tmp_path):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": 42}
+
+    async def scenario(backend):
+        first, second = workers(backend)
+        return await asyncio.gather(
+            *(cache.get_or_compute("key", compute) for cache in (first, second) for _ in range(5))
+        )
+
+    results = run(kind, tmp_path, scenario)
+    assert results == [{"value": 42}] * 10
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_failures_are_not_cached(kind, tmp_path):
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("provider down")
+        return "ok"
+
+    async def scenario(backend):
+        (cache,) = workers(backend, 1)
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute("key", compute)
+        return await cache.get_or_compute("key", compute)
+
+    assert run(kind, tmp_path, scenario) == "ok"
+    assert len(attempts) == 2
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_delete_if_only_removes_the_matching_value(kind, tmp_path):
+    async def scenario(backend):
+        assert await backend.add("lock", "token-a", 10)
+        assert not await backend.delete_if("lock", "token-b")
+        assert await backend.get_many(["lock"]) == {"lock": "token-a"}
+        assert await backend.delete_if("lock", "token-a")
+        assert await backend.get_many(["lock"]) == {}
+        assert not await backend.delete_if("lock", "token-a")
+
+    run(kind, tmp_path, scenario)
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_expired_lock_holder_does_not_release_the_next_holder(kind, tmp_path):
+    """
+    A outlives its lock, B takes the lock over, then A finishes. A must leave
+    B's lock alone, so C waits for B's result instead of computing a third time.
+    """
+    computed = []
+
+    def slow(name, seconds, result):
+        async def compute():
+            computed.append(name)
+            await asyncio.sleep(seconds)
+            return result
+
+        return compute
+
+    async def scenario(backend):
+        a, b, c = workers(backend, 3)
+        # A returns None, which is not cached, so only B's lock keeps C from computing.
+        task_a = asyncio.create_task(a.get_or_compute("key", slow("a", 0.3, None), lock_seconds=0.1))
+        await asyncio.sleep(0.15)  # A's lock has expired
+        task_b = asyncio.create_task(b.get_or_compute("key", slow("b", 0.5, "from-b"), lock_seconds=5))
+        assert await task_a is None  # A is done at ~0.3 s, while B is still computing
+        result_c = await c.get_or_compute("key", slow("c", 0.01, "from-c"), lock_seconds=5)
+        assert await task_b == "from-b"
+        return result_c, a.stats["lock_expired"]
+
+    result_c, expired = run(kind, tmp_path, scenario)
+    assert computed == ["a", "b"]
+    assert result_c == "from-b"
+    assert expired == 1
@@ -0,0 +1,112 @@
+"""Tests for the priority and tenant scheduling of utils/capacity.py."""
+
+import asyncio
+
+import pytest
+
+from utils import capacity
+from utils.capacity import BATCH, INTERACTIVE, CapacityPool, priority_context
+
+
+@pytest.fixture(autouse=True)
+def default_weights(monkeypatch):
+    """The documented defaults, whatever the environment configures."""
+    monkeypatch.setattr(capacity, "PRIORITY_WEIGHTS", {INTERACTIVE: 8.0, BATCH: 1.0})
+    monkeypatch.setattr(capacity, "PRIORITY_BATCH_MAX_SHARE", 0.5)
+    monkeypatch.setattr(capacity, "TENANT_WEIGHTS", {})
+
+
+async def grant_order(pool, jobs):
+    """
+    Queues ``jobs`` ((label, priority, tenant) tuples) behind a call holding
+    every slot, then releases it; returns the labels in the order slots were granted.
+    """
+    order = []
+    release = asyncio.Event()
+
+    async def hold():
+        async with pool.slot():
+            await release.wait()
+
+    async def job(label, priority, tenant):
+        with priority_context(priority, tenant):
+            async with pool.slot():
+                order.append(label)
+                await asyncio.sleep(0)
+
+    holders = [asyncio.create_task(hold()) for _ in range(pool.capacity)]
+    await asyncio.sleep(0)
+    tasks = []
+    for label, priority, tenant in jobs:
+        tasks.append(asyncio.create_task(job(label, priority, tenant)))
+        await asyncio.sleep(0)  # Enqueued in this order
+    release.set()
+    await asyncio.gather(*holders, *tasks)
+    return order
+
+
+def test_interactive_work_goes_ahead_of_queued_batch_work():
+    jobs = [(f"b{i}", BATCH, "nightly") for i in range(4)] + [(f"i{i}", INTERACTIVE, "web") for i in range(4)]
+    order = asyncio.run(grant_order(CapacityPool("test", 1), jobs))
+    # Batch was queued first but gets at most one slot before all interactive calls run (weights 8:1).
+    assert sorted(order) == sorted(label for label, _, _ in jobs)
+    batch_before_interactive_done = [label for label in order[: order.index("i3")] if label.startswith("b")]
+    assert len(batch_before_interactive_done) <= 1
+    assert [label for label in order if label.startswith("i")] == ["i0", "i1", "i2", "i3"]  # FIFO within a tenant
+
+
+def test_batch_work_still_moves_while_interactive_work_is_queued():
+    jobs = [("b0", BATCH, "nightly")] + [(f"i{i}", INTERACTIVE, "web") for i in range(20)]
+    order = asyncio.run(grant_order(CapacityPool("test", 1), jobs))
+    assert order.index("b0") <= 9  # Within one round of the 8:1 weights, not after all 20
+
+
+def test_tenants_of_one_class_share_slots_fairly():
+    jobs = [(f"a{i}", INTERACTIVE, "tenant-a") for i in range(6)] + [(f"b{i}", INTERACTIVE, "tenant-b") for i in range(3)]
+    order = asyncio.run(grant_order(CapacityPool("test", 1), jobs))
+    # Tenant b arrived after a's burst but alternates with it instead of waiting for all of it.
+    assert [label[0] for label in order[:6]].count("b") == 3
+
+
+def test_tenant_weights(monkeypatch):
+    monkeypatch.setattr(capacity, "TENANT_WEIGHTS", {"gold": 2.0})
+    jobs = [(f"s{i}", INTERACTIVE, "standard") for i in range(6)] + [(f"g{i}", INTERACTIVE, "gold") for i in range(6)]
+    order = asyncio.run(grant_order(CapacityPool("test", 1), jobs))
+    assert [label[0] for label in order[:9]].count("g") == 6  # Two gold slots per standard one
+
+
+@pytest.mark.parametrize("capacity_slots", [2, 4])
+def test_batch_work_is_capped_at_its_share_of_slots(capacity_slots):
+    async def main():
+        pool = CapacityPool("test", capacity_slots)
+        release = asyncio.Event()
+        granted = []
+
+        async def job(label, priority):
+            with priority_context(priority):
+                async with pool.slot():
+                    granted.append(label)
+                    await release.wait()
+
+        tasks = [asyncio.create_task(job(f"b{i}", BATCH)) for i in range(capacity_slots * 2)]
+        await asyncio.sleep(0.01)
+        batch_running = len(granted)
+        tasks.append(asyncio.create_task(job("i0", INTERACTIVE)))
+        await asyncio.sleep(0.01)
+        interactive_admitted = "i0" in granted
+        release.set()
+        await asyncio.gather(*tasks)
+        return batch_running, interactive_admitted
+
+    batch_running, interactive_admitted = asyncio.run(main())
+    assert batch_running == capacity_slots // 2  # PRIORITY_BATCH_MAX_SHARE = 0.5
+    assert interactive_admitted  # A free slot was left for the interactive call
+
+
+def test_unlimited_pool_never_queues():
+    async def main():
+        pool = CapacityPool("test", 0)
+        async with pool.slot(), pool.slot(), pool.slot():
+            return pool.snapshot()["in_use"]
+
+    assert asyncio.run(main()) == 0
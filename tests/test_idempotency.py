@@ -0,0 +1,108 @@
+"""Tests for utils/idempotency.py (Idempotency-Key handling of the campaign endpoints)."""
+
+import asyncio
+import itertools
+
+import pytest
+
+from utils.idempotency import IdempotencyKeyError, IdempotencyKeyReused, request_fingerprint, run_idempotent
+
+_scopes = itertools.count()
+
+
+@pytest.fixture
+def scope():
+    return f"/test-endpoint-{next(_scopes)}"
+
+
+def counting(result, delay=0.0):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result
+
+    return compute, calls
+
+
+def test_retry_while_running_attaches_to_the_execution(scope):
+    compute, calls = counting({"campaign": 1}, delay=0.05)
+    fingerprint = request_fingerprint({"city": "Sydney"})
+
+    async def main():
+        first = asyncio.create_task(run_idempotent(scope, "key-1", fingerprint, compute))
+        await asyncio.sleep(0.01)  # The first request is still running
+        second = await run_idempotent(scope, "key-1", fingerprint, compute)
+        return await first, second
+
+    first, second = asyncio.run(main())
+    assert len(calls) == 1
+    assert first == ({"campaign": 1}, False)
+    assert second == ({"campaign": 1}, True)
+
+
+def test_retry_after_completion_replays_the_stored_result(scope):
+    compute, calls = counting({"campaign": 1})
+    fingerprint = request_fingerprint({"city": "Sydney"})
+
+    async def main():
+        return [await run_idempotent(scope, "key-1", fingerprint, compute) for _ in range(3)]
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [replayed for _, replayed in results] == [False, True, True]
+    assert all(result == {"campaign": 1} for result, _ in results)
+
+
+def test_reusing_a_key_with_a_different_body_is_rejected(scope):
+    compute, calls = counting({"campaign": 1}, delay=0.05)
+
+    async def main():
+        first = asyncio.create_task(
+            run_idempotent(scope, "key-1", request_fingerprint({"city": "Sydney"}), compute)
+        )
+        await asyncio.sleep(0.01)
+        with pytest.raises(IdempotencyKeyReused):  # Rejected at once, while the first still runs
+            await run_idempotent(scope, "key-1", request_fingerprint({"city": "Perth"}), compute)
+        await first
+        with pytest.raises(IdempotencyKeyReused):  # And after it finished
+            await run_idempotent(scope, "key-1", request_fingerprint({"city": "Perth"}), compute)
+
+    asyncio.run(main())
+    assert len(calls) == 1
+
+
+def test_failed_execution_releases_the_key(scope):
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("pipeline failed")
+        return {"campaign": 2}
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await run_idempotent(scope, "key-1", "fp-a", compute)
+        return await run_idempotent(scope, "key-1", "fp-b", compute)  # Even with another body
+
+    assert asyncio.run(main()) == ({"campaign": 2}, False)
+
+
+def test_without_a_key_every_request_runs(scope):
+    compute, calls = counting("result")
+
+    async def main():
+        return [await run_idempotent(scope, None, "fp", compute) for _ in range(2)]
+
+    assert asyncio.run(main()) == [("result", False), ("result", False)]
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("key", ["", "has space", "x" * 256, "emoji-☃"])
+def test_malformed_keys_are_rejected(scope, key):
+    compute, calls = counting("result")
+    with pytest.raises(IdempotencyKeyError):
+        asyncio.run(run_idempotent(scope, key, "fp", compute))
+    assert not calls
@@ -0,0 +1,68 @@
+"""Tests for utils/json_stream.py (incremental parsing of streamed LLM replies)."""
+
+import json
+
+import pytest
+
+from utils.json_stream import JSONObjectStream
+
+
+def feed_all(chunks):
+    """Feeds chunks one by one; returns the stream and the fields completed by each chunk."""
+    stream = JSONObjectStream()
+    return stream, [stream.feed(chunk) for chunk in chunks]
+
+
+def test_fields_are_reported_as_soon_as_they_complete():
+    stream, completed = feed_all(
+        ['{"tagline": "Cool', ' Clarity", "image_keywords": ["can"', ', "ice"], "bo', 'dy": "Long copy"}']
+    )
+    assert completed == [
+        {},
+        {"tagline": "Cool Clarity"},
+        {"image_keywords": ["can", "ice"]},
+        {"body": "Long copy"},
+    ]
+    assert stream.fields == {"tagline": "Cool Clarity", "image_keywords": ["can", "ice"], "body": "Long copy"}
+
+
+def test_single_character_chunks():
+    text = json.dumps({"a": "x, y", "b": [1, {"c": "}"}], "d": {"e": [2, 3]}, "f": 4.5, "g": None})
+    stream, completed = feed_all(list(text))
+    assert [key for step in completed for key in step] == ["a", "b", "d", "f", "g"]
+    assert stream.fields == json.loads(text)
+    assert stream.result() == json.loads(text)
+
+
+def test_escaped_quotes_and_backslashes_inside_strings():
+    text = r'{"tagline": "Say \"hi\" \\ bye", "body": "{not a brace}"}'
+    stream, completed = feed_all([text[:15], text[15:32], text[32:]])
+    assert stream.fields == {"tagline": 'Say "hi" \\ bye', "body": "{not a brace}"}
+    assert sum(len(step) for step in completed) == 2
+
+
+def test_nested_values_arrive_whole():
+    stream, completed = feed_all(['{"meta": {"scores": [1, ', '2], "note": "a"}', ', "ok": true}'])
+    assert completed == [{}, {"meta": {"scores": [1, 2], "note": "a"}}, {"ok": True}]
+
+
+@pytest.mark.parametrize("split", range(1, 12))
+def test_scalars_split_across_chunks(split):
+    text = '{"n": 12345, "flag": false, "last": -7}'
+    stream = JSONObjectStream()
+    stream.feed(text[:split])
+    stream.feed(text[split:])
+    assert stream.fields == {"n": 12345, "flag": False, "last": -7}
+
+
+def test_text_around_the_object_is_ignored():
+    stream, _ = feed_all(["```json\n", '{"tagline": "A"}', "\n```"])
+    assert stream.fields == {"tagline": "A"}
+    assert stream.result() == {"tagline": "A"}
+
+
+def test_incomplete_reply_reports_early_fields_but_result_raises():
+    stream, _ = feed_all(['{"tagline": "A", "body": "cut of'])
+    assert stream.fields == {"tagline": "A"}
+    with pytest.raises(json.JSONDecodeError):
+        stream.result()
@@ -0,0 +1,237 @@
+"""Batched, asynchronous analytics pipeline for generated ads and campaigns.
+
+Endpoints call :func:`track`, which only appends the event to a bounded
+in-memory queue and returns immediately, so request latency never waits on
+analytics writes. A background task started from the app lifespan flushes the
+queue in batches to one of the configured sinks:
+
+- ``file`` (default): append-only JSON Lines, or columnar Parquet part files
+  when ``ANALYTICS_FORMAT=parquet`` and ``pyarrow`` is installed.
+- ``clickhouse``: ``INSERT ... FORMAT JSONEachRow`` over ClickHouse's HTTP API.
+- ``none``: events are counted and discarded.
+
+When the queue is full new events are dropped and counted rather than blocking
+the request (backpressure); failed batches are retried once, then dropped.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import httpx
+
+from config.settings import settings
+
+
+# --- 1. CONFIGURATION ---
+
+ANALYTICS_SINK = settings.get("ANALYTICS_SINK", "file").lower()
+ANALYTICS_FORMAT = settings.get("ANALYTICS_FORMAT", "jsonl").lower()
+ANALYTICS_DIR = settings.get("ANALYTICS_DIR", os.path.join("var", "analytics"))
+ANALYTICS_QUEUE_SIZE = settings.get_int("ANALYTICS_QUEUE_SIZE", 10000)
+ANALYTICS_BATCH_SIZE = settings.get_int("ANALYTICS_BATCH_SIZE", 500)
+ANALYTICS_FLUSH_SECONDS = settings.get_float("ANALYTICS_FLUSH_SECONDS", 2.0)
+
+CLICKHOUSE_HOST = settings.get("CLICKHOUSE_HOST", "localhost")
+CLICKHOUSE_PORT = settings.get("CLICKHOUSE_PORT", "8123")
+CLICKHOUSE_USER = settings.get("CLICKHOUSE_USER", "default")
+CLICKHOUSE_PASSWORD = settings.get("CLICKHOUSE_PASSWORD", "")
+CLICKHOUSE_DATABASE = settings.get("CLICKHOUSE_DATABASE", "ai_agent")
+CLICKHOUSE_TABLE = settings.get("CLICKHOUSE_TABLE", "ad_events")
+
+# Fixed column order shared by every sink.
+EVENT_COLUMNS = (
+    "timestamp", "event", "endpoint", "status", "confidence_score", "latency_ms",
+    "prompt_tokens", "completion_tokens", "model", "city", "country", "season", "segment",
+)
+
+
+# --- 2. SINKS ---
+
+class _FileSink:
+    """Append-only local store (JSON Lines, or Parquet part files)."""
+
+    def __init__(self, directory: str, fmt: str) -> None:
+        self.directory = directory
+        self.format = fmt
+        if fmt == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                print("WARNING: pyarrow is not installed; writing analytics as JSON Lines instead of Parquet.")
+                self.format = "jsonl"
+
+    async def write(self, rows: List[Dict[str, Any]]) -> None:
+        await asyncio.to_thread(self._write_sync, rows)
+
+    def _write_sync(self, rows: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        if self.format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pylist(rows)
+            name = f"events-{day}-{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}.parquet"
+            pq.write_table(table, os.path.join(self.directory, name))
+            return
+        with open(os.path.join(self.directory, f"events-{day}.jsonl"), "a", encoding="utf-8") as handle:
+            handle.write("".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows))
+
+    async def close(self) -> None:
+        pass
+
+
+class _ClickHouseSink:
+    """Batch inserts over ClickHouse's HTTP interface."""
+
+    def __init__(self) -> None:
+        self._client = httpx.AsyncClient(
+            base_url=f"http://{CLICKHOUSE_HOST}:{CLICKHOUSE_PORT}",
+            headers={"X-ClickHouse-User": CLICKHOUSE_USER, "X-ClickHouse-Key": CLICKHOUSE_PASSWORD},
+            timeout=10.0,
+        )
+        self._query = f"INSERT INTO {CLICKHOUSE_DATABASE}.{CLICKHOUSE_TABLE} FORMAT JSONEachRow"
+
+    async def write(self, rows: List[Dict[str, Any]]) -> None:
+        body = "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+        response = await self._client.post("/", params={"query": self._query}, content=body.encode("utf-8"))
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class _NullSink:
+    async def write(self, rows: List[Dict[str, Any]]) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+def _build_sink():
+    if ANALYTICS_SINK == "clickhouse":
+        return _ClickHouseSink()
+    if ANALYTICS_SINK == "none":
+        return _NullSink()
+    return _FileSink(ANALYTICS_DIR, ANALYTICS_FORMAT)
+
+
+# --- 3. THE PIPELINE ---
+
+class AnalyticsPipeline:
+    """Bounded in-memory queue plus a background task that flushes it in batches."""
+
+    def __init__(
+        self,
+        sink=None,
+        max_queue: int = ANALYTICS_QUEUE_SIZE,
+        batch_size: int = ANALYTICS_BATCH_SIZE,
+        flush_seconds: float = ANALYTICS_FLUSH_SECONDS,
+    ) -> None:
+        self._sink = sink
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._max_queue = max_queue
+        self._batch_size = batch_size
+        self._flush_seconds = flush_seconds
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats = {"enqueued": 0, "written": 0, "dropped": 0, "failed_batches": 0, "batches": 0}
+
+    def emit(self, row: Dict[str, Any]) -> bool:
+        """Queues one event without blocking; returns False if it was dropped."""
+        if len(self._queue) >= self._max_queue:
+            self.stats["dropped"] += 1
+            return False
+        self._queue.append(row)
+        self.stats["enqueued"] += 1
+        if self._wakeup is not None and len(self._queue) >= self._batch_size:
+            self._wakeup.set()
+        return True
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        if self._sink is None:
+            self._sink = _build_sink()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="analytics-flusher")
+
+    async def stop(self) -> None:
+        """Stops the flusher and writes whatever is still queued."""
+        if self._task is None:
+            return
+        # Not cancelled: a batch is popped before it is written, so the flusher
+        # finishes its current write and then exits.
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        while self._queue:
+            await self._flush_once()
+        await self._sink.close()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._queue:
+                await self._flush_once()
+                if len(self._queue) < self._batch_size:
+                    break
+
+    async def _flush_once(self) -> None:
+        batch = [self._queue.popleft() for _ in range(min(self._batch_size, len(self._queue)))]
+        for attempt in range(2):
+            try:
+                await self._sink.write(batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                return
+            except Exception as exc:
+                if attempt == 0:
+                    await asyncio.sleep(0.5)
+                    continue
+                print(f"WARNING: Dropping {len(batch)} analytics events after a failed write: {exc}")
+        self.stats["failed_batches"] += 1
+        self.stats["dropped"] += len(batch)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"sink": ANALYTICS_SINK, "queued": len(self._queue), **self.stats}
+
+
+_PIPELINE = AnalyticsPipeline()
+
+
+def get_pipeline() -> AnalyticsPipeline:
+    """Returns the process-wide analytics pipeline."""
+    return _PIPELINE
+
+
+def track(event: str, **fields: Any) -> bool:
+    """
+    Records an analytics event without waiting on any I/O.
+
+    Args:
+        event: Event name, e.g. "ad_generated" or "campaign_generated".
+        **fields: Values for the columns in EVENT_COLUMNS (unknown keys are ignored).
+
+    Returns:
+        True if the event was queued, False if it was dropped due to backpressure.
+    """
+    row = {column: fields.get(column) for column in EVENT_COLUMNS}
+    row["timestamp"] = fields.get("timestamp") or time.time()
+    row["event"] = event
+    return _PIPELINE.emit(row)
@@ -0,0 +1,692 @@
+"""Caches with per-entry expiry, in-process or shared between worker processes.
+
+Used for provider lookups whose answers stay valid for a while (current
+weather, OpenWeather city ids, Linkup events, and optionally LLM completions
+and generated images), so repeated requests do not call the provider again.
+
+:class:`TTLCache` is a plain in-process LRU. :class:`SharedCache` is the async,
+namespaced cache the provider helpers use. It stores JSON-serializable values
+in the backend selected by ``CACHE_BACKEND``:
+
+- ``local``: a :class:`TTLCache` per process (default; nothing is shared).
+- ``file``: one small file per entry under ``CACHE_DIR``. The default is
+  ``/dev/shm``, so entries live in shared memory and every worker on the
+  host sees them.
+- ``redis``: any server speaking the Redis protocol at ``CACHE_URL``. For
+  local testing, ``python -m utils.resp_server`` starts a minimal stand-in.
+
+:meth:`SharedCache.get_or_compute` also deduplicates concurrent misses. One
+coroutine per process computes a key, and a short-lived lock entry
+(``SET NX``) makes the other workers wait for its result instead of calling
+the provider themselves. The lock holds a random token and is released with
+a compare-and-delete, so a worker whose lock expired mid-computation never
+deletes the lock a later worker has taken since.
+
+Cache failures never fail a request. If the backend is unreachable, lookups
+count as misses and writes are dropped.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, Generic, Hashable, Iterable, Iterator, List, Mapping, Optional,
+    Tuple, TypeVar,
+)
+from urllib.parse import unquote, urlsplit
+
+from config.settings import settings
+
+try:
+    import fcntl  # POSIX only; without it the file backend's lock release is best effort
+except ImportError:
+    fcntl = None  # type: ignore[assignment]
+
+
+# --- 1. CONFIGURATION ---
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SHM_DIR = "/dev/shm"
+
+CACHE_BACKEND = settings.get("CACHE_BACKEND", "local").lower()
+CACHE_URL = settings.get("CACHE_URL", "redis://localhost:6379/0")
+CACHE_DIR = settings.get(
+    "CACHE_DIR",
+    os.path.join(_SHM_DIR, "autonomous-marketer") if os.path.isdir(_SHM_DIR) else os.path.join(_REPO_ROOT, "var", "cache"),
+)
+CACHE_KEY_PREFIX = settings.get("CACHE_KEY_PREFIX", "am:")
+CACHE_LOCAL_MAXSIZE = settings.get_int("CACHE_LOCAL_MAXSIZE", 50000)
+CACHE_TIMEOUT_SECONDS = settings.get_float("CACHE_TIMEOUT_SECONDS", 1.0)
+# Default for how long other workers wait on a single-flight lock before computing the value themselves.
+CACHE_LOCK_SECONDS = settings.get_float("CACHE_LOCK_SECONDS", 60)
+CACHE_MAX_CONNECTIONS = 32
+
+V = TypeVar("V")
+
+
+# --- 2. IN-PROCESS CACHE ---
+
+class TTLCache(Generic[V]):
+    """
+    Thread-safe LRU cache whose entries expire ``ttl_seconds`` after being set.
+
+    Example:
+        cache = TTLCache(maxsize=1000, ttl_seconds=600)
+        cache.set(("sydney", "AU"), weather)
+        cache.get(("sydney", "AU"))  # -> weather, or None once expired
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 300.0) -> None:
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+
+    def _get_locked(self, key: Hashable, now: float) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= now:
+            if entry is not None:
+                del self._entries[key]
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def _set_locked(self, key: Hashable, value: V, expires_at: float) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        self.stats["sets"] += 1
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Returns the cached value, or None if missing or expired."""
+        with self._lock:
+            return self._get_locked(key, time.monotonic())
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, V]:
+        """Returns the live entries among ``keys`` (misses are left out)."""
+        now = time.monotonic()
+        found: Dict[Hashable, V] = {}
+        with self._lock:
+            for key in keys:
+                value = self._get_locked(key, now)
+                if value is not None:
+                    found[key] = value
+        return found
+
+    def set(self, key: Hashable, value: V, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._set_locked(key, value, time.monotonic() + ttl)
+
+    def set_many(self, items: Mapping[Hashable, V], ttl_seconds: Optional[float] = None) -> None:
+        """Stores several entries under one lock acquisition, all with the same expiry."""
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            for key, value in items.items():
+                self._set_locked(key, value, expires_at)
+
+    def add(self, key: Hashable, value: V, ttl_seconds: Optional[float] = None) -> bool:
+        """Stores the entry only if the key is missing or expired; returns whether it was stored."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return False
+            self._set_locked(key, value, now + ttl)
+            return True
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_if(self, key: Hashable, value: V) -> bool:
+        """Deletes the entry only while it still holds ``value``; returns whether it was deleted."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != value:
+                return False
+            del self._entries[key]
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "maxsize": self.maxsize, **self.stats}
+
+
+# --- 3. SHARED BACKENDS ---
+
+class CacheBackend:
+    """Storage behind :class:`SharedCache`. Keys are strings, values JSON-serializable."""
+
+    name = "base"
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def set_many(self, items: Mapping[str, Any], ttl_seconds: float) -> None:
+        raise NotImplementedError
+
+    async def add(self, key: str, value: Any, ttl_seconds: float) -> bool:
+        """Atomic set-if-absent (``SET NX``), used for cross-worker locks."""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def delete_if(self, key: str, value: Any) -> bool:
+        """Atomic compare-and-delete, used to release a lock taken with :meth:`add`."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class LocalCacheBackend(CacheBackend):
+    """Per-process backend; values are kept as-is, not serialized."""
+
+    name = "local"
+
+    def __init__(self, maxsize: int = CACHE_LOCAL_MAXSIZE) -> None:
+        self._cache: TTLCache[Any] = TTLCache(maxsize=maxsize)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        return self._cache.get_many(keys)
+
+    async def set_many(self, items: Mapping[str, Any], ttl_seconds: float) -> None:
+        self._cache.set_many(items, ttl_seconds)
+
+    async def add(self, key: str, value: Any, ttl_seconds: float) -> bool:
+        return self._cache.add(key, value, ttl_seconds)
+
+    async def delete(self, key: str) -> None:
+        self._cache.delete(key)
+
+    async def delete_if(self, key: str, value: Any) -> bool:
+        return self._cache.delete_if(key, value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": self.name, **self._cache.snapshot()}
+
+
+class FileCacheBackend(CacheBackend):
+    """
+    One JSON file per entry, shared by every process that uses the same directory.
+
+    On tmpfs (``/dev/shm``, the default) reads and writes are memory copies, so
+    the calls are made inline. Writes go to a temporary file that is renamed
+    into place. :meth:`add` hard-links it, which fails atomically if the entry
+    already exists. :meth:`add` and :meth:`delete_if` also hold an exclusive
+    ``flock`` on the directory's lock file, so a lock cannot be replaced
+    between delete_if's read and its removal. Expired files are removed when
+    read and by a periodic sweep.
+    """
+
+    name = "file"
+    SWEEP_EVERY = 1000  # writes between sweeps of expired files
+
+    def __init__(self, directory: str = CACHE_DIR) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._writes = 0
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        with open(os.path.join(self.directory, ".lock"), "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)  # Released when the file is closed
+            yield
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    def _read(self, path: str, now: float) -> Optional[Any]:
+        try:
+            with open(path, encoding="utf-8") as handle:
+                entry = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if entry["expires_at"] <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry["value"]
+
+    def _write_temp(self, path: str, value: Any, ttl_seconds: float) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump({"expires_at": time.time() + ttl_seconds, "value": value}, handle)
+        return temp_path
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        now = time.time()
+        found = {}
+        for key in keys:
+            value = self._read(self._path(key), now)
+            if value is not None:
+                found[key] = value
+        return found
+
+    async def set_many(self, items: Mapping[str, Any], ttl_seconds: float) -> None:
+        for key, value in items.items():
+            path = self._path(key)
+            os.replace(self._write_temp(path, value, ttl_seconds), path)
+        self._writes += len(items)
+        if self._writes >= self.SWEEP_EVERY:
+            self._writes = 0
+            self.sweep()
+
+    async def add(self, key: str, value: Any, ttl_seconds: float) -> bool:
+        path = self._path(key)
+        temp_path = self._write_temp(path, value, ttl_seconds)
+        try:
+            with self._exclusive():
+                for _ in range(2):
+                    try:
+                        os.link(temp_path, path)
+                        return True
+                    except FileExistsError:
+                        if self._read(path, time.time()) is not None:
+                            return False
+                        # Expired (and removed by _read): try once more.
+                return False
+        finally:
+            os.remove(temp_path)
+
+    async def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def delete_if(self, key: str, value: Any) -> bool:
+        path = self._path(key)
+        with self._exclusive():
+            try:
+                with open(path, encoding="utf-8") as handle:
+                    if json.load(handle)["value"] != value:
+                        return False
+                os.remove(path)
+            except (OSError, ValueError):
+                return False  # Gone already (e.g. expired and swept)
+        return True
+
+    def sweep(self) -> int:
+        """Removes expired entries; returns how many files are left."""
+        now = time.time()
+        remaining = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json") and self._read(os.path.join(root, name), now) is not None:
+                    remaining += 1
+        return remaining
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": self.name, "directory": self.directory}
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class _RespConnection:
+    """One connection speaking RESP2; commands are pipelined, replies read in order."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    @staticmethod
+    def encode(command: Tuple[Any, ...]) -> bytes:
+        parts = [b"*%d\r\n" % len(command)]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def read_reply(self) -> Any:
+        line = await self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Cache server closed the connection")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode("utf-8")
+        if kind == b"-":
+            return RespError(body.decode("utf-8"))
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            return None if length < 0 else (await self.reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(body)
+            return None if length < 0 else [await self.read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply from cache server: {line[:40]!r}")
+
+    async def execute(self, commands: List[Tuple[Any, ...]]) -> List[Any]:
+        self.writer.write(b"".join(self.encode(command) for command in commands))
+        await self.writer.drain()
+        # Read every reply before raising, so the connection stays in sync.
+        replies = [await self.read_reply() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+# Compare-and-delete in one step on the server (also understood by utils/resp_server.py).
+RELEASE_SCRIPT = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end"
+)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Backend for Redis, Valkey, KeyDB or any other server speaking the Redis protocol.
+
+    A small built-in client keeps a pool of connections for each event loop.
+    Values are stored as JSON strings with a millisecond TTL (``SET ... PX``).
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = CACHE_URL, max_connections: int = CACHE_MAX_CONNECTIONS) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ("redis", ""):
+            raise ValueError(f"Unsupported CACHE_URL scheme '{parts.scheme}' (expected redis://)")
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.max_connections = max_connections
+        self._idle: List[_RespConnection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _connect(self) -> _RespConnection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        connection = _RespConnection(reader, writer)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            await connection.execute(setup)
+        return connection
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[_RespConnection]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Connections cannot be shared across event loops (e.g. successive test clients).
+            self._idle, self._slots, self._loop = [], asyncio.Semaphore(self.max_connections), loop
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else await self._connect()
+            try:
+                yield connection
+            except BaseException:
+                connection.close()
+                raise
+            self._idle.append(connection)
+
+    async def execute(self, *commands: Tuple[Any, ...]) -> List[Any]:
+        async def run() -> List[Any]:
+            async with self._connection() as connection:
+                return await connection.execute(list(commands))
+
+        return await asyncio.wait_for(run(), CACHE_TIMEOUT_SECONDS)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        (values,) = await self.execute(("MGET", *keys))
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    async def set_many(self, items: Mapping[str, Any], ttl_seconds: float) -> None:
+        if items:
+            milliseconds = max(1, int(ttl_seconds * 1000))
+            await self.execute(*(("SET", key, json.dumps(value), "PX", milliseconds) for key, value in items.items()))
+
+    async def add(self, key: str, value: Any, ttl_seconds: float) -> bool:
+        (reply,) = await self.execute(("SET", key, json.dumps(value), "PX", max(1, int(ttl_seconds * 1000)), "NX"))
+        return reply == "OK"
+
+    async def delete(self, key: str) -> None:
+        await self.execute(("DEL", key))
+
+    async def delete_if(self, key: str, value: Any) -> bool:
+        (reply,) = await self.execute(("EVAL", RELEASE_SCRIPT, 1, key, json.dumps(value)))
+        return reply == 1
+
+    async def close(self) -> None:
+        for connection in self._idle:
+            connection.close()
+        self._idle = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": self.name, "host": self.host, "port": self.port, "db": self.db, "idle_connections": len(self._idle)}
+
+
+_BACKEND: Optional[CacheBackend] = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def create_backend(kind: str = CACHE_BACKEND) -> CacheBackend:
+    """Builds the backend named by ``CACHE_BACKEND`` (local | file | redis)."""
+    if kind == "local":
+        return LocalCacheBackend()
+    if kind == "file":
+        return FileCacheBackend()
+    if kind == "redis":
+        return RedisCacheBackend()
+    raise ValueError(f"Unknown CACHE_BACKEND '{kind}' (expected local, file or redis)")
+
+
+def get_cache_backend() -> CacheBackend:
+    """Returns the process-wide backend, creating it on first use."""
+    global _BACKEND
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            _BACKEND = create_backend()
+        return _BACKEND
+
+
+async def close_cache_backend() -> None:
+    """Releases backend connections; called from the app's shutdown hook."""
+    if _BACKEND is not None:
+        await _BACKEND.close()
+
+
+# --- 4. NAMESPACED SHARED CACHE ---
+
+_NAMESPACES: Dict[str, "SharedCache"] = {}
+_last_failure_report = 0.0
+
+
+def _report_failure(operation: str, exc: Exception) -> None:
+    # At most one warning per 30 seconds while the backend is down.
+    global _last_failure_report
+    if time.monotonic() - _last_failure_report > 30:
+        _last_failure_report = time.monotonic()
+        print(f"WARNING: Cache {operation} failed ({type(exc).__name__}: {exc}); continuing without the cache.")
+
+
+class SharedCache:
+    """
+    Async cache for one kind of value, stored in the configured backend.
+
+    Example:
+        weather_cache = SharedCache("weather", ttl_seconds=600)
+        context = await weather_cache.get_or_compute("sydney|AU", fetch_sydney)
+    """
+
+    def __init__(self, namespace: str, ttl_seconds: float, backend: Optional[CacheBackend] = None) -> None:
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self._backend = backend
+        self._in_flight: Dict[str, "asyncio.Task[Any]"] = {}
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "errors": 0, "computed": 0, "lock_waits": 0, "lock_expired": 0}
+        _NAMESPACES[namespace] = self
+
+    @property
+    def backend(self) -> CacheBackend:
+        return self._backend or get_cache_backend()
+
+    def _key(self, key: str) -> str:
+        return f"{CACHE_KEY_PREFIX}{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        return (await self.get_many([key])).get(key)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Returns the live entries among ``keys`` (misses are left out)."""
+        keys = list(keys)
+        try:
+            stored = await self.backend.get_many([self._key(key) for key in keys])
+        except Exception as exc:
+            self.stats["errors"] += 1
+            _report_failure("read", exc)
+            stored = {}
+        found = {key: stored[self._key(key)] for key in keys if self._key(key) in stored}
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(keys) - len(found)
+        return found
+
+    async def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        await self.set_many({key: value}, ttl_seconds)
+
+    async def set_many(self, items: Mapping[str, Any], ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        try:
+            await self.backend.set_many({self._key(key): value for key, value in items.items()}, ttl)
+        except Exception as exc:
+            self.stats["errors"] += 1
+            _report_failure("write", exc)
+            return
+        self.stats["sets"] += len(items)
+
+    async def add(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        """Set-if-absent. If the backend is unreachable, returns True so the caller proceeds alone."""
+        try:
+            return await self.backend.add(self._key(key), value, self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        except Exception as exc:
+            self.stats["errors"] += 1
+            _report_failure("lock", exc)
+            return True
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self.backend.delete(self._key(key))
+        except Exception as exc:
+            self.stats["errors"] += 1
+            _report_failure("delete", exc)
+
+    async def delete_if(self, key: str, value: Any) -> bool:
+        """Deletes the entry only while it still holds ``value`` (e.g. a lock's own token)."""
+        try:
+            return await self.backend.delete_if(self._key(key), value)
+        except Exception as exc:
+            self.stats["errors"] += 1
+            _report_failure("delete", exc)
+            return False
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl_seconds: Optional[float] = None,
+        lock_seconds: float = CACHE_LOCK_SECONDS,
+    ) -> Any:
+        """
+        Returns the cached value, or computes it once across all workers.
+
+        Concurrent callers in this process share one computation. Other
+        workers wait on a lock entry until the value appears (up to
+        ``lock_seconds``, after which they compute it themselves), so pass
+        roughly the longest time ``compute`` may take.
+        ``None`` results and exceptions are not cached.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+        loop = asyncio.get_running_loop()
+        task = self._in_flight.get(key)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(self._compute_once(key, compute, ttl_seconds, lock_seconds))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _compute_once(
+        self, key: str, compute: Callable[[], Awaitable[Any]], ttl_seconds: Optional[float], lock_seconds: float
+    ) -> Any:
+        lock_key = f"{key}#lock"
+        token = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        deadline = time.monotonic() + lock_seconds
+        delay = 0.02
+        locked = await self.add(lock_key, token, lock_seconds)
+        if not locked:
+            self.stats["lock_waits"] += 1
+        while not locked:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            value = await self.get(key)
+            if value is not None:
+                return value
+            if time.monotonic() > deadline:
+                break  # The other worker is stuck or gone: compute it here.
+            locked = await self.add(lock_key, token, lock_seconds)
+        try:
+            if locked:
+                # Another worker may have finished between our read and taking the lock.
+                value = await self.get(key)
+                if value is not None:
+                    return value
+            value = await compute()
+            self.stats["computed"] += 1
+            if value is not None:
+                await self.set(key, value, ttl_seconds)
+            return value
+        finally:
+            if locked and not await self.delete_if(lock_key, token):
+                # The lock expired while computing and another worker may hold it now: leave it.
+                self.stats["lock_expired"] += 1
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Backend description plus per-namespace hit/miss counters of this worker."""
+    return {
+        **get_cache_backend().snapshot(),
+        "pid": os.getpid(),
+        "namespaces": {name: {"ttl_seconds": cache.ttl_seconds, **cache.stats} for name, cache in _NAMESPACES.items()},
+    }
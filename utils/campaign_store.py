@@ -0,0 +1,201 @@
+"""Persistent, indexed store for generated campaigns (SQLite).
+
+Every campaign the agent generates is saved with the context it was generated
+for (city, country, season, temperature bucket, event, product, segment), so
+dashboards can read existing campaigns in milliseconds instead of paying for a
+new pipeline run. Lookup columns use ``COLLATE NOCASE`` so equality and prefix
+(``LIKE 'gen z%'``) filters are served by the indexes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from config.settings import settings
+
+
+# --- 1. CONFIGURATION ---
+
+CAMPAIGN_STORE_PATH = settings.get("CAMPAIGN_STORE_PATH", os.path.join("var", "campaigns.sqlite3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    city TEXT NOT NULL COLLATE NOCASE,
+    country TEXT COLLATE NOCASE,
+    season TEXT COLLATE NOCASE,
+    temperature_bucket TEXT,
+    event TEXT,
+    product TEXT COLLATE NOCASE,
+    segment TEXT COLLATE NOCASE,
+    campaign TEXT NOT NULL,
+    context TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_campaigns_city_season_segment
+    ON campaigns (city, season, segment, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_campaigns_country_season_segment
+    ON campaigns (country, season, segment, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_campaigns_segment
+    ON campaigns (segment, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_campaigns_created_at
+    ON campaigns (created_at DESC);
+"""
+
+KIND_OPPORTUNITY = "opportunity"
+KIND_MULTI_DEMOGRAPHIC = "multi_demographic"
+
+
+# --- 2. THE STORE ---
+
+class CampaignStore:
+    """Thread-safe wrapper around one SQLite connection (WAL mode)."""
+
+    def __init__(self, path: str = CAMPAIGN_STORE_PATH) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def save(
+        self,
+        kind: str,
+        context: Dict[str, Any],
+        campaigns: Iterable[Dict[str, Any]],
+    ) -> List[int]:
+        """
+        Persists campaigns generated from one request.
+
+        Args:
+            kind: KIND_OPPORTUNITY or KIND_MULTI_DEMOGRAPHIC.
+            context: Request-level inputs; the keys city, country, season,
+                temperature_bucket, event and product are indexed.
+            campaigns: Campaign payloads; a "demographic_segment" key is indexed.
+
+        Returns:
+            The row ids of the stored campaigns.
+        """
+        now = time.time()
+        context_json = json.dumps(context, separators=(",", ":"))
+        rows = [
+            (
+                now, kind, context["city"], context.get("country"), context.get("season"),
+                context.get("temperature_bucket"), context.get("event"), context.get("product"),
+                campaign.get("demographic_segment"), json.dumps(campaign, separators=(",", ":")), context_json,
+            )
+            for campaign in campaigns
+        ]
+        ids = []
+        with self._lock, self._conn:
+            for row in rows:
+                cursor = self._conn.execute(
+                    "INSERT INTO campaigns (created_at, kind, city, country, season, temperature_bucket, "
+                    "event, product, segment, campaign, context) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def latest(
+        self,
+        *,
+        city: Optional[str] = None,
+        country: Optional[str] = None,
+        season: Optional[str] = None,
+        segment: Optional[str] = None,
+        temperature_bucket: Optional[str] = None,
+        product: Optional[str] = None,
+        kind: Optional[str] = None,
+        since: Optional[float] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the newest campaigns matching every given filter.
+
+        ``segment`` is a case-insensitive prefix, so "Gen Z" matches
+        "Gen Z Professionals"; the other text filters are case-insensitive
+        equality. Example: latest(city="Sydney", season="summer", segment="Gen Z").
+        """
+        clauses, params = [], []
+        for column, value in (
+            ("city", city), ("country", country), ("season", season),
+            ("temperature_bucket", temperature_bucket), ("product", product), ("kind", kind),
+        ):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if segment:
+            clauses.append("segment LIKE ? ESCAPE '\\'")
+            params.append(segment.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(max(1, min(limit, 500)))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM campaigns {where} ORDER BY created_at DESC, id DESC LIMIT ?", params
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    record = dict(row)
+    record["campaign"] = json.loads(record["campaign"])
+    record["context"] = json.loads(record["context"])
+    return record
+
+
+# --- 3. PROCESS-WIDE ACCESS ---
+
+_STORE: Optional[CampaignStore] = None
+_STORE_LOCK = threading.Lock()
+_PENDING_WRITES: Set[asyncio.Task] = set()
+
+
+def get_campaign_store() -> CampaignStore:
+    """Returns the process-wide store, opening the database on first use."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = CampaignStore()
+        return _STORE
+
+
+def save_in_background(kind: str, context: Dict[str, Any], campaigns: List[Dict[str, Any]]) -> None:
+    """Schedules a save on a worker thread so the response never waits on disk I/O."""
+    task = asyncio.create_task(asyncio.to_thread(_save_quietly, kind, context, campaigns))
+    _PENDING_WRITES.add(task)
+    task.add_done_callback(_PENDING_WRITES.discard)
+
+
+async def flush_pending_writes() -> None:
+    """Waits for scheduled saves (used on shutdown)."""
+    if _PENDING_WRITES:
+        await asyncio.gather(*list(_PENDING_WRITES), return_exceptions=True)
+
+
+def _save_quietly(kind: str, context: Dict[str, Any], campaigns: List[Dict[str, Any]]) -> None:
+    try:
+        get_campaign_store().save(kind, context, campaigns)
+    except sqlite3.Error as exc:
+        print(f"WARNING: Could not persist campaigns for {context.get('city')}: {exc}")
@@ -0,0 +1,264 @@
+"""Priority-aware admission to the LLM gateway and Freepik.
+
+Interactive requests and bulk jobs (pre-generation, batch clients) share the
+same provider quota. Every LLM call and every Freepik task submission first
+takes a slot from a :class:`CapacityPool` (``LLM_MAX_CONCURRENCY`` and
+``FREEPIK_MAX_CONCURRENCY`` slots per worker; a render's polling holds no
+slot, so a few long renders cannot block everyone else). When all slots are busy,
+waiters are admitted:
+
+1. across priority classes by weighted fair queuing (``PRIORITY_WEIGHTS``,
+   interactive 8 : batch 1 by default), so batch work still moves while
+   dashboards are busy. Batch work may also hold at most
+   ``PRIORITY_BATCH_MAX_SHARE`` of the slots, which leaves room for
+   interactive requests arriving in the middle of a large batch;
+2. within a class, across tenants by weighted fair queuing
+   (``TENANT_WEIGHTS``, default 1 each), so one tenant's burst does not
+   delay the others;
+3. first come, first served within a tenant.
+
+The class and tenant come from the ``X-Priority`` and ``X-Tenant-ID`` request
+headers (see :class:`PriorityMiddleware`) or from :func:`priority_context`
+for work started outside a request. Queue waits are recorded as
+``queue.<pool>.<class>`` stages (utils/metrics.py) and summarized by
+:func:`capacity_stats`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config.settings import settings
+from utils.metrics import record_stage, summarize
+
+
+# --- 1. CONFIGURATION ---
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    """Parses "interactive:8,batch:1" into {"interactive": 8.0, "batch": 1.0}."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.rpartition(":")
+        try:
+            weights[name.strip()] = max(float(weight), 0.01)
+        except ValueError:
+            print(f"WARNING: Ignoring weight '{item}' (expected name:number).")
+    return weights
+
+
+PRIORITY_WEIGHTS = {INTERACTIVE: 8.0, BATCH: 1.0, **_parse_weights(settings.get("PRIORITY_WEIGHTS", ""))}
+PRIORITY_BATCH_MAX_SHARE = settings.get_float("PRIORITY_BATCH_MAX_SHARE", 0.5)
+TENANT_WEIGHTS = _parse_weights(settings.get("TENANT_WEIGHTS", ""))
+DEFAULT_TENANT = "default"
+# 0 = no limit (calls are never queued).
+LLM_MAX_CONCURRENCY = settings.get_int("LLM_MAX_CONCURRENCY", 16)
+FREEPIK_MAX_CONCURRENCY = settings.get_int("FREEPIK_MAX_CONCURRENCY", 6)
+
+MAX_WAIT_SAMPLES = 2000
+
+_PRIORITY: contextvars.ContextVar[str] = contextvars.ContextVar("priority", default=INTERACTIVE)
+_TENANT: contextvars.ContextVar[str] = contextvars.ContextVar("tenant", default=DEFAULT_TENANT)
+
+
+def normalize_priority(value: Optional[str]) -> str:
+    """Maps a priority hint to a known class; unknown or missing hints count as interactive."""
+    value = (value or "").strip().lower()
+    return value if value in PRIORITY_WEIGHTS else INTERACTIVE
+
+
+@contextmanager
+def priority_context(priority: str = INTERACTIVE, tenant: str = DEFAULT_TENANT) -> Iterator[None]:
+    """Runs the enclosed code (and tasks it starts) under a priority class and tenant."""
+    priority_token = _PRIORITY.set(normalize_priority(priority))
+    tenant_token = _TENANT.set(tenant or DEFAULT_TENANT)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(priority_token)
+        _TENANT.reset(tenant_token)
+
+
+def current_priority() -> Tuple[str, str]:
+    return _PRIORITY.get(), _TENANT.get()
+
+
+# --- 2. THE POOL ---
+
+class _Flow:
+    """Waiters of one (class, tenant) or the tenants of one class, with a stride-scheduling pass value."""
+
+    __slots__ = ("weight", "pass_value", "waiters", "children")
+
+    def __init__(self, weight: float) -> None:
+        self.weight = weight
+        self.pass_value = 0.0
+        self.waiters: Deque[Tuple[asyncio.Future, float]] = deque()
+        self.children: Dict[str, "_Flow"] = {}
+
+
+def _activate(flow: _Flow, siblings: Dict[str, _Flow]) -> None:
+    # A flow that was idle starts level with the busy ones instead of cashing in saved-up credit.
+    busy = [other.pass_value for other in siblings.values() if other is not flow and _has_waiters(other)]
+    if busy:
+        flow.pass_value = max(flow.pass_value, min(busy))
+
+
+def _has_waiters(flow: _Flow) -> bool:
+    return bool(flow.waiters) or any(_has_waiters(child) for child in flow.children.values())
+
+
+class CapacityPool:
+    """
+    A fixed number of slots shared by priority classes and tenants.
+
+    Example:
+        async with get_pool("llm").slot():
+            response = await client.chat.completions.create(...)
+    """
+
+    def __init__(self, name: str, capacity: int) -> None:
+        self.name = name
+        self.capacity = capacity
+        self._classes: Dict[str, _Flow] = {}
+        self._in_use: Dict[str, int] = {}
+        self._waits: Dict[str, Deque[float]] = {}
+        self._granted: Dict[str, int] = {}
+
+    def _class_limit(self, priority: str) -> int:
+        if priority == BATCH:
+            return max(1, int(self.capacity * PRIORITY_BATCH_MAX_SHARE))
+        return self.capacity
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Holds one slot for the enclosed call, queueing by the current priority and tenant."""
+        priority, tenant = current_priority()
+        waited = await self._acquire(priority, tenant)
+        if self.capacity > 0:
+            record_stage(f"queue.{self.name}.{priority}", waited)
+        self._waits.setdefault(priority, deque(maxlen=MAX_WAIT_SAMPLES)).append(waited)
+        self._granted[priority] = self._granted.get(priority, 0) + 1
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    async def _acquire(self, priority: str, tenant: str) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        cls = self._classes.get(priority)
+        if cls is None:
+            cls = self._classes[priority] = _Flow(PRIORITY_WEIGHTS.get(priority, 1.0))
+        flow = cls.children.get(tenant)
+        if flow is None:
+            flow = cls.children[tenant] = _Flow(TENANT_WEIGHTS.get(tenant, 1.0))
+        if not _has_waiters(cls):
+            _activate(cls, self._classes)
+        if not flow.waiters:
+            _activate(flow, cls.children)
+
+        future = asyncio.get_running_loop().create_future()
+        enqueued = time.perf_counter()
+        flow.waiters.append((future, enqueued))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(priority)  # Granted just as the caller gave up
+            else:
+                flow.waiters = deque(item for item in flow.waiters if item[0] is not future)
+                if not flow.waiters:
+                    cls.children.pop(tenant, None)
+            raise
+        return time.perf_counter() - enqueued
+
+    def _release(self, priority: str) -> None:
+        if self.capacity <= 0:
+            return
+        self._in_use[priority] -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while sum(self._in_use.values()) < self.capacity:
+            eligible = [
+                (cls.pass_value, name) for name, cls in self._classes.items()
+                if _has_waiters(cls) and self._in_use.get(name, 0) < self._class_limit(name)
+            ]
+            if not eligible:
+                return
+            _, name = min(eligible)
+            cls = self._classes[name]
+            _, tenant = min((flow.pass_value, tenant) for tenant, flow in cls.children.items() if flow.waiters)
+            flow = cls.children[tenant]
+            future, _ = flow.waiters.popleft()
+            if not flow.waiters:
+                del cls.children[tenant]  # Idle tenants are not kept around
+            if future.done():
+                continue  # Cancelled while queued
+            cls.pass_value += 1 / cls.weight
+            flow.pass_value += 1 / flow.weight
+            self._in_use[name] = self._in_use.get(name, 0) + 1
+            future.set_result(None)
+
+    def snapshot(self) -> Dict[str, object]:
+        classes = {}
+        for name in sorted(set(self._classes) | set(self._waits)):
+            cls = self._classes.get(name)
+            classes[name] = {
+                "weight": PRIORITY_WEIGHTS.get(name, 1.0),
+                "max_slots": self._class_limit(name),
+                "in_use": self._in_use.get(name, 0),
+                "waiting": sum(len(flow.waiters) for flow in cls.children.values()) if cls else 0,
+                "waiting_tenants": sorted(tenant for tenant, flow in cls.children.items() if flow.waiters) if cls else [],
+                "granted": self._granted.get(name, 0),
+                "queue_wait_ms": summarize(self._waits.get(name, [])),
+            }
+        return {"capacity": self.capacity or None, "in_use": sum(self._in_use.values()), "classes": classes}
+
+
+_POOLS: Dict[str, CapacityPool] = {}
+
+
+def get_pool(name: str) -> CapacityPool:
+    """The process-wide pool for a provider ("llm" or "freepik")."""
+    pool = _POOLS.get(name)
+    if pool is None:
+        capacity = {"llm": LLM_MAX_CONCURRENCY, "freepik": FREEPIK_MAX_CONCURRENCY}.get(name, 0)
+        pool = _POOLS[name] = CapacityPool(name, capacity)
+    return pool
+
+
+def capacity_stats() -> Dict[str, object]:
+    """Slots in use, queue lengths and queue-wait percentiles per pool and class."""
+    return {name: pool.snapshot() for name, pool in sorted(_POOLS.items())}
+
+
+# --- 3. REQUEST HINTS ---
+
+class PriorityMiddleware:
+    """Sets the priority class and tenant of each request from ``X-Priority`` / ``X-Tenant-ID``."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        priority = headers.get(b"x-priority", b"").decode("latin-1")
+        tenant = headers.get(b"x-tenant-id", b"").decode("latin-1").strip()[:64]
+        with priority_context(priority, tenant):
+            await self.app(scope, receive, send)
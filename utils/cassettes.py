@@ -0,0 +1,294 @@
+"""Record/replay cassettes for provider HTTP traffic.
+
+A cassette is a gzip-compressed JSON Lines file holding one provider exchange
+per line (LLM calls, Freepik task start and polls, Linkup searches, OpenWeather
+lookups). Recording wraps the real (or simulated) transport; replay serves the
+recorded responses with no network access, sleeping for the original latency
+multiplied by ``CASSETTE_TIME_SCALE`` (``0`` replays instantly).
+
+Configuration:
+    PROVIDER_CASSETTE=cassettes/sydney.jsonl.gz
+    CASSETTE_MODE=record | replay
+    CASSETTE_TIME_SCALE=1.0
+    CASSETTE_STRICT=False   # True: fail on requests with no exact recorded match
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+from config.settings import settings
+
+
+# --- 1. CONFIGURATION ---
+
+CASSETTE_PATH = settings.get("PROVIDER_CASSETTE")
+CASSETTE_MODE = (settings.get("CASSETTE_MODE") or "").lower() if CASSETTE_PATH else ""
+CASSETTE_TIME_SCALE = settings.get_float("CASSETTE_TIME_SCALE", 1.0)
+CASSETTE_STRICT = settings.get_bool("CASSETTE_STRICT", False)
+
+# Query parameters that carry credentials and must never reach disk.
+SECRET_QUERY_PARAMS = {"appid", "api_key", "apikey", "key", "token"}
+# Response headers worth keeping; everything else is dropped to keep cassettes small.
+RECORDED_HEADERS = ("content-type", "retry-after")
+
+
+class CassetteMissError(Exception):
+    """Raised in strict replay mode when a request has no recorded exchange."""
+
+
+@dataclass
+class Exchange:
+    """One recorded request/response pair."""
+
+    method: str
+    url: str
+    body_digest: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    offset: float  # Seconds since the start of the recording
+    elapsed: float  # Seconds the provider took to answer
+    used: bool = False
+
+    @property
+    def key(self) -> str:
+        return f"{self.method} {self.url} {self.body_digest}"
+
+    @property
+    def route(self) -> str:
+        return f"{self.method} {self.url.split('?', 1)[0]}"
+
+    def to_line(self) -> str:
+        try:
+            body: Dict[str, str] = {"text": self.body.decode("utf-8")}
+        except UnicodeDecodeError:
+            body = {"base64": base64.b64encode(self.body).decode("ascii")}
+        return json.dumps({
+            "method": self.method,
+            "url": self.url,
+            "body_digest": self.body_digest,
+            "status": self.status,
+            "headers": self.headers,
+            "offset": round(self.offset, 4),
+            "elapsed": round(self.elapsed, 4),
+            **body,
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_line(cls, line: str) -> "Exchange":
+        data = json.loads(line)
+        body = base64.b64decode(data["base64"]) if "base64" in data else data.get("text", "").encode("utf-8")
+        return cls(
+            method=data["method"],
+            url=data["url"],
+            body_digest=data["body_digest"],
+            status=data["status"],
+            headers=data.get("headers", {}),
+            body=body,
+            offset=data.get("offset", 0.0),
+            elapsed=data.get("elapsed", 0.0),
+        )
+
+    def to_response(self) -> httpx.Response:
+        return httpx.Response(self.status, headers=self.headers, content=self.body)
+
+
+def _sanitize_url(url: httpx.URL) -> str:
+    query = [(k, v) for k, v in parse_qsl(url.query.decode()) if k.lower() not in SECRET_QUERY_PARAMS]
+    base = f"{url.scheme}://{url.host}{url.path}"
+    return f"{base}?{urlencode(sorted(query))}" if query else base
+
+
+def _body_digest(content: bytes) -> str:
+    """Digest of the request body; JSON bodies are canonicalized first."""
+    if not content:
+        return ""
+    try:
+        content = json.dumps(json.loads(content), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except ValueError:
+        pass
+    return hashlib.sha1(content).hexdigest()[:16]
+
+
+# --- 2. THE CASSETTE ---
+
+class Cassette:
+    """Thread-safe store of exchanges backed by a gzip JSON Lines file."""
+
+    def __init__(self, path: str, time_scale: float = 1.0, strict: bool = False) -> None:
+        self.path = path
+        self.time_scale = time_scale
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._by_key: Dict[str, Deque[Exchange]] = defaultdict(deque)
+        self._by_route: Dict[str, Deque[Exchange]] = defaultdict(deque)
+        self._last: Dict[str, Exchange] = {}
+
+    # -- recording ---------------------------------------------------------
+
+    def record(self, request: httpx.Request, response: httpx.Response, started: float, elapsed: float) -> None:
+        exchange = Exchange(
+            method=request.method,
+            url=_sanitize_url(request.url),
+            body_digest=_body_digest(request.content),
+            status=response.status_code,
+            headers={k: v for k, v in response.headers.items() if k.lower() in RECORDED_HEADERS},
+            body=response.content,
+            offset=started - self._started,
+            elapsed=elapsed,
+        )
+        line = exchange.to_line() + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Each append is its own gzip member, which gzip readers concatenate transparently.
+            with _open(self.path, "at") as handle:
+                handle.write(line)
+
+    # -- replay ------------------------------------------------------------
+
+    def load(self) -> "Cassette":
+        with self._lock, _open(self.path, "rt") as handle:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                exchange = Exchange.from_line(line)
+                self._by_key[exchange.key].append(exchange)
+                self._by_route[exchange.route].append(exchange)
+        return self
+
+    def lookup(self, request: httpx.Request) -> Exchange:
+        """Returns the next unused recorded exchange for a request.
+
+        Exact matches (method, URL and body) are preferred; outside strict mode
+        the next exchange on the same route is used instead. Once a key is
+        exhausted, its last response is repeated (e.g. extra Freepik polls).
+        """
+        url = _sanitize_url(request.url)
+        key = f"{request.method} {url} {_body_digest(request.content)}"
+        route = f"{request.method} {url.split('?', 1)[0]}"
+        with self._lock:
+            exchange = _next_unused(self._by_key.get(key))
+            if exchange is None and not self.strict:
+                exchange = _next_unused(self._by_route.get(route))
+            if exchange is None:
+                exchange = self._last.get(key) or (None if self.strict else self._last.get(route))
+            if exchange is None:
+                raise CassetteMissError(f"No recorded exchange for {request.method} {url}")
+            exchange.used = True
+            self._last[key] = self._last[route] = exchange
+            return exchange
+
+    def summary(self) -> Dict[str, Any]:
+        exchanges: List[Exchange] = [e for queue in self._by_route.values() for e in queue]
+        per_host: Dict[str, int] = defaultdict(int)
+        for exchange in exchanges:
+            per_host[httpx.URL(exchange.url).host] += 1
+        return {
+            "exchanges": len(exchanges),
+            "per_host": dict(per_host),
+            "span_seconds": round(max((e.offset + e.elapsed for e in exchanges), default=0.0), 3),
+            "total_provider_seconds": round(sum(e.elapsed for e in exchanges), 3),
+        }
+
+
+def _next_unused(queue: Optional[Deque[Exchange]]) -> Optional[Exchange]:
+    while queue:
+        exchange = queue.popleft()
+        if not exchange.used:
+            return exchange
+    return None
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8")
+    return open(path, mode.replace("t", ""), encoding="utf-8")
+
+
+# --- 3. TRANSPORTS ---
+
+class RecordingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Forwards requests to ``inner`` and appends every exchange to the cassette."""
+
+    def __init__(self, cassette: Cassette, inner: Any) -> None:
+        self.cassette = cassette
+        self.inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        started = time.monotonic()
+        response = self.inner.handle_request(request)
+        response.read()
+        self.cassette.record(request, response, started, time.monotonic() - started)
+        return httpx.Response(response.status_code, headers=response.headers, content=response.content)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        started = time.monotonic()
+        response = await self.inner.handle_async_request(request)
+        await response.aread()
+        self.cassette.record(request, response, started, time.monotonic() - started)
+        return httpx.Response(response.status_code, headers=response.headers, content=response.content)
+
+
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Serves recorded exchanges, reproducing their latency scaled by the cassette's time scale."""
+
+    def __init__(self, cassette: Cassette) -> None:
+        self.cassette = cassette
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        exchange = self.cassette.lookup(request)
+        time.sleep(exchange.elapsed * self.cassette.time_scale)
+        return exchange.to_response()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        exchange = self.cassette.lookup(request)
+        await asyncio.sleep(exchange.elapsed * self.cassette.time_scale)
+        return exchange.to_response()
+
+
+_CASSETTE: Optional[Cassette] = None
+
+
+def get_cassette() -> Cassette:
+    """Returns the process-wide cassette configured by ``PROVIDER_CASSETTE``."""
+    global _CASSETTE
+    if _CASSETTE is None:
+        if not CASSETTE_PATH:
+            raise RuntimeError("PROVIDER_CASSETTE must be set to record or replay provider traffic")
+        _CASSETTE = Cassette(CASSETTE_PATH, time_scale=CASSETTE_TIME_SCALE, strict=CASSETTE_STRICT)
+        if CASSETTE_MODE == "replay":
+            _CASSETTE.load()
+    return _CASSETTE
+
+
+# --- 4. STANDALONE USAGE ---
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Usage: python -m utils.cassettes <cassette.jsonl.gz>")
+        sys.exit(2)
+    print(json.dumps(Cassette(sys.argv[1]).load().summary(), indent=2))
@@ -1,114 +1,89 @@
-import asyncio
-from typing import Dict, List, Any
-from dotenv import load_dotenv
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from utils.demographics import SEASONS, DemographicsCatalog, ProfileValidationError
 
-load_dotenv()
 
 # --- 1. DEMOGRAPHIC & CULTURAL PROFILES ---
+# Market profiles are data, not code: see data/demographics and utils/demographics.py.
+# When a market is loaded, its (season) cultural contexts and the fixed parts of
+# the competitor analysis are precomputed into read-only tables, so per-request
+# work is a lookup plus formatting the weather fields.
 
-DEMOGRAPHIC_PROFILES = {
-    "US": {
-        "country": "United States",
-        "demographics": [
-            {
-                "segment": "Urban Millennials",
-                "age_range": "25-40",
-                "characteristics": ["tech-savvy", "sustainability-focused", "experience-driven", "social media active"],
-                "values": ["authenticity", "convenience", "wellness", "social responsibility"],
-                "lifestyle": "fast-paced urban lifestyle, coffee shop culture, work-from-anywhere"
-            },
-            {
-                "segment": "Gen Z Professionals",
-                "age_range": "18-27",
-                "characteristics": ["digital natives", "value-conscious", "trend-aware", "community-oriented"],
-                "values": ["inclusivity", "transparency", "innovation", "mental health"],
-                "lifestyle": "hybrid work, side hustles, content creation, eco-conscious"
-            },
-            {
-                "segment": "Suburban Families",
-                "age_range": "30-50",
-                "characteristics": ["family-focused", "quality-seeking", "time-constrained", "health-conscious"],
-                "values": ["family time", "reliability", "value for money", "health"],
-                "lifestyle": "busy schedules, school runs, weekend activities, meal planning"
-            }
-        ],
-        "cultural_themes": {
-            "winter": ["hygge", "cozy moments", "holiday gatherings", "fireside comfort", "snow days", "warm indulgence"],
-            "spring": ["renewal", "fresh starts", "outdoor activities", "spring cleaning", "Easter celebrations"],
-            "summer": ["beach trips", "BBQs", "road trips", "outdoor concerts", "Fourth of July", "vacation mode"],
-            "autumn": ["pumpkin spice", "back to school", "football season", "Thanksgiving", "fall foliage", "harvest"]
-        },
-        "competitor_themes": ["personal indulgence", "premium quality", "convenience", "loyalty rewards"],
-        "local_events_focus": ["sports events", "music festivals", "food festivals", "holiday parades"]
-    },
-    "AU": {
-        "country": "Australia",
-        "demographics": [
-            {
-                "segment": "Coastal Professionals",
-                "age_range": "25-40",
-                "characteristics": ["outdoor-oriented", "laid-back", "health-focused", "beach culture"],
-                "values": ["work-life balance", "quality", "sustainability", "local support"],
-                "lifestyle": "beach mornings, café culture, active lifestyle, weekend adventures"
-            },
-            {
-                "segment": "Young Urbanites",
-                "age_range": "20-30",
-                "characteristics": ["cosmopolitan", "food-focused", "socially conscious", "travel-minded"],
-                "values": ["experiences", "diversity", "innovation", "community"],
-                "lifestyle": "brunch culture, festivals, fitness, exploring local spots"
-            },
-            {
-                "segment": "Regional Families",
-                "age_range": "30-55",
-                "characteristics": ["community-focused", "practical", "outdoor-loving", "traditional"],
-                "values": ["family", "reliability", "Australian-made", "value"],
-                "lifestyle": "sports weekends, community events, outdoor activities, local shopping"
-            }
-        ],
-        "cultural_themes": {
-            "summer": ["beach parties", "Christmas BBQs", "cricket season", "New Year celebrations", "cooling refreshment", "outdoor living"],
-            "autumn": ["back to school", "footy finals", "harvest festivals", "mild weather", "outdoor dining"],
-            "winter": ["cozy cafés", "ski season", "comfort food", "indoor gatherings", "warm drinks"],
-            "spring": ["spring racing", "flower shows", "outdoor festivals", "warmer days", "renewal"]
-        },
-        "competitor_themes": ["iced drinks", "beach lifestyle", "Australian-made", "mateship"],
-        "local_events_focus": ["sporting events", "beach festivals", "music festivals", "cultural celebrations"],
-        "seasonal_note": "Seasons are reversed from Northern Hemisphere - December is peak summer!"
-    },
-    "GB": {
-        "country": "United Kingdom",
-        "demographics": [
-            {
-                "segment": "London Professionals",
-                "age_range": "25-40",
-                "characteristics": ["cosmopolitan", "career-focused", "culturally diverse", "trend-aware"],
-                "values": ["quality", "heritage", "innovation", "sustainability"],
-                "lifestyle": "commuter culture, pub culture, theatre, weekend markets"
-            },
-            {
-                "segment": "Students & Young Adults",
-                "age_range": "18-28",
-                "characteristics": ["budget-conscious", "socially active", "environmentally aware", "digital-first"],
-                "values": ["affordability", "social justice", "experiences", "authenticity"],
-                "lifestyle": "university life, nightlife, festivals, part-time work"
-            }
-        ],
-        "cultural_themes": {
-            "winter": ["Christmas markets", "cozy pubs", "festive cheer", "comfort food", "grey skies", "warm drinks"],
-            "spring": ["Easter", "bank holidays", "garden parties", "lighter days", "renewal"],
-            "summer": ["festivals", "Wimbledon", "beer gardens", "seaside trips", "long evenings"],
-            "autumn": ["back to uni", "bonfire night", "autumn walks", "comfort food", "football season"]
-        },
-        "competitor_themes": ["heritage", "quality", "café culture", "afternoon treats"],
-        "local_events_focus": ["football matches", "music festivals", "cultural events", "royal celebrations"]
-    }
-}
+
+class _MarketTables(NamedTuple):
+    profile: Mapping[str, Any]
+    contexts: Mapping[str, Mapping[str, Any]]            # season -> cultural context
+    analysis_templates: Mapping[str, Tuple[str, str]]    # season -> (header, footer)
+    segments: Sequence[Mapping[str, Any]]
+
+
+def _freeze(value: Any) -> Any:
+    """Recursively converts dicts to read-only mappings and lists to tuples."""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _build_context(profile: Mapping[str, Any], country_code: str, season: str) -> Mapping[str, Any]:
+    return _freeze({
+        "country": profile["country"],
+        "country_code": country_code,
+        "demographics": profile["demographics"],
+        "seasonal_themes": profile["cultural_themes"].get(season, []),
+        "competitor_themes": profile["competitor_themes"],
+        "local_events_focus": profile["local_events_focus"],
+        "seasonal_note": profile.get("seasonal_note", ""),
+        "total_segments": len(profile["demographics"])
+    })
+
+
+def _build_analysis_template(cultural: Mapping[str, Any], season: str) -> Tuple[str, str]:
+    """The competitor analysis split around its weather lines: (header, footer)."""
+    header = f"Agent Analysis ({cultural['country_code']}):\n"
+    header += f"Location: {cultural['country']}, Season: {season.title()}\n"
+    if cultural.get('seasonal_note'):
+        header += f"⚠️  STRATEGIC NOTE: {cultural['seasonal_note']}\n"
+
+    footer = f"Key Competitor Themes: {', '.join(cultural['competitor_themes'])}\n"
+    footer += f"Seasonal Cultural Themes: {', '.join(cultural['seasonal_themes'][:5])}\n"
+    footer += f"Target Demographics: {cultural['total_segments']} segments identified\n"
+    return header, footer
+
+
+def _build_market(country_code: str, profile: Dict[str, Any]) -> _MarketTables:
+    frozen = _freeze(profile)
+    contexts = {season: _build_context(frozen, country_code, season) for season in SEASONS}
+    return _MarketTables(
+        profile=frozen,
+        contexts=MappingProxyType(contexts),
+        analysis_templates=MappingProxyType(
+            {season: _build_analysis_template(context, season) for season, context in contexts.items()}
+        ),
+        segments=frozen["demographics"],
+    )
+
+
+_CATALOG = DemographicsCatalog(build=_build_market)
+
+
+def _market(country_code: str) -> Tuple[str, _MarketTables]:
+    """Returns (resolved country code, tables); unknown or broken markets use the fallback."""
+    tables: Optional[_MarketTables] = None
+    try:
+        tables = _CATALOG.get(country_code)
+    except (OSError, ProfileValidationError) as exc:
+        print(f"WARNING: Could not load demographic profile for {country_code}: {exc}")
+    if tables is None:
+        return _CATALOG.fallback()
+    return country_code, tables
 
 
 # --- 2. CULTURAL CONTEXT FUNCTIONS ---
 
-async def get_cultural_context(country_code: str, season: str) -> Dict[str, Any]:
+def get_cultural_context(country_code: str, season: str) -> Mapping[str, Any]:
     """
     Retrieves cultural context and demographic information for a country.
     
@@ -117,23 +92,17 @@ async def get_cultural_context(country_code: str, season: str) -> Dict[str, Any]
         season: Current season ("winter", "spring", "summer", "autumn")
     
     Returns:
-        Dictionary containing demographic profiles and cultural themes
+        Read-only mapping containing demographic profiles and cultural themes
+        (markets missing from the catalogue use its fallback market, US)
     """
-    profile = DEMOGRAPHIC_PROFILES.get(country_code, DEMOGRAPHIC_PROFILES["US"])
-    
-    return {
-        "country": profile["country"],
-        "country_code": country_code,
-        "demographics": profile["demographics"],
-        "seasonal_themes": profile["cultural_themes"].get(season, []),
-        "competitor_themes": profile["competitor_themes"],
-        "local_events_focus": profile["local_events_focus"],
-        "seasonal_note": profile.get("seasonal_note", ""),
-        "total_segments": len(profile["demographics"])
-    }
+    resolved, tables = _market(country_code)
+    context = tables.contexts.get(season)
+    if context is None or resolved != country_code:
+        context = _build_context(tables.profile, country_code, season)
+    return context
 
 
-async def analyze_competitor_themes(country_code: str, season: str, weather_context: Dict[str, Any]) -> str:
+def analyze_competitor_themes(country_code: str, season: str, weather_context: Dict[str, Any]) -> str:
     """
     Generates an analysis of competitor themes based on location and season.
     
@@ -145,25 +114,21 @@ async def analyze_competitor_themes(country_code: str, season: str, weather_cont
     Returns:
         String analysis of competitor landscape
     """
-    cultural = await get_cultural_context(country_code, season)
-    
-    analysis = f"Agent Analysis ({country_code}):\n"
-    analysis += f"Location: {cultural['country']}, Season: {season.title()}\n"
-    
-    if cultural.get('seasonal_note'):
-        analysis += f"⚠️  STRATEGIC NOTE: {cultural['seasonal_note']}\n"
-    
-    analysis += f"Weather Context: {weather_context.get('context', 'N/A')}\n"
-    analysis += f"Temperature: {weather_context.get('temperature_celsius', 'N/A')}°C\n\n"
-    
-    analysis += f"Key Competitor Themes: {', '.join(cultural['competitor_themes'])}\n"
-    analysis += f"Seasonal Cultural Themes: {', '.join(cultural['seasonal_themes'][:5])}\n"
-    analysis += f"Target Demographics: {cultural['total_segments']} segments identified\n"
-    
-    return analysis
+    resolved, tables = _market(country_code)
+    template = tables.analysis_templates.get(season)
+    if template is None or resolved != country_code:
+        template = _build_analysis_template(get_cultural_context(country_code, season), season)
+    header, footer = template
+
+    return (
+        f"{header}"
+        f"Weather Context: {weather_context.get('context', 'N/A')}\n"
+        f"Temperature: {weather_context.get('temperature_celsius', 'N/A')}°C\n\n"
+        f"{footer}"
+    )
 
 
-async def get_demographic_segments(country_code: str) -> List[Dict[str, Any]]:
+def get_demographic_segments(country_code: str) -> Sequence[Mapping[str, Any]]:
     """
     Returns all demographic segments for a country.
     
@@ -171,13 +136,17 @@ async def get_demographic_segments(country_code: str) -> List[Dict[str, Any]]:
         country_code: 2-letter country code
     
     Returns:
-        List of demographic segment dictionaries
+        Tuple of read-only demographic segment mappings
     """
-    profile = DEMOGRAPHIC_PROFILES.get(country_code, DEMOGRAPHIC_PROFILES["US"])
-    return profile["demographics"]
+    return _market(country_code)[1].segments
+
+
+def demographics_catalog() -> DemographicsCatalog:
+    """The market catalogue backing these lookups (for status endpoints and tooling)."""
+    return _CATALOG
 
 
-def generate_demographic_insights(demographic: Dict[str, Any], season: str, weather: Dict[str, Any]) -> str:
+def generate_demographic_insights(demographic: Mapping[str, Any], season: str, weather: Dict[str, Any]) -> str:
     """
     Generates marketing insights for a specific demographic segment.
     
@@ -200,7 +169,7 @@ def generate_demographic_insights(demographic: Dict[str, Any], season: str, weat
 
 # --- 3. STRATEGIC MISMATCH DETECTION ---
 
-async def detect_strategic_mismatches(
+def detect_strategic_mismatches(
     country_code: str, 
     season: str, 
     weather: Dict[str, Any],
@@ -235,7 +204,6 @@ async def detect_strategic_mismatches(
         recommendations.append("Pivot to iced variants or emphasize air-conditioned comfort")
     
     # Check seasonal alignment
-    _ = await get_cultural_context(country_code, season)  # Validate country/season combo
     if country_code == "AU" and season == "summer" and product_type == "cold brew":
         recommendations.append("OPPORTUNITY: Perfect alignment! Summer in Australia - emphasize beach, cooling, festive celebrations")
     
@@ -254,7 +222,7 @@ async def detect_strategic_mismatches(
 # --- 4. STANDALONE TEST ---
 
 if __name__ == "__main__":
-    async def test_cultural():
+    def test_cultural():
         print("--- Testing Cultural Context Utility ---\n")
         
         # Mock weather data
@@ -272,15 +240,15 @@ if __name__ == "__main__":
         
         # Test US
         print("=== UNITED STATES (Winter) ===")
-        analysis_us = await analyze_competitor_themes("US", "winter", mock_weather_us)
+        analysis_us = analyze_competitor_themes("US", "winter", mock_weather_us)
         print(analysis_us)
         
-        segments_us = await get_demographic_segments("US")
+        segments_us = get_demographic_segments("US")
         print(f"\nDemographic Segments: {len(segments_us)}")
         for seg in segments_us:
             print(f"  - {seg['segment']}: {seg['age_range']}")
         
-        mismatch_us = await detect_strategic_mismatches("US", "winter", mock_weather_us, "cold brew")
+        mismatch_us = detect_strategic_mismatches("US", "winter", mock_weather_us, "cold brew")
         print(f"\nStrategic Analysis: {mismatch_us['strategic_action']}")
         if mismatch_us['recommendations']:
             print(f"Recommendations: {mismatch_us['recommendations'][0]}")
@@ -289,17 +257,17 @@ if __name__ == "__main__":
         
         # Test Australia
         print("=== AUSTRALIA (Summer) ===")
-        analysis_au = await analyze_competitor_themes("AU", "summer", mock_weather_au)
+        analysis_au = analyze_competitor_themes("AU", "summer", mock_weather_au)
         print(analysis_au)
         
-        segments_au = await get_demographic_segments("AU")
+        segments_au = get_demographic_segments("AU")
         print(f"\nDemographic Segments: {len(segments_au)}")
         for seg in segments_au:
             print(f"  - {seg['segment']}: {seg['age_range']}")
         
-        mismatch_au = await detect_strategic_mismatches("AU", "summer", mock_weather_au, "cold brew")
+        mismatch_au = detect_strategic_mismatches("AU", "summer", mock_weather_au, "cold brew")
         print(f"\nStrategic Analysis: {mismatch_au['strategic_action']}")
         if mismatch_au['recommendations']:
             print(f"Recommendations: {mismatch_au['recommendations'][0]}")
     
-    asyncio.run(test_cultural())
+    test_cultural()
@@ -0,0 +1,239 @@
+"""Versioned, lazily loaded catalogue of demographic market profiles.
+
+Market data lives in ``data/demographics`` as one JSON file per country plus a
+``manifest.json`` that indexes them by ISO country code::
+
+    {
+      "schema_version": 1,
+      "version": "2026.10.1",
+      "fallback_market": "US",
+      "markets": {"AU": {"file": "AU.json", "country": "Australia"}, ...}
+    }
+
+Nothing is read at import time. The manifest is read on the first lookup and
+each market file when that market is first requested, so startup time and
+memory do not grow with the catalogue. Every file is validated once when it is
+loaded. File modification times are re-checked at most every
+``DEMOGRAPHICS_REFRESH_SECONDS``, so edited or newly added markets are picked up
+without a redeploy. If an edited file fails validation, the last good version
+keeps being served.
+
+Validate the whole catalogue (e.g. before merging a data change) with::
+
+    python -m utils.demographics
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config.settings import settings
+
+
+# --- 1. CONFIGURATION ---
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEMOGRAPHICS_DIR = settings.get("DEMOGRAPHICS_DIR", os.path.join(_REPO_ROOT, "data", "demographics"))
+# How often file modification times are re-checked (0 = on every lookup).
+DEMOGRAPHICS_REFRESH_SECONDS = settings.get_float("DEMOGRAPHICS_REFRESH_SECONDS", 30)
+
+SCHEMA_VERSION = 1
+SEASONS = ("winter", "spring", "summer", "autumn")
+
+
+class ProfileValidationError(ValueError):
+    """Raised when the manifest or a market file does not match the expected schema."""
+
+
+# --- 2. VALIDATION ---
+
+def _require(condition: bool, where: str, message: str) -> None:
+    if not condition:
+        raise ProfileValidationError(f"{where}: {message}")
+
+
+def _is_str_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) and item for item in value)
+
+
+def validate_manifest(data: Any, where: str = "manifest.json") -> Dict[str, Any]:
+    """Checks the manifest structure and returns it unchanged."""
+    _require(isinstance(data, dict), where, "must be a JSON object")
+    _require(data.get("schema_version") == SCHEMA_VERSION, where, f"schema_version must be {SCHEMA_VERSION}")
+    _require(isinstance(data.get("version"), str), where, "'version' must be a string")
+    markets = data.get("markets")
+    _require(isinstance(markets, dict) and markets, where, "'markets' must be a non-empty object")
+    for code, entry in markets.items():
+        _require(len(code) == 2 and code.isalpha() and code.isupper(), where, f"invalid country code '{code}'")
+        _require(isinstance(entry, dict) and isinstance(entry.get("file"), str), where, f"'{code}' needs a 'file'")
+    _require(data.get("fallback_market") in markets, where, "'fallback_market' must be one of 'markets'")
+    return data
+
+
+def validate_profile(data: Any, where: str) -> Dict[str, Any]:
+    """
+    Checks one market profile and returns it unchanged.
+
+    Args:
+        data: Parsed JSON of a market file.
+        where: Label used in error messages (usually the file name).
+
+    Raises:
+        ProfileValidationError: On the first schema violation found.
+    """
+    _require(isinstance(data, dict), where, "must be a JSON object")
+    _require(isinstance(data.get("country"), str) and data["country"], where, "'country' must be a non-empty string")
+
+    demographics = data.get("demographics")
+    _require(isinstance(demographics, list) and demographics, where, "'demographics' must be a non-empty list")
+    for index, segment in enumerate(demographics):
+        label = f"{where}: demographics[{index}]"
+        _require(isinstance(segment, dict), label, "must be an object")
+        for key in ("segment", "age_range", "lifestyle"):
+            _require(isinstance(segment.get(key), str) and segment[key], label, f"'{key}' must be a non-empty string")
+        for key in ("characteristics", "values"):
+            _require(_is_str_list(segment.get(key)), label, f"'{key}' must be a list of strings")
+
+    themes = data.get("cultural_themes")
+    _require(isinstance(themes, dict), where, "'cultural_themes' must be an object")
+    for season, values in themes.items():
+        _require(season in SEASONS, where, f"unknown season '{season}' in cultural_themes")
+        _require(_is_str_list(values), where, f"cultural_themes.{season} must be a list of strings")
+
+    for key in ("competitor_themes", "local_events_focus"):
+        _require(_is_str_list(data.get(key)), where, f"'{key}' must be a list of strings")
+    _require(isinstance(data.get("seasonal_note", ""), str), where, "'seasonal_note' must be a string")
+    return data
+
+
+def _read_json(path: str) -> Any:
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return json.load(handle)
+    except json.JSONDecodeError as exc:
+        raise ProfileValidationError(f"{os.path.basename(path)}: invalid JSON ({exc})") from exc
+
+
+# --- 3. THE CATALOGUE ---
+
+@dataclass
+class _Entry:
+    mtime: float
+    value: Any
+
+
+class DemographicsCatalog:
+    """
+    Thread-safe, lazily populated index of market profiles by country code.
+
+    ``build`` turns a validated profile into whatever the caller looks up per
+    request (e.g. precomputed per-season tables). It runs once per market load,
+    and its result is what :meth:`get` returns.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEMOGRAPHICS_DIR,
+        build: Callable[[str, Dict[str, Any]], Any] = lambda code, profile: profile,
+        refresh_seconds: float = DEMOGRAPHICS_REFRESH_SECONDS,
+    ) -> None:
+        self.directory = directory
+        self._build = build
+        self._refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._manifest: Optional[_Entry] = None
+        self._markets: Dict[str, _Entry] = {}
+        self._checked_at: Dict[str, float] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _due(self, key: str, now: float) -> bool:
+        return now - self._checked_at.get(key, float("-inf")) >= self._refresh_seconds
+
+    def _load_manifest(self, now: float) -> Dict[str, Any]:
+        if self._manifest is not None and not self._due("manifest", now):
+            return self._manifest.value
+        self._checked_at["manifest"] = now
+        path = self._path("manifest.json")
+        mtime = os.stat(path).st_mtime
+        if self._manifest is None or mtime != self._manifest.mtime:
+            try:
+                manifest = validate_manifest(_read_json(path))
+            except ProfileValidationError as exc:
+                if self._manifest is None:
+                    raise
+                print(f"WARNING: Keeping demographics catalogue {self._manifest.value['version']}: {exc}")
+                return self._manifest.value
+            self._manifest = _Entry(mtime, manifest)
+        return self._manifest.value
+
+    def _load_market(self, code: str, filename: str, now: float) -> Any:
+        entry = self._markets.get(code)
+        if entry is not None and not self._due(code, now):
+            return entry.value
+        self._checked_at[code] = now
+        path = self._path(filename)
+        mtime = os.stat(path).st_mtime
+        if entry is None or mtime != entry.mtime:
+            try:
+                value = self._build(code, validate_profile(_read_json(path), filename))
+            except ProfileValidationError as exc:
+                if entry is None:
+                    raise
+                print(f"WARNING: Keeping previously loaded profile for {code}: {exc}")
+                return entry.value
+            entry = self._markets[code] = _Entry(mtime, value)
+        return entry.value
+
+    def get(self, country_code: str) -> Optional[Any]:
+        """Returns the built profile for a market, or None if the catalogue does not cover it."""
+        code = (country_code or "").upper()
+        now = time.monotonic()
+        with self._lock:
+            markets = self._load_manifest(now)["markets"]
+            if code not in markets:
+                return None
+            return self._load_market(code, markets[code]["file"], now)
+
+    def fallback(self) -> Tuple[str, Any]:
+        """Returns (country code, built profile) of the manifest's fallback market."""
+        with self._lock:
+            code = self._load_manifest(time.monotonic())["fallback_market"]
+        return code, self.get(code)
+
+    def available_markets(self) -> List[str]:
+        with self._lock:
+            return sorted(self._load_manifest(time.monotonic())["markets"])
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Catalogue version plus which markets are currently loaded in memory."""
+        with self._lock:
+            manifest = self._load_manifest(time.monotonic())
+            return {
+                "version": manifest["version"],
+                "available": len(manifest["markets"]),
+                "loaded": sorted(self._markets),
+            }
+
+
+# --- 4. STANDALONE CHECK ---
+
+if __name__ == "__main__":
+    # Validates the manifest and every market file it lists.
+    catalog = DemographicsCatalog(refresh_seconds=0)
+    failures = 0
+    for market in catalog.available_markets():
+        try:
+            profile = catalog.get(market)
+            print(f"OK   {market}: {profile['country']} ({len(profile['demographics'])} segments)")
+        except (OSError, ProfileValidationError) as exc:
+            failures += 1
+            print(f"FAIL {market}: {exc}")
+    print(f"\nCatalogue {catalog.snapshot()['version']}: {failures} invalid market file(s).")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,306 @@
+"""Local index of upcoming events found by Linkup (SQLite).
+
+Every structured Linkup search (utils/linkup_utils.py) is stored here: the
+events it returned, plus the city, country and date range it covered. Cities
+are keyed by name and country code, so Sydney AU and Sydney CA never share
+events (searches without a country are kept apart from both).
+:func:`find_event` answers from the index when the searches recorded for a
+city cover the next
+``EVENT_COVERAGE_MIN_DAYS`` days, and searches Linkup (for the next
+``LINKUP_EVENT_WINDOW_DAYS`` days) only when they do not. That removes the
+Linkup call from most campaign requests.
+
+Events are deleted once their last day has passed, and coverage once its range
+has passed or is older than ``EVENT_COVERAGE_TTL_SECONDS`` (newly announced
+events are picked up by the next search). :meth:`EventIndex.search` filters by
+city, date window and expected audience, e.g. for ``GET /events``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from config.settings import settings
+from utils.cache import SharedCache
+from utils.linkup_utils import (
+    LINKUP_EVENT_WINDOW_DAYS,
+    LINKUP_STRUCTURED,
+    EventRecord,
+    LinkupAPIError,
+    discover_events,
+    event_summary,
+    perform_web_search,
+)
+
+
+# --- 1. CONFIGURATION ---
+
+EVENT_INDEX_ENABLED = settings.get_bool("EVENT_INDEX_ENABLED", True)
+EVENT_INDEX_PATH = settings.get("EVENT_INDEX_PATH", os.path.join("var", "events.sqlite3"))
+# Linkup is searched again when the stored searches do not reach this many days ahead.
+EVENT_COVERAGE_MIN_DAYS = settings.get_int("EVENT_COVERAGE_MIN_DAYS", 30)
+# Searches older than this no longer count as coverage (7 days).
+EVENT_COVERAGE_TTL_SECONDS = settings.get_float("EVENT_COVERAGE_TTL_SECONDS", 604800)
+
+# Bumped when the tables change; older index files are rebuilt (they only hold search results).
+_SCHEMA_VERSION = 2
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    city TEXT NOT NULL COLLATE NOCASE,
+    country TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    name TEXT NOT NULL COLLATE NOCASE,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    venue TEXT,
+    expected_audience INTEGER,
+    source_url TEXT,
+    indexed_at REAL NOT NULL,
+    UNIQUE (city, country, name, start_date)
+);
+CREATE INDEX IF NOT EXISTS idx_events_city_dates ON events (city, country, end_date, start_date);
+CREATE INDEX IF NOT EXISTS idx_events_end_date ON events (end_date);
+CREATE TABLE IF NOT EXISTS coverage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    city TEXT NOT NULL COLLATE NOCASE,
+    country TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    from_date TEXT NOT NULL,
+    to_date TEXT NOT NULL,
+    searched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_coverage_city ON coverage (city, country, to_date);
+"""
+
+# One Linkup search per city and country at a time, across workers.
+_SEARCHES = SharedCache("event-search", ttl_seconds=60)
+
+
+# --- 2. THE INDEX ---
+
+class EventIndex:
+    """Thread-safe wrapper around one SQLite connection (WAL mode)."""
+
+    def __init__(self, path: str = EVENT_INDEX_PATH) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+                self._conn.execute("DROP TABLE IF EXISTS events")
+                self._conn.execute("DROP TABLE IF EXISTS coverage")
+                self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            self._conn.executescript(_SCHEMA)
+
+    def add(
+        self, city: str, from_date: date, to_date: date, events: Iterable[EventRecord], country: Optional[str] = None
+    ) -> None:
+        """Stores the result of one search: its events and the range it covered."""
+        now = time.time()
+        country = _country(country)
+        with self._lock, self._conn:
+            for event in events:
+                self._conn.execute(
+                    "INSERT INTO events (city, country, name, start_date, end_date, venue, expected_audience, "
+                    "source_url, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (city, country, name, start_date) DO UPDATE SET end_date = excluded.end_date, "
+                    "venue = excluded.venue, expected_audience = excluded.expected_audience, "
+                    "source_url = excluded.source_url, indexed_at = excluded.indexed_at",
+                    (
+                        city, country, event.name, event.start_date.isoformat(), event.end_date.isoformat(),
+                        event.venue, event.expected_audience, event.source_url, now,
+                    ),
+                )
+            self._conn.execute(
+                "INSERT INTO coverage (city, country, from_date, to_date, searched_at) VALUES (?, ?, ?, ?, ?)",
+                (city, country, from_date.isoformat(), to_date.isoformat(), now),
+            )
+
+    def covered(self, city: str, from_date: date, to_date: date, country: Optional[str] = None) -> bool:
+        """True when fresh searches for the city together cover every day of [from_date, to_date]."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT from_date, to_date FROM coverage WHERE city = ? AND country = ? AND to_date >= ? "
+                "AND searched_at >= ? ORDER BY from_date",
+                (city, _country(country), from_date.isoformat(), time.time() - EVENT_COVERAGE_TTL_SECONDS),
+            ).fetchall()
+        reached = from_date - timedelta(days=1)  # Last day covered so far
+        for row in rows:
+            start, end = date.fromisoformat(row["from_date"]), date.fromisoformat(row["to_date"])
+            if start > reached + timedelta(days=1):
+                break  # Gap
+            reached = max(reached, end)
+            if reached >= to_date:
+                return True
+        return reached >= to_date
+
+    def search(
+        self,
+        *,
+        city: Optional[str] = None,
+        country: Optional[str] = None,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        min_audience: Optional[int] = None,
+        limit: int = 20,
+    ) -> List[EventRecord]:
+        """
+        Events overlapping [from_date, to_date], largest expected audience first.
+
+        ``from_date`` defaults to today, so past events are never returned.
+        ``country`` narrows ``city`` to one country; an empty string selects
+        events found by searches that named no country.
+        Example: search(city="Sydney", country="AU", to_date=date(2026, 12, 31), min_audience=10000).
+        """
+        clauses = ["end_date >= ?"]
+        params: List[Any] = [(from_date or date.today()).isoformat()]
+        if city:
+            clauses.append("city = ?")
+            params.append(city)
+        if country is not None:
+            clauses.append("country = ?")
+            params.append(_country(country))
+        if to_date is not None:
+            clauses.append("start_date <= ?")
+            params.append(to_date.isoformat())
+        if min_audience is not None:
+            clauses.append("expected_audience >= ?")
+            params.append(min_audience)
+        params.append(max(1, min(limit, 500)))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM events WHERE {' AND '.join(clauses)} "
+                "ORDER BY COALESCE(expected_audience, 0) DESC, start_date, id LIMIT ?",
+                params,
+            ).fetchall()
+        return [_row_to_event(row) for row in rows]
+
+    def purge(self, today: Optional[date] = None) -> int:
+        """Deletes past events and stale coverage; returns the number of events deleted."""
+        today = (today or date.today()).isoformat()
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM events WHERE end_date < ?", (today,)).rowcount
+            self._conn.execute(
+                "DELETE FROM coverage WHERE to_date < ? OR searched_at < ?",
+                (today, time.time() - EVENT_COVERAGE_TTL_SECONDS),
+            )
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            events = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT city) FROM events").fetchone()
+            coverage = self._conn.execute("SELECT COUNT(*) FROM coverage").fetchone()
+        return {"events": events[0], "cities": events[1], "searches": coverage[0]}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _country(country: Optional[str]) -> str:
+    return (country or "").strip().upper()
+
+
+def _row_to_event(row: sqlite3.Row) -> EventRecord:
+    return EventRecord(
+        city=row["city"],
+        country=row["country"] or None,
+        name=row["name"],
+        start_date=date.fromisoformat(row["start_date"]),
+        end_date=date.fromisoformat(row["end_date"]),
+        venue=row["venue"],
+        expected_audience=row["expected_audience"],
+        source_url=row["source_url"],
+    )
+
+
+# --- 3. PROCESS-WIDE ACCESS ---
+
+_INDEX: Optional[EventIndex] = None
+_INDEX_LOCK = threading.Lock()
+_STATS = {"index_hits": 0, "linkup_searches": 0}
+
+
+def get_event_index() -> EventIndex:
+    """Returns the process-wide index, opening the database on first use."""
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = EventIndex()
+        return _INDEX
+
+
+async def upcoming_events(city: str, country_code: Optional[str] = None) -> List[EventRecord]:
+    """
+    Upcoming events in a city (of ``country_code``, when given): from the index
+    when it covers the next ``EVENT_COVERAGE_MIN_DAYS`` days, otherwise from a
+    new Linkup search.
+
+    Raises:
+        LinkupAPIError: If a needed search fails.
+    """
+    index = get_event_index()
+    today = date.today()
+    country = _country(country_code)
+    if await asyncio.to_thread(
+        index.covered, city, today, today + timedelta(days=EVENT_COVERAGE_MIN_DAYS), country
+    ):
+        _STATS["index_hits"] += 1
+        return await asyncio.to_thread(
+            index.search, city=city, country=country, to_date=today + timedelta(days=LINKUP_EVENT_WINDOW_DAYS)
+        )
+
+    to_date = today + timedelta(days=LINKUP_EVENT_WINDOW_DAYS)
+
+    async def search() -> List[Dict[str, Any]]:
+        _STATS["linkup_searches"] += 1
+        events = await discover_events(city, today, to_date, country_code=country or None)
+        await asyncio.to_thread(index.purge, today)
+        await asyncio.to_thread(index.add, city, today, to_date, events, country)
+        return [event.to_dict() for event in events]
+
+    stored = await _SEARCHES.get_or_compute(f"{city.lower()}|{country}|{today.isoformat()}", search)
+    return [EventRecord.from_dict(item) for item in stored]
+
+
+async def find_event(city: str, country_code: Optional[str] = None, strict: bool = False) -> str:
+    """
+    Summary of the most notable upcoming event in a city, for campaign prompts.
+
+    Uses :func:`upcoming_events`; with the index or structured search turned
+    off, falls back to :func:`utils.linkup_utils.perform_web_search`. A failed
+    Linkup search returns a fallback text, or raises ``LinkupAPIError`` with
+    ``strict``.
+    """
+    if not (EVENT_INDEX_ENABLED and LINKUP_STRUCTURED):
+        return await perform_web_search(city, strict, country_code)
+    try:
+        events = await upcoming_events(city, country_code)
+    except LinkupAPIError as exc:
+        if strict:
+            raise
+        print(f"Error in find_event: {exc}")
+        return f"Could not retrieve event data for {city} due to an API error."
+    except sqlite3.Error as exc:
+        print(f"WARNING: Event index unavailable ({exc}); searching Linkup directly.")
+        return await perform_web_search(city, strict, country_code)
+    return event_summary(city, events)
+
+
+def event_index_stats() -> Dict[str, Any]:
+    """Indexed events and searches, plus this worker's index hits and Linkup searches."""
+    stats: Dict[str, Any] = {"enabled": EVENT_INDEX_ENABLED and LINKUP_STRUCTURED, **_STATS}
+    if stats["enabled"]:
+        stats.update(get_event_index().stats())
+    return stats
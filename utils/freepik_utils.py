@@ -1,21 +1,31 @@
-import os
 import asyncio
+import hashlib
+import json
+from typing import List
+
 import httpx  # An async-compatible HTTP client, replacement for 'requests'
-from dotenv import load_dotenv
 
-# --- 1. CONFIGURATION ---
+from config.settings import settings
+from utils.cache import SharedCache
+from utils.capacity import get_pool
+from utils.transports import get_async_transport, resolve_api_key
 
-# Load environment variables from a .env file
-load_dotenv()
+# --- 1. CONFIGURATION ---
 
 # Get the API key from environment variables
-FREEPIK_API_KEY = os.getenv("FREEPIK_API_KEY")
+FREEPIK_API_KEY = resolve_api_key(settings.get("FREEPIK_API_KEY"))
 
 # Define API constants
 API_URL = "https://api.freepik.com/v1/ai/gemini-2-5-flash-image-preview"
 # API_URL = "https://api.freepik.com/v1/ai/text-to-image/imagen3"
-POLLING_INTERVAL_SECONDS = 3  # Time to wait between status checks
+POLLING_INTERVAL_SECONDS = settings.get_float("FREEPIK_POLLING_INTERVAL_SECONDS", 3)  # Time to wait between status checks
 TIMEOUT_SECONDS = 300  # Max time to wait for an image
+# Generated image URLs are reused for identical prompts for this long (0 = always render).
+IMAGE_CACHE_TTL_SECONDS = settings.get_float("IMAGE_CACHE_TTL_SECONDS", 0)
+# Most variants one task may ask for (num_images).
+FREEPIK_MAX_VARIANTS = settings.get_int("FREEPIK_MAX_VARIANTS", 4)
+
+_IMAGE_CACHE = SharedCache("freepik-image", ttl_seconds=IMAGE_CACHE_TTL_SECONDS)
 
 
 # --- 2. THE CORE UTILITY FUNCTION ---
@@ -44,26 +54,73 @@ async def create_image(
     Raises:
         Exception: If the API key is missing, the request fails, or it times out.
     """
+    urls = await create_image_variants(keywords, 1, company_name, product_name, tagline_prompt)
+    return urls[0]
+
+
+async def create_image_variants(
+    keywords: list,
+    count: int,
+    company_name: str = "Aura",
+    product_name: str = "Cold Brew",
+    tagline_prompt: str = "Elevate Your Moment"
+) -> List[str]:
+    """
+    Generates ``count`` variants of an image in a single Freepik task (``num_images``).
+
+    One submission and one polling loop serve all variants, instead of one per
+    call to :func:`create_image`. With the image cache enabled, the first
+    variant is also stored as the single image for the same prompt.
+
+    Args:
+        keywords: A list of strings describing the desired image subject.
+        count: Number of variants, 1 to ``FREEPIK_MAX_VARIANTS``.
+        company_name: The brand/company name (default: "Aura")
+        product_name: The product name (default: "Cold Brew")
+        tagline_prompt: The tagline to display (default: "Elevate Your Moment")
+
+    Returns:
+        The URLs of the generated images (at least one; Freepik may return fewer than asked for).
+
+    Raises:
+        ValueError: If the keywords are empty or ``count`` is out of range.
+        Exception: If the API key is missing, the request fails, or it times out.
+    """
     if not FREEPIK_API_KEY:
         raise Exception("ERROR: FREEPIK_API_KEY not found in environment variables.")
 
     if not keywords:
         raise ValueError("Keywords list cannot be empty.")
+    if not 1 <= count <= FREEPIK_MAX_VARIANTS:
+        raise ValueError(f"Variant count must be between 1 and {FREEPIK_MAX_VARIANTS}.")
 
     # Step 1: Dynamically build a high-quality prompt from the keywords
-    full_prompt = f"""
-    Professional high-resolution close-up product photography of:
-    {company_name} {product_name}, featuring a sleek can with the Starbucks logo and product name clearly visible in bold letters. The can sits at the center, surrounded by simple, stylized swirls of iced coffee shaped like a soft tornado, with droplets or small lines suggesting motion. The scene should feel refreshing, modern, and energetic, with smooth clean shapes, vector-style gradients, and soft shadows. Place the tagline {tagline_prompt} in a clear, modern sans-serif font below or above the can. Visual style: flat illustration, simple composition, vector aesthetic, minimal details, strong brand visibility, summer mood, refreshing energy, balanced negative space. Keywords: illustration, minimalist design, vector, clean composition, summer vibe, refreshing coffee, clear logo, bold typography, pastel background.
-    """
+    full_prompt = build_image_prompt(company_name, product_name, tagline_prompt)
 
     # Step 2: Define the payload for the API request
     headers = {
         "x-freepik-api-key": FREEPIK_API_KEY,
         "Content-Type": "application/json"
     }
-    payload = {
+    payload = _payload(full_prompt, count)
+
+    # Step 3: Submit and poll the task, reusing a cached render when enabled
+    if IMAGE_CACHE_TTL_SECONDS <= 0:
+        return await _run_task(payload, headers)
+    # Identical prompts (from any worker) reuse the images rendered for the first one.
+    stored = await _IMAGE_CACHE.get_or_compute(
+        _cache_key(payload), lambda: _run_task(payload, headers), lock_seconds=TIMEOUT_SECONDS
+    )
+    urls = stored if isinstance(stored, list) else [stored]  # Entries written before variants were lists
+    if count > 1:
+        await _IMAGE_CACHE.add(_cache_key(_payload(full_prompt, 1)), urls[:1])
+    return urls
+
+
+def _payload(full_prompt: str, num_images: int) -> dict:
+    return {
         "prompt": full_prompt,
-        "num_images": 1,
+        "num_images": num_images,
         "aspect_ratio": "square_1_1",
         "styling": {
             "style": "photo",  # Changed from "studio-shot" to "photo" for photorealism
@@ -76,11 +133,37 @@ async def create_image(
         "person_generation": "dont_allow"
     }
 
-    # Step 3: Use an async HTTP client to make the requests
-    async with httpx.AsyncClient(timeout=TIMEOUT_SECONDS) as client:
+
+def _cache_key(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def build_image_prompt(company_name: str, product_name: str, tagline_prompt: str) -> str:
+    """The Freepik prompt for a product render (mostly fixed brand art direction)."""
+    return f"""
+    Professional high-resolution close-up product photography of:
+    {company_name} {product_name}, featuring a sleek can with the Starbucks logo and product name clearly visible in bold letters. The can sits at the center, surrounded by simple, stylized swirls of iced coffee shaped like a soft tornado, with droplets or small lines suggesting motion. The scene should feel refreshing, modern, and energetic, with smooth clean shapes, vector-style gradients, and soft shadows. Place the tagline {tagline_prompt} in a clear, modern sans-serif font below or above the can. Visual style: flat illustration, simple composition, vector aesthetic, minimal details, strong brand visibility, summer mood, refreshing energy, balanced negative space. Keywords: illustration, minimalist design, vector, clean composition, summer vibe, refreshing coffee, clear logo, bold typography, pastel background.
+    """
+
+
+def render_signature(company_name: str, product_name: str, tagline_prompt: str) -> str:
+    """
+    The text two renders are compared by: the payload sent to Freepik, with the
+    prompt's whitespace collapsed. Image keywords are not part of it, because
+    :func:`build_image_prompt` does not use them.
+    """
+    prompt = " ".join(build_image_prompt(company_name, product_name, tagline_prompt).split())
+    return json.dumps(_payload(prompt, 1), sort_keys=True)
+
+
+async def _run_task(payload: dict, headers: dict) -> List[str]:
+    """Submits a generation task and polls it until the image URLs are ready."""
+    async with httpx.AsyncClient(timeout=TIMEOUT_SECONDS, transport=get_async_transport()) as client:
         try:
-            # Make the initial POST request to start the task
-            start_response = await client.post(API_URL, json=payload, headers=headers)
+            # Make the initial POST request to start the task. Only the submission takes a
+            # slot (granted by priority class and tenant, utils/capacity.py), not the polling.
+            async with get_pool("freepik").slot():
+                start_response = await client.post(API_URL, json=payload, headers=headers)
             start_response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
             
             data = start_response.json()["data"]
@@ -106,9 +189,9 @@ async def create_image(
             # Step 5: Once completed, extract and return the image URL
             final_data = status_response.json()["data"]
             if final_data.get("generated"):
-                image_url = final_data["generated"][0]
-                print(f"-> Freepik task COMPLETED. Image URL ready.")
-                return image_url
+                image_urls = list(final_data["generated"])
+                print(f"-> Freepik task COMPLETED. {len(image_urls)} image URL(s) ready.")
+                return image_urls
             else:
                 raise Exception("Task completed but no image data was found.")
 
@@ -121,7 +204,7 @@ async def create_image(
 
 
 # --- 3. STANDALONE TEST BLOCK ---
-# You can run this file directly (`python utils/freepik_utils.py`) to test it.
+# You can run this module directly (`python -m utils.freepik_utils`) to test it.
 if __name__ == "__main__":
     async def test_generation():
         print("--- Running Freepik Utility Standalone Test ---")
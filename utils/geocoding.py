@@ -0,0 +1,266 @@
+"""Offline city index for validating locations and deriving hemisphere/season.
+
+The index is loaded once from ``data/cities.csv`` with the columns
+``name,country,lat,lon,timezone,population,alternate_names``
+(``alternate_names`` is ``|``-separated). The bundled file covers major cities.
+A GeoNames ``cities15000`` export converted to the same columns can be
+dropped in via ``GEOCODER_CITIES_PATH`` for full coverage.
+
+Lookups are in memory: exact names (accent- and case-insensitive) are served
+from a dict, prefixes from a sorted key list (bisect), and typos by
+``difflib`` over candidates from the same country or initial letter.
+:func:`resolve_location` runs before any provider call, so misspelled cities
+are corrected or rejected with suggestions instead of paying for weather and
+search calls first.
+"""
+
+from __future__ import annotations
+
+import bisect
+import csv
+import difflib
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+
+
+# --- 1. CONFIGURATION ---
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GEOCODER_CITIES_PATH = settings.get("GEOCODER_CITIES_PATH", os.path.join(_REPO_ROOT, "data", "cities.csv"))
+# Strict mode rejects every city missing from the index. By default, cities that
+# are unknown but do not look like a typo of an indexed city are let through
+# (the bundled index only lists major cities).
+GEOCODER_STRICT = settings.get_bool("GEOCODER_STRICT", False)
+# Similarity (0-1) above which a unique close match silently replaces the input.
+GEOCODER_AUTOCORRECT_CUTOFF = settings.get_float("GEOCODER_AUTOCORRECT_CUTOFF", 0.8)
+GEOCODER_SUGGEST_CUTOFF = 0.7
+
+
+@dataclass(frozen=True)
+class City:
+    name: str
+    country: str
+    lat: float
+    lon: float
+    timezone: str
+    population: int = 0
+
+    @property
+    def hemisphere(self) -> str:
+        return "southern" if self.lat < 0 else "northern"
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "city": self.name, "country_code": self.country, "lat": self.lat, "lon": self.lon,
+            "timezone": self.timezone, "hemisphere": self.hemisphere,
+        }
+
+
+class LocationNotFoundError(ValueError):
+    """Raised when a location cannot be resolved; carries the closest known cities."""
+
+    def __init__(self, message: str, suggestions: Optional[List[City]] = None) -> None:
+        super().__init__(message)
+        self.suggestions = suggestions or []
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase, accent-free, punctuation-free form used as the lookup key ("São Paulo" -> "sao paulo")."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+# --- 2. THE INDEX ---
+
+class CityIndex:
+    """In-memory exact, prefix and fuzzy lookup over a list of cities."""
+
+    def __init__(self, cities: List[City], alternate_names: Optional[Dict[City, List[str]]] = None) -> None:
+        self._by_key: Dict[str, List[City]] = {}
+        for city in cities:
+            names = [city.name, *(alternate_names or {}).get(city, [])]
+            for key in {normalize_name(name) for name in names if name}:
+                self._by_key.setdefault(key, []).append(city)
+        for matches in self._by_key.values():
+            matches.sort(key=lambda city: -city.population)
+
+        self._sorted_keys = sorted(self._by_key)
+        self._keys_by_country: Dict[str, List[str]] = {}
+        self._keys_by_initial: Dict[str, List[str]] = {}
+        for key, matches in self._by_key.items():
+            self._keys_by_initial.setdefault(key[:1], []).append(key)
+            for country in {city.country for city in matches}:
+                self._keys_by_country.setdefault(country, []).append(key)
+        self.size = len(cities)
+
+    @classmethod
+    def from_csv(cls, path: str = GEOCODER_CITIES_PATH) -> "CityIndex":
+        cities: List[City] = []
+        alternate_names: Dict[City, List[str]] = {}
+        with open(path, encoding="utf-8", newline="") as handle:
+            for row in csv.DictReader(handle):
+                city = City(
+                    name=row["name"],
+                    country=row["country"].upper(),
+                    lat=float(row["lat"]),
+                    lon=float(row["lon"]),
+                    timezone=row["timezone"],
+                    population=int(row.get("population") or 0),
+                )
+                cities.append(city)
+                if row.get("alternate_names"):
+                    alternate_names[city] = row["alternate_names"].split("|")
+        return cls(cities, alternate_names)
+
+    @staticmethod
+    def _in_country(matches: List[City], country: Optional[str]) -> List[City]:
+        return [city for city in matches if not country or city.country == country.upper()]
+
+    def matches(self, name: str, country: Optional[str] = None) -> List[City]:
+        """All exact (normalized) matches, most populous first."""
+        return self._in_country(self._by_key.get(normalize_name(name), []), country)
+
+    def lookup(self, name: str, country: Optional[str] = None) -> Optional[City]:
+        """Exact match; the most populous one if the name is ambiguous."""
+        matches = self.matches(name, country)
+        return matches[0] if matches else None
+
+    def prefix(self, query: str, country: Optional[str] = None, limit: int = 10) -> List[City]:
+        """Cities whose name starts with ``query``, most populous first."""
+        key = normalize_name(query)
+        if not key:
+            return []
+        found: Dict[City, None] = {}
+        start = bisect.bisect_left(self._sorted_keys, key)
+        for candidate in self._sorted_keys[start:]:
+            if not candidate.startswith(key):
+                break
+            for city in self._in_country(self._by_key[candidate], country):
+                found[city] = None
+        return sorted(found, key=lambda city: -city.population)[:limit]
+
+    def fuzzy(
+        self, query: str, country: Optional[str] = None, limit: int = 5, cutoff: float = GEOCODER_SUGGEST_CUTOFF
+    ) -> List[Tuple[City, float]]:
+        """Closest names by ``difflib`` similarity, as (city, score) pairs, best first."""
+        key = normalize_name(query)
+        if not key:
+            return []
+        if country:
+            candidates = self._keys_by_country.get(country.upper(), [])
+        else:
+            candidates = self._keys_by_initial.get(key[:1], [])
+        scored: Dict[City, float] = {}
+        for candidate in difflib.get_close_matches(key, candidates, n=limit * 2, cutoff=cutoff):
+            score = difflib.SequenceMatcher(None, key, candidate).ratio()
+            for city in self._in_country(self._by_key[candidate], country):
+                scored[city] = max(score, scored.get(city, 0.0))
+        ranked = sorted(scored.items(), key=lambda item: (-item[1], -item[0].population))
+        return ranked[:limit]
+
+    def suggest(self, query: str, country: Optional[str] = None, limit: int = 5) -> List[City]:
+        """Autocomplete: prefix matches first, then fuzzy matches."""
+        found = {city: None for city in self.prefix(query, country, limit)}
+        for city, _ in self.fuzzy(query, country, limit):
+            found.setdefault(city, None)
+        return list(found)[:limit]
+
+
+_INDEX: Optional[CityIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_city_index() -> CityIndex:
+    """Returns the process-wide index, loading the CSV on first use."""
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = CityIndex.from_csv()
+        return _INDEX
+
+
+# --- 3. VALIDATION AND DERIVED CONTEXT ---
+
+def resolve_location(city: str, country_code: Optional[str] = None) -> Optional[City]:
+    """
+    Validates a location before any provider is called.
+
+    Args:
+        city: City name as entered ("sydny", "Sao Paulo", "NYC").
+        country_code: Optional 2-letter country code.
+
+    Returns:
+        The indexed city (with its canonical name), or None for a city that is
+        not indexed but does not look like a typo (non-strict mode only).
+
+    Raises:
+        LocationNotFoundError: For malformed input, typos without a unique
+            close match, or (in strict mode) any city missing from the index.
+    """
+    if not city or not city.strip():
+        raise LocationNotFoundError("City must not be empty.")
+    if country_code is not None and not re.fullmatch(r"[A-Za-z]{2}", country_code):
+        raise LocationNotFoundError(f"'{country_code}' is not a 2-letter country code.")
+
+    index = get_city_index()
+    match = index.lookup(city, country_code)
+    if match is not None:
+        return match
+
+    close = index.fuzzy(city, country_code)
+    if close:
+        best, score = close[0]
+        # Namesakes in other countries are not competing spellings; the most populous one wins.
+        runner_up = max((other for match, other in close[1:] if match.name != best.name), default=0.0)
+        if score >= GEOCODER_AUTOCORRECT_CUTOFF and score - runner_up >= 0.05:
+            return best
+
+    # Same name in other countries ("Sydney, US") is offered alongside close spellings.
+    suggestions = [candidate for candidate, _ in close]
+    if country_code:
+        suggestions += [candidate for candidate in index.matches(city) if candidate not in suggestions]
+    location = f"{city}, {country_code.upper()}" if country_code else city
+    if close or GEOCODER_STRICT:
+        raise LocationNotFoundError(f"Unknown location '{location}'.", suggestions)
+    return None
+
+
+def local_now(city: City, now: Optional[datetime] = None) -> datetime:
+    """Current local time in the city's timezone (UTC offset from longitude if tzdata is missing)."""
+    now = now or datetime.now(timezone.utc)
+    try:
+        from zoneinfo import ZoneInfo
+
+        return now.astimezone(ZoneInfo(city.timezone))
+    except Exception:
+        return now.astimezone(timezone(timedelta(hours=round(city.lon / 15))))
+
+
+def local_month(city: City, now: Optional[datetime] = None) -> int:
+    return local_now(city, now).month
+
+
+# --- 4. STANDALONE TEST ---
+
+if __name__ == "__main__":
+    index = get_city_index()
+    print(f"Loaded {index.size} cities from {GEOCODER_CITIES_PATH}\n")
+
+    for query, country in [("Sydney", "AU"), ("sao paulo", None), ("Sydny", "AU"), ("Quito", "EC"), ("Manaus", None)]:
+        place = resolve_location(query, country)
+        print(f"{query!r:>14} -> {place.name}, {place.country} ({place.hemisphere}, local month {local_month(place)})")
+
+    print(f"\nPrefix 'san': {[f'{c.name}, {c.country}' for c in index.prefix('san', limit=6)]}")
+    try:
+        resolve_location("Londn", "US")
+    except LocationNotFoundError as exc:
+        print(f"Rejected: {exc} Suggestions: {[f'{c.name}, {c.country}' for c in exc.suggestions]}")
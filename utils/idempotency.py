@@ -0,0 +1,123 @@
+"""Idempotency keys for the campaign POST endpoints.
+
+Multi-demographic requests can run for minutes, so clients time out and
+retry. A retry carrying the same ``Idempotency-Key`` header must not start
+a second pipeline (and pay for the LLM and Freepik calls twice). With
+:func:`run_idempotent`:
+
+- the first request with a key runs the endpoint and stores its result for
+  ``IDEMPOTENCY_TTL_SECONDS``;
+- a retry while it is still running attaches to that execution, also from
+  another worker, through the single-flight lock of the shared cache
+  (utils/cache.py);
+- a retry after it finished gets the stored result;
+- reusing a key with a different request body is rejected.
+
+Failed executions are not stored and release the key, so retrying after an
+error runs again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from config.settings import settings
+from utils.cache import SharedCache
+
+
+# --- 1. CONFIGURATION ---
+
+# How long finished results are kept for retries.
+IDEMPOTENCY_TTL_SECONDS = settings.get_float("IDEMPOTENCY_TTL_SECONDS", 86400)
+# How long a retry waits on an execution running in another worker before running it itself.
+IDEMPOTENCY_LOCK_SECONDS = settings.get_float("IDEMPOTENCY_LOCK_SECONDS", 900)
+
+_KEY_PATTERN = re.compile(r"^[A-Za-z0-9._:\-]{1,255}$")
+
+
+class IdempotencyKeyError(ValueError):
+    """Raised for a malformed Idempotency-Key header."""
+
+
+class IdempotencyKeyReused(Exception):
+    """Raised when a key is sent again with a different request body."""
+
+
+_RESULTS = SharedCache("idempotency", ttl_seconds=IDEMPOTENCY_TTL_SECONDS)
+# Fingerprint of the first request seen with each key; written before the work starts,
+# so a mismatching request is rejected at once instead of after the execution finishes.
+_CLAIMS = SharedCache("idempotency-claim", ttl_seconds=IDEMPOTENCY_TTL_SECONDS)
+
+
+# --- 2. HELPERS ---
+
+def _jsonable(value: Any) -> Any:
+    return value.model_dump(mode="json") if hasattr(value, "model_dump") else value
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """Stable hash of the request inputs (pydantic models, dicts, scalars)."""
+    canonical = json.dumps([_jsonable(part) for part in parts], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# --- 3. EXECUTION ---
+
+async def run_idempotent(
+    scope: str,
+    key: Optional[str],
+    fingerprint: str,
+    compute: Callable[[], Awaitable[Any]],
+) -> Tuple[Any, bool]:
+    """
+    Runs ``compute`` at most once per (scope, key) within the retention window.
+
+    Args:
+        scope: Namespace for the key, normally the endpoint path.
+        key: The client's Idempotency-Key header; None runs ``compute`` directly.
+        fingerprint: :func:`request_fingerprint` of the request body.
+        compute: Produces the response (a pydantic model or JSON-compatible value).
+
+    Returns:
+        (result, replayed). ``replayed`` is True when the result comes from an
+        earlier or concurrent request with the same key. Results are then in
+        JSON form (dicts), whatever ``compute`` returned.
+
+    Raises:
+        IdempotencyKeyError: If the key is malformed.
+        IdempotencyKeyReused: If the key was first used with a different body.
+    """
+    if key is None:
+        return await compute(), False
+    if not _KEY_PATTERN.match(key):
+        raise IdempotencyKeyError(
+            "Idempotency-Key must be 1-255 characters of letters, digits, '.', '_', ':' or '-'."
+        )
+
+    cache_key = f"{scope}|{key}"
+    if not await _CLAIMS.add(cache_key, fingerprint):
+        claimed = await _CLAIMS.get(cache_key)
+        if claimed is not None and claimed != fingerprint:
+            raise IdempotencyKeyReused(
+                f"Idempotency-Key '{key}' was already used with a different request body."
+            )
+
+    executed = False
+
+    async def execute() -> Any:
+        nonlocal executed
+        executed = True
+        try:
+            return {"fingerprint": fingerprint, "result": _jsonable(await compute())}
+        except BaseException:
+            await _CLAIMS.delete(cache_key)  # Nothing was stored: the key is free again
+            raise
+
+    entry = await _RESULTS.get_or_compute(cache_key, execute, lock_seconds=IDEMPOTENCY_LOCK_SECONDS)
+    if entry["fingerprint"] != fingerprint:
+        # Only reachable if the claim expired or was lost while the result survived.
+        raise IdempotencyKeyReused(f"Idempotency-Key '{key}' was already used with a different request body.")
+    return entry["result"], not executed
@@ -0,0 +1,120 @@
+"""Shares Freepik renders between segments that send the same payload within one request.
+
+The segments of a multi-demographic campaign often ask for the same image:
+same company, same recommended product and, often, the same tagline. Each
+:class:`ImageGroups` (one per request) keys every render by the payload
+actually sent to Freepik (:func:`utils.freepik_utils.render_signature`), and
+reuses a running or finished render with the same payload instead of starting
+another one, whatever image keywords the replies asked for.
+
+Each group is keyed by the payload that started it, and campaigns record the
+number of the group their image came from. A render is cancelled only when
+every campaign sharing it has let go of it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from config.settings import settings
+
+
+# --- 1. CONFIGURATION ---
+
+IMAGE_DEDUP_ENABLED = settings.get_bool("IMAGE_DEDUP_ENABLED", True)
+
+RenderInputs = Tuple[Any, Optional[str]]  # (keywords, tagline)
+
+
+# --- 2. GROUPS ---
+
+@dataclass
+class ImageGroup:
+    """One render and the campaigns using it."""
+
+    number: int  # 1-based, in the order the renders were started
+    key: Any  # The payload description, or the inputs without one
+    task: "asyncio.Task[Any]"
+    holders: int = 0
+    labels: List[str] = field(default_factory=list)
+
+
+def _usable(group: ImageGroup) -> bool:
+    if not group.task.done():
+        return group.holders > 0  # Otherwise it is being cancelled
+    return not group.task.cancelled() and group.task.exception() is None
+
+
+class ImageGroups:
+    """
+    The renders of one request, shared between identical payloads.
+
+    Args:
+        render: Starts a render for (keywords, tagline) and returns its URL (or URLs, for variants).
+        describe: The payload a render is made from (e.g. render_signature); without
+            it, only renders with identical inputs are shared.
+    """
+
+    def __init__(
+        self,
+        render: Callable[[Any, Optional[str]], Awaitable[Any]],
+        describe: Optional[Callable[[Any, Optional[str]], str]] = None,
+        enabled: bool = IMAGE_DEDUP_ENABLED,
+    ) -> None:
+        self._render = render
+        self._describe = describe
+        self.enabled = enabled
+        self.groups: List[ImageGroup] = []
+
+    def key(self, keywords: Any, tagline: Optional[str]) -> Any:
+        """What renders are shared by: equal keys produce the same image."""
+        return self._describe(keywords, tagline) if self._describe is not None else (keywords, tagline)
+
+    def acquire(self, keywords: Any, tagline: Optional[str], label: str = "") -> ImageGroup:
+        """The render for these inputs: a running or finished one with the same payload, or a new one."""
+        key = self.key(keywords, tagline)
+        if self.enabled:
+            for group in self.groups:
+                if group.key == key and _usable(group):
+                    if label and label not in group.labels:
+                        print(f"    > Sharing image {group.number} with {', '.join(group.labels) or 'an earlier render'}")
+                    return self._hold(group, label)
+        group = ImageGroup(
+            number=len(self.groups) + 1,
+            key=key,
+            task=asyncio.create_task(self._render(keywords, tagline)),
+        )
+        self.groups.append(group)
+        return self._hold(group, label)
+
+    @staticmethod
+    def _hold(group: ImageGroup, label: str) -> ImageGroup:
+        group.holders += 1
+        if label and label not in group.labels:
+            group.labels.append(label)
+        return group
+
+    @staticmethod
+    def release(group: ImageGroup) -> None:
+        """Lets go of a render; the last holder cancels it if it is still running."""
+        group.holders -= 1
+        if group.holders > 0:
+            return
+        if not group.task.done():
+            group.task.cancel()
+        elif not group.task.cancelled():
+            group.task.exception()  # Retrieved, so a failed render is not reported as unhandled
+
+    def close(self) -> None:
+        """Cancels renders that are still running (e.g. when the request fails)."""
+        for group in self.groups:
+            if not group.task.done():
+                group.task.cancel()
+            elif not group.task.cancelled():
+                group.task.exception()
+
+    async def url(self, group: ImageGroup) -> Any:
+        # Shielded: one waiter giving up must not cancel a render other campaigns share.
+        return await asyncio.shield(group.task)
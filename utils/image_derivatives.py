@@ -0,0 +1,157 @@
+"""Resized and re-encoded variants (thumbnails, WebP, AVIF) of mirrored images.
+
+Decoding and encoding images is CPU-bound, so derivatives are rendered in a
+``ProcessPoolExecutor`` and the event loop only awaits the result. Each
+derivative is cached on disk next to the mirror, keyed by source content hash,
+width and format, so it is rendered at most once (concurrent requests for the
+same derivative share one render).
+
+Served through ``/images/{id}?w=256&format=webp`` in ``main.py``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import BrokenExecutor  # Does not import multiprocessing
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from config.settings import settings
+from utils.image_mirror import IMAGE_STORE_DIR
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+
+# --- 1. CONFIGURATION ---
+
+# Only these widths are rendered, which bounds the size of the derivative cache.
+DERIVATIVE_WIDTHS = tuple(
+    int(width) for width in settings.get("IMAGE_DERIVATIVE_WIDTHS", "64,128,256,512,1024").split(",")
+)
+DERIVATIVE_QUALITY = settings.get_int("IMAGE_DERIVATIVE_QUALITY", 75)
+DERIVATIVE_WORKERS = settings.get_int("IMAGE_DERIVATIVE_WORKERS", 0) or None  # None = CPU count
+
+FORMATS: Dict[str, Tuple[str, str]] = {
+    # format name -> (Pillow encoder, media type)
+    "webp": ("WEBP", "image/webp"),
+    "avif": ("AVIF", "image/avif"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+
+
+class DerivativeError(Exception):
+    """Raised when a derivative cannot be produced (bad parameters or missing codec)."""
+
+
+class DerivativeRenderError(DerivativeError):
+    """Raised when rendering fails (unreadable or truncated original, crashed worker)."""
+
+
+# --- 2. RENDERING (runs in worker processes) ---
+
+def _render(source: str, target: str, width: int, encoder: str, quality: int) -> str:
+    """Resizes ``source`` to at most ``width`` pixels wide and encodes it to ``target``."""
+    from PIL import Image
+
+    with Image.open(source) as image:
+        image.load()
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        if encoder == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        try:
+            image.save(tmp, format=encoder, quality=quality)
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)  # Only left behind when saving failed
+    return target
+
+
+def _check_codec(encoder: str) -> None:
+    try:
+        from PIL import features
+    except ImportError as exc:
+        raise DerivativeError("Image derivatives require Pillow (pip install Pillow).") from exc
+    if encoder in ("WEBP", "AVIF") and not features.check(encoder.lower()):
+        raise DerivativeError(f"The installed Pillow build cannot encode {encoder}.")
+
+
+# --- 3. ASYNC API ---
+
+_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_IN_FLIGHT: Dict[str, asyncio.Future] = {}
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        # Imported on first render: multiprocessing is not needed to start the app.
+        from concurrent.futures import ProcessPoolExecutor
+
+        _EXECUTOR = ProcessPoolExecutor(max_workers=DERIVATIVE_WORKERS)
+    return _EXECUTOR
+
+
+def shutdown_executor() -> None:
+    """Stops the worker processes (called from the app's shutdown hook)."""
+    global _EXECUTOR
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        _EXECUTOR = None
+
+
+def derivative_path(sha256: str, width: int, fmt: str) -> str:
+    return os.path.join(IMAGE_STORE_DIR, "derived", sha256[:2], f"{sha256}-w{width}.{fmt}")
+
+
+async def get_derivative(source: str, sha256: str, width: Optional[int], fmt: Optional[str]) -> Tuple[str, str]:
+    """
+    Returns the cached path and media type of a derivative, rendering it if needed.
+
+    Args:
+        source: Path of the mirrored original.
+        sha256: Content hash of the original (the cache key).
+        width: Target width; must be one of DERIVATIVE_WIDTHS (None uses the largest of them;
+            narrower originals keep their width).
+        fmt: One of FORMATS (None re-encodes as WebP).
+
+    Raises:
+        DerivativeError: If the width, format or codec is not supported.
+        DerivativeRenderError: If the original cannot be decoded or the worker process died.
+    """
+    fmt = (fmt or "webp").lower()
+    if fmt not in FORMATS:
+        raise DerivativeError(f"Unsupported format '{fmt}'. Choose from: {', '.join(FORMATS)}.")
+    encoder, media_type = FORMATS[fmt]
+    if width is not None and width not in DERIVATIVE_WIDTHS:
+        raise DerivativeError(f"Unsupported width {width}. Choose from: {', '.join(map(str, DERIVATIVE_WIDTHS))}.")
+    _check_codec(encoder)
+
+    width = width or max(DERIVATIVE_WIDTHS)
+    target = derivative_path(sha256, width, fmt)
+    if os.path.exists(target):
+        return target, media_type
+
+    future = _IN_FLIGHT.get(target)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_executor(), _render, source, target, width, encoder, DERIVATIVE_QUALITY)
+        _IN_FLIGHT[target] = future
+        future.add_done_callback(lambda _future: _IN_FLIGHT.pop(target, None))
+    try:
+        await asyncio.shield(future)
+    except BrokenExecutor as exc:
+        shutdown_executor()  # A broken pool rejects all further work; the next render starts a new one
+        raise DerivativeRenderError("The image worker stopped unexpectedly; please retry.") from exc
+    except (OSError, ValueError) as exc:  # Includes PIL.UnidentifiedImageError
+        raise DerivativeRenderError(f"Could not render a derivative of this image: {exc}") from exc
+    return target, media_type
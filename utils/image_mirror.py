@@ -0,0 +1,220 @@
+"""Local, content-addressed mirror of generated campaign images.
+
+Freepik image URLs can expire, and serving them directly makes every viewer
+download from the third party. :func:`mirror_image` assigns each remote URL a
+stable local id (``/images/<id>``), downloads the bytes in the background into a
+content-addressed blob store, and the ``/images`` route in ``main.py`` serves
+them with ``FileResponse`` (zero-copy ``http.response.pathsend`` on servers that
+support it, byte ranges, and strong ETags for ``If-None-Match``).
+
+Layout under ``IMAGE_STORE_DIR``::
+
+    blobs/<sha256[:2]>/<sha256><ext>   # image bytes, deduplicated by content
+    refs/<image_id>.json              # {"source_url", "sha256", "content_type", "size"}
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+import httpx
+
+from config.settings import settings
+from utils.transports import get_async_transport
+
+
+# --- 1. CONFIGURATION ---
+
+IMAGE_MIRROR_ENABLED = settings.get_bool("IMAGE_MIRROR_ENABLED", True)
+IMAGE_STORE_DIR = settings.get("IMAGE_STORE_DIR", os.path.join("var", "images"))
+# Prefix for mirrored URLs in API payloads, e.g. "https://agent.example.com" (default: relative)
+PUBLIC_BASE_URL = settings.get("PUBLIC_BASE_URL", "").rstrip("/")
+IMAGE_DOWNLOAD_TIMEOUT_SECONDS = settings.get_float("IMAGE_DOWNLOAD_TIMEOUT_SECONDS", 60)
+# How long the image route waits for an in-flight download before redirecting to the source.
+IMAGE_MIRROR_WAIT_SECONDS = settings.get_float("IMAGE_MIRROR_WAIT_SECONDS", 5)
+
+_IMAGE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+# In-flight downloads by image id (also keeps the background tasks referenced).
+_DOWNLOADS: Dict[str, asyncio.Task] = {}
+
+
+# --- 2. STORE LAYOUT ---
+
+def image_id_for(source_url: str) -> str:
+    """Stable local id for a remote image URL."""
+    return hashlib.sha256(source_url.encode("utf-8")).hexdigest()[:32]
+
+
+def is_valid_image_id(image_id: str) -> bool:
+    return bool(_IMAGE_ID_PATTERN.match(image_id))
+
+
+def local_url(image_id: str) -> str:
+    return f"{PUBLIC_BASE_URL}/images/{image_id}"
+
+
+def _ref_path(image_id: str) -> str:
+    return os.path.join(IMAGE_STORE_DIR, "refs", f"{image_id}.json")
+
+
+def blob_path(sha256: str, content_type: Optional[str]) -> str:
+    extension = mimetypes.guess_extension(content_type or "") or ".bin"
+    if extension == ".jpe":
+        extension = ".jpg"
+    return os.path.join(IMAGE_STORE_DIR, "blobs", sha256[:2], f"{sha256}{extension}")
+
+
+def read_ref(image_id: str) -> Optional[Dict[str, Any]]:
+    """Returns the stored metadata for an image id, or None if unknown."""
+    try:
+        with open(_ref_path(image_id), encoding="utf-8") as handle:
+            return json.load(handle)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_ref(image_id: str, ref: Dict[str, Any]) -> None:
+    _atomic_write(_ref_path(image_id), json.dumps(ref).encode("utf-8"))
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    with os.fdopen(fd, "wb") as handle:
+        handle.write(data)
+    os.replace(tmp, path)
+
+
+# --- 3. MIRRORING ---
+
+def mirror_image(source_url: str) -> str:
+    """
+    Returns the stable local URL for a remote image and starts mirroring it.
+
+    The ref lookup and the download run in the background; callers never wait
+    for disk or network. When the mirror is disabled or no event loop is
+    running, the source URL is returned.
+    """
+    if not IMAGE_MIRROR_ENABLED or not source_url.startswith(("http://", "https://")):
+        return source_url
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return source_url
+
+    image_id = image_id_for(source_url)
+    _start_download(image_id, source_url)
+    return local_url(image_id)
+
+
+def _start_download(image_id: str, source_url: str) -> asyncio.Task:
+    """Starts (or joins) the single in-flight mirror task for an image id."""
+    task = _DOWNLOADS.get(image_id)
+    if task is None:
+        task = asyncio.create_task(_mirror(image_id, source_url))
+        _DOWNLOADS[image_id] = task
+        task.add_done_callback(lambda _task: _DOWNLOADS.pop(image_id, None))
+    return task
+
+
+async def _mirror(image_id: str, source_url: str) -> Optional[Dict[str, Any]]:
+    """Records the ref (file I/O in a worker thread) and downloads the bytes unless already mirrored."""
+    ref = await asyncio.to_thread(read_ref, image_id)
+    if ref is not None and ref.get("sha256"):
+        return ref
+    if ref is None:
+        await asyncio.to_thread(_write_ref, image_id, {"source_url": source_url, "sha256": None})
+    return await _download(image_id, source_url)
+
+
+async def _download(image_id: str, source_url: str) -> Optional[Dict[str, Any]]:
+    """
+    Streams the image to disk while hashing it, then publishes blob and ref.
+
+    Hashing and file writes run in a worker thread so large images do not
+    stall the event loop.
+    """
+    digest = hashlib.sha256()
+    handle, tmp = await asyncio.to_thread(_open_download)
+    size = 0
+    try:
+        try:
+            async with httpx.AsyncClient(
+                timeout=IMAGE_DOWNLOAD_TIMEOUT_SECONDS, transport=get_async_transport(), follow_redirects=True
+            ) as client:
+                async with client.stream("GET", source_url) as response:
+                    response.raise_for_status()
+                    content_type = response.headers.get("content-type", "application/octet-stream").split(";")[0]
+                    async for chunk in response.aiter_bytes():
+                        await asyncio.to_thread(_append, handle, digest, chunk)
+                        size += len(chunk)
+        finally:
+            await asyncio.to_thread(handle.close)
+        ref = {"source_url": source_url, "sha256": digest.hexdigest(), "content_type": content_type, "size": size}
+        await asyncio.to_thread(_publish, image_id, tmp, ref)
+        return ref
+    except Exception as exc:
+        print(f"WARNING: Could not mirror image {source_url}: {exc}")
+        await asyncio.to_thread(_discard, tmp)
+        return None
+
+
+def _open_download() -> Tuple[BinaryIO, str]:
+    directory = os.path.join(IMAGE_STORE_DIR, "blobs")
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".download-")
+    return os.fdopen(fd, "wb"), tmp
+
+
+def _append(handle: BinaryIO, digest: Any, chunk: bytes) -> None:
+    digest.update(chunk)
+    handle.write(chunk)
+
+
+def _publish(image_id: str, tmp: str, ref: Dict[str, Any]) -> None:
+    target = blob_path(ref["sha256"], ref["content_type"])
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.exists(target):
+        os.remove(tmp)  # Identical content already mirrored
+    else:
+        os.replace(tmp, target)
+    _write_ref(image_id, ref)
+
+
+def _discard(tmp: str) -> None:
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+
+async def resolve_image(image_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Metadata for serving an image id.
+
+    Waits briefly for an in-flight download so freshly generated images are
+    served locally; returns a ref without ``sha256`` if the bytes are not
+    (yet) available, so the caller can redirect to the source.
+    """
+    task = _DOWNLOADS.get(image_id)
+    if task is None:
+        ref = await asyncio.to_thread(read_ref, image_id)
+        if ref is None or ref.get("sha256"):
+            return ref
+        task = _start_download(image_id, ref["source_url"])
+    try:
+        done = await asyncio.wait_for(asyncio.shield(task), timeout=IMAGE_MIRROR_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        done = None
+    return done or await asyncio.to_thread(read_ref, image_id)
+
+
+async def wait_for_downloads() -> None:
+    """Waits for in-flight downloads (used on shutdown and in tests)."""
+    if _DOWNLOADS:
+        await asyncio.gather(*list(_DOWNLOADS.values()), return_exceptions=True)
@@ -0,0 +1,121 @@
+"""Incremental parsing of a JSON object that arrives in pieces (streamed LLM output).
+
+:class:`JSONObjectStream` is fed text as it streams in and returns each
+top-level field as soon as its value is complete, so callers can act on
+early fields (e.g. ``image_keywords``) while later ones (``body``) are still
+being generated::
+
+    stream = JSONObjectStream()
+    for chunk in ['{"tagline": "Cool', ' Clarity", "image_keywords": ["can"', ', "ice"], "bo']:
+        for key, value in stream.feed(chunk).items():
+            ...  # "tagline" after the 2nd chunk, "image_keywords" after the 3rd
+    data = stream.result()  # the whole object, parsed strictly
+
+Only top-level fields are reported; nested values arrive whole. Text before
+the opening brace (e.g. a stray code fence) is ignored.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Optional
+
+_WHITESPACE = " \t\r\n"
+
+
+class JSONObjectStream:
+    """Scanner for one JSON object; yields completed top-level fields as text is fed."""
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._phase = "start"  # start -> key -> colon -> value -> comma -> key ... -> done
+        self._key_start = 0
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self.fields: Dict[str, Any] = {}
+
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """Adds text; returns the top-level fields completed by it (in order)."""
+        self._text += chunk
+        completed: Dict[str, Any] = {}
+        text = self._text
+        for index in range(self._pos, len(text)):
+            char = text[index]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._phase == "key":
+                        self._key = json.loads(text[self._key_start:index + 1])
+                        self._phase = "colon"
+                    elif self._depth == 1 and self._phase == "value":
+                        self._complete(text[self._value_start:index + 1], completed)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._phase == "key":
+                    self._key_start = index
+                elif self._depth == 1 and self._phase == "value" and self._value_start is None:
+                    self._value_start = index
+            elif char in "{[":
+                if self._depth == 0:
+                    if char == "{" and self._phase == "start":
+                        self._phase = "key"
+                    else:
+                        continue
+                elif self._depth == 1 and self._phase == "value" and self._value_start is None:
+                    self._value_start = index
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    continue
+                self._depth -= 1
+                if self._depth == 1 and self._phase == "value" and self._value_start is not None:
+                    self._complete(text[self._value_start:index + 1], completed)
+                elif self._depth == 0:
+                    if self._phase == "value" and self._value_start is not None:
+                        self._complete(text[self._value_start:index].strip(), completed)  # Trailing scalar
+                    self._phase = "done"
+            elif self._depth == 1:
+                if self._phase == "colon" and char == ":":
+                    self._phase = "value"
+                    self._value_start = None
+                elif self._phase == "value" and char == ",":
+                    if self._value_start is not None:
+                        self._complete(text[self._value_start:index].strip(), completed)  # Number/true/false/null
+                    self._phase = "key"
+                elif self._phase == "comma" and char == ",":
+                    self._phase = "key"
+                elif self._phase == "value" and self._value_start is None and char not in _WHITESPACE:
+                    self._value_start = index
+        self._pos = len(text)
+        return completed
+
+    def _complete(self, raw: str, completed: Dict[str, Any]) -> None:
+        self._phase = "comma"
+        self._value_start = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return  # Left to result() to report
+        if self._key is not None:
+            self.fields[self._key] = completed[self._key] = value
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def result(self) -> Any:
+        """The complete value, parsed strictly (raises ``json.JSONDecodeError`` if malformed)."""
+        text = self._text
+        start = text.find("{")
+        end = text.rfind("}")
+        return json.loads(text[start:end + 1] if 0 <= start < end else text)
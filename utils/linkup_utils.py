@@ -1,26 +1,172 @@
-"""Async helpers for interacting with the Linkup API."""
+"""Async helpers for interacting with the Linkup API.
+
+Event discovery uses Linkup's ``structured`` output type by default: the
+search is bounded to the next ``LINKUP_EVENT_WINDOW_DAYS`` days
+(``fromDate``/``toDate``) and returns :class:`EventRecord` objects (name,
+dates, venue, expected audience, source). Prompts then carry a one-line
+:meth:`EventRecord.summary` instead of a free-text answer.
+``LINKUP_STRUCTURED=False`` goes back to the ``sourcedAnswer`` search.
+"""
 
 from __future__ import annotations
 
 import asyncio
 import json
-import os
-from typing import Any, Dict, Optional
+import re
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
 
 import httpx
-from dotenv import load_dotenv
 
-load_dotenv()
+from config.settings import settings
+from utils.transports import get_async_transport, resolve_api_key
+
 
 API_BASE_URL = "https://api.linkup.so"
+LINKUP_STRUCTURED = settings.get_bool("LINKUP_STRUCTURED", True)
+# Events are searched from today until this many days ahead.
+LINKUP_EVENT_WINDOW_DAYS = settings.get_int("LINKUP_EVENT_WINDOW_DAYS", 60)
+LINKUP_MAX_EVENTS = settings.get_int("LINKUP_MAX_EVENTS", 5)
+
+EVENT_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "events": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string", "description": "Name of the event"},
+                    "start_date": {"type": "string", "description": "First day, YYYY-MM-DD"},
+                    "end_date": {"type": "string", "description": "Last day, YYYY-MM-DD"},
+                    "venue": {"type": "string", "description": "Venue or neighbourhood"},
+                    "expected_audience": {"type": "integer", "description": "Expected number of attendees"},
+                    "source_url": {"type": "string", "description": "Page the event was found on"},
+                },
+                "required": ["name", "start_date"],
+            },
+        }
+    },
+    "required": ["events"],
+}
 
 
 class LinkupAPIError(Exception):
     """Raised when the Linkup API returns a non-2xx response."""
 
 
+@dataclass(frozen=True)
+class EventRecord:
+    """One upcoming event found by Linkup; JSON-serializable with to_dict()/from_dict()."""
+
+    city: str
+    name: str
+    start_date: date
+    end_date: date
+    venue: Optional[str] = None
+    expected_audience: Optional[int] = None
+    source_url: Optional[str] = None
+    country: Optional[str] = None  # 2-letter code, when the search named one
+
+    def summary(self) -> str:
+        """A short line for prompts, e.g. "Riverside Lantern Festival, 2026-11-02 to 2026-11-04, at Pier 3 (~40,000 expected)"."""
+        when = self.start_date.isoformat()
+        if self.end_date != self.start_date:
+            when += f" to {self.end_date.isoformat()}"
+        text = f"{self.name}, {when}"
+        if self.venue:
+            text += f", at {self.venue}"
+        if self.expected_audience:
+            text += f" (~{self.expected_audience:,} expected)"
+        return text
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["start_date"] = self.start_date.isoformat()
+        data["end_date"] = self.end_date.isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EventRecord":
+        return cls(**{
+            **data,
+            "start_date": date.fromisoformat(data["start_date"]),
+            "end_date": date.fromisoformat(data["end_date"]),
+        })
+
+
+def _parse_date(value: Any) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        return None
+
+
+_AUDIENCE = re.compile(
+    r"(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)\s*(k|m|thousand|million)?(?![a-z])", re.IGNORECASE
+)
+_AUDIENCE_SCALE = {"k": 1_000, "thousand": 1_000, "m": 1_000_000, "million": 1_000_000}
+
+
+def _parse_audience(value: Any) -> Optional[int]:
+    """
+    The first number in an audience estimate, e.g. "40,000-50,000" -> 40000,
+    "10k to 20k" -> 10000, "1.5 million" -> 1500000. Anything else is None.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) if value > 0 else None
+    match = _AUDIENCE.search(str(value or ""))
+    if match is None:
+        return None
+    number = float(match.group(1).replace(",", ""))
+    scale = _AUDIENCE_SCALE[match.group(2).lower()] if match.group(2) else 1
+    audience = int(number * scale)
+    return audience if audience > 0 else None
+
+
+def parse_events(
+    city: str, payload: Any, from_date: date, to_date: date, country_code: Optional[str] = None
+) -> List[EventRecord]:
+    """
+    Turns a structured Linkup reply into event records.
+
+    Items without a name or a parseable start date, and events outside
+    [from_date, to_date], are dropped. Events are ordered by expected audience
+    (largest first), then by start date.
+    """
+    items = payload.get("events", []) if isinstance(payload, dict) else payload
+    events = []
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        name = str(item.get("name") or "").strip()
+        start = _parse_date(item.get("start_date"))
+        if not name or start is None:
+            continue
+        end = _parse_date(item.get("end_date")) or start
+        if end < start:
+            end = start
+        if end < from_date or start > to_date:
+            continue
+        events.append(EventRecord(
+            city=city,
+            name=name,
+            start_date=start,
+            end_date=end,
+            venue=str(item.get("venue") or "").strip() or None,
+            expected_audience=_parse_audience(item.get("expected_audience")),
+            source_url=str(item.get("source_url") or "").strip() or None,
+            country=country_code,
+        ))
+    events.sort(key=lambda event: (-(event.expected_audience or 0), event.start_date))
+    return events
+
+
 def _require_token() -> str:
-    token = os.getenv("LINKUP_API_KEY")
+    token = resolve_api_key(settings.get("LINKUP_API_KEY"))
     if not token:
         raise RuntimeError("LINKUP_API_KEY environment variable is required")
     return token
@@ -52,40 +198,110 @@ async def _make_request(
         raise LinkupAPIError(f"Linkup request failed: {exc}") from exc
 
 
-async def perform_web_search(city: str) -> str:
-    """Return a short summary of a notable upcoming event for the given city."""
-    print(f"-> LinkUp: Searching for notable events in {city}...")
-    query = (
-        "What is a single, notable, upcoming local event, festival, or cultural moment in "
-        f"{city} happening in the next 30-60 days? Focus on events that would attract a large public audience."
-    )
+async def perform_web_search(city: str, strict: bool = False, country_code: Optional[str] = None) -> str:
+    """
+    Return a short summary of a notable upcoming event for the given city
+    (in ``country_code``, when given, to tell apart cities sharing a name).
 
+    A failed search returns a fallback text, or raises ``LinkupAPIError`` with
+    ``strict`` (for callers that must not store the fallback, e.g. pre-generation).
+    """
     try:
+        if LINKUP_STRUCTURED:
+            return event_summary(city, await discover_events(city, country_code=country_code))
+
+        place = _place(city, country_code)
+        print(f"-> LinkUp: Searching for notable events in {place}...")
+        query = (
+            "What is a single, notable, upcoming local event, festival, or cultural moment in "
+            f"{place} happening in the next 30-60 days? Focus on events that would attract a large public audience."
+        )
         response_data = await linkup_search(q=query, output_type="sourcedAnswer", depth="standard")
         answer = response_data.get("answer")
         if not answer:
             return f"No specific upcoming events found for {city}. General city marketing is recommended."
         return answer.strip()
     except LinkupAPIError as exc:
+        if strict:
+            raise
         print(f"Error in perform_web_search: {exc}")
         return f"Could not retrieve event data for {city} due to an API error."
 
 
+def event_summary(city: str, events: List[EventRecord]) -> str:
+    """The prompt line for the most notable of ``events`` (ordered as parse_events orders them)."""
+    if not events:
+        return f"No specific upcoming events found for {city}. General city marketing is recommended."
+    return events[0].summary()
+
+
+async def discover_events(
+    city: str,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    limit: int = LINKUP_MAX_EVENTS,
+    country_code: Optional[str] = None,
+) -> List[EventRecord]:
+    """
+    Upcoming events in a city between two dates, largest expected audience first.
+
+    Args:
+        city: City name.
+        from_date: First day of the window (default: today).
+        to_date: Last day of the window (default: ``LINKUP_EVENT_WINDOW_DAYS`` after from_date).
+        limit: Most events to ask for.
+        country_code: 2-letter country code, to tell apart cities sharing a name (Sydney AU / CA).
+
+    Raises:
+        LinkupAPIError: If the search fails.
+    """
+    from_date = from_date or date.today()
+    to_date = to_date or from_date + timedelta(days=LINKUP_EVENT_WINDOW_DAYS)
+    place = _place(city, country_code)
+    print(f"-> LinkUp: Searching for events in {place} from {from_date} to {to_date}...")
+    query = (
+        f"Up to {limit} notable public events, festivals or cultural moments in {place} "
+        f"between {from_date.isoformat()} and {to_date.isoformat()} that will attract a large audience."
+    )
+    response_data = await linkup_search(
+        q=query,
+        output_type="structured",
+        depth="standard",
+        structured_output_schema=EVENT_SCHEMA,
+        from_date=from_date,
+        to_date=to_date,
+    )
+    return parse_events(city, response_data, from_date, to_date, country_code)[:limit]
+
+
+def _place(city: str, country_code: Optional[str]) -> str:
+    return f"{city}, {country_code.upper()}" if country_code else city
+
+
 async def linkup_search(
     *,
     q: str,
     output_type: str = "sourcedAnswer",
     depth: str = "standard",
+    structured_output_schema: Optional[Dict[str, Any]] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
     timeout: float = 60.0,
     session: Optional[httpx.AsyncClient] = None,
 ) -> Dict[str, Any]:
     """Async Linkup `/search` call used by the marketing agent."""
     url = f"{API_BASE_URL.rstrip('/')}/v1/search"
-    payload = {"q": q, "outputType": output_type, "depth": depth}
+    payload: Dict[str, Any] = {"q": q, "outputType": output_type, "depth": depth}
+    if structured_output_schema is not None:
+        payload["structuredOutputSchema"] = json.dumps(structured_output_schema)
+    if from_date is not None:
+        payload["fromDate"] = from_date.isoformat()
+    if to_date is not None:
+        payload["toDate"] = to_date.isoformat()
 
     if session:
         return await _make_request(session, url, payload, timeout)
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(transport=get_async_transport()) as client:
         return await _make_request(client, url, payload, timeout)
 
 
@@ -101,7 +317,7 @@ async def linkup_fetch(
 
     if session:
         return await _make_request(session, url, payload, timeout)
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(transport=get_async_transport()) as client:
         return await _make_request(client, url, payload, timeout)
 
 
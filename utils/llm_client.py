@@ -0,0 +1,334 @@
+"""Shared async client for the TrueFoundry (OpenAI-compatible) LLM gateway.
+
+All endpoints send their prompts through :func:`complete_json`, which reuses one
+pooled ``AsyncOpenAI`` client per event loop. Connections are kept alive across
+requests and every call gets the same timeout and retry policy (the SDK retries
+connection errors, 408/409/429 and 5xx responses with exponential backoff).
+
+Each call names its task (call site). utils/model_routing.py picks the model
+for it and falls back to the next one when a model is over its latency
+budget, fails, or returns a reply without the required keys.
+
+Callers that pass ``on_field`` get the reply streamed: each top-level field is
+handed over as soon as it is complete (utils/json_stream.py), so e.g. the
+image render can start on ``image_keywords`` while the body is still being
+generated. The returned result is the same as without streaming.
+
+With ``LLM_CACHE_TTL_SECONDS`` > 0, completions are cached by (models, system
+prompt, prompt) in the shared cache (see utils/cache.py), so identical prompts
+from any worker within the TTL are answered without a gateway call.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import json
+import time
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from config.settings import settings
+from utils.cache import SharedCache
+from utils.capacity import get_pool
+from utils.json_stream import JSONObjectStream
+from utils.model_routing import DEFAULT_TASK, get_router, required_keys_missing
+from utils.transports import get_async_transport, resolve_api_key
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+# --- 1. CONFIGURATION ---
+
+LLM_BASE_URL = settings.get("LLM_BASE_URL", "https://llm-gateway.truefoundry.com/")
+LLM_TIMEOUT_SECONDS = settings.get_float("LLM_TIMEOUT_SECONDS", 120)
+LLM_MAX_RETRIES = settings.get_int("LLM_MAX_RETRIES", 2)
+LLM_MAX_CONNECTIONS = settings.get_int("LLM_MAX_CONNECTIONS", 100)
+LLM_MAX_KEEPALIVE_CONNECTIONS = settings.get_int("LLM_MAX_KEEPALIVE_CONNECTIONS", 20)
+# 0 disables the completion cache, so every call produces fresh ad copy.
+LLM_CACHE_TTL_SECONDS = settings.get_float("LLM_CACHE_TTL_SECONDS", 0)
+# False sends every call unstreamed; ``on_field`` callbacks then never fire.
+LLM_STREAMING = settings.get_bool("LLM_STREAMING", True)
+
+JSON_SYSTEM_PROMPT = "You are a marketing expert that only responds in JSON."
+
+
+class LLMClientError(Exception):
+    """Raised when the gateway is unreachable, rejects a call or returns invalid JSON."""
+
+
+class LLMInvalidReplyError(LLMClientError):
+    """Raised when a reply is not a JSON object or lacks keys the caller requires."""
+
+
+@dataclass
+class LLMResult:
+    """Parsed JSON completion plus the usage data the analytics pipeline needs."""
+
+    data: Dict[str, Any]
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency_ms: float
+    cached: bool = False  # served from the completion cache (no tokens spent)
+    attempts: int = 1  # models tried; > 1 means a fallback model answered
+    first_token_ms: Optional[float] = None  # streamed calls only
+
+
+# Called with (key, value) for each top-level field of a streamed reply as it completes.
+FieldCallback = Callable[[str, Any], None]
+
+
+_COMPLETION_CACHE = SharedCache("llm-completion", ttl_seconds=LLM_CACHE_TTL_SECONDS)
+
+
+# --- 2. CLIENT LIFECYCLE ---
+
+_CLIENT: Optional[AsyncOpenAI] = None
+_CLIENT_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+def llm_configured() -> bool:
+    """True when a gateway key is available (or providers are simulated/replayed)."""
+    return bool(resolve_api_key(settings.get("TRUEFOUNDRY_API_KEY")))
+
+
+def get_llm_client() -> AsyncOpenAI:
+    """Returns the pooled client for the running event loop, creating it on first use."""
+    global _CLIENT, _CLIENT_LOOP
+    loop = asyncio.get_running_loop()
+    if _CLIENT is None or _CLIENT_LOOP is not loop:
+        if not llm_configured():
+            raise LLMClientError("TRUEFOUNDRY_API_KEY not found in environment variables.")
+        from openai import AsyncOpenAI  # Deferred: the SDK takes longer to import than the rest of the app
+        limits = httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        )
+        http_client = httpx.AsyncClient(
+            transport=get_async_transport() or httpx.AsyncHTTPTransport(limits=limits),
+            timeout=LLM_TIMEOUT_SECONDS,
+        )
+        _CLIENT = AsyncOpenAI(
+            api_key=resolve_api_key(settings.get("TRUEFOUNDRY_API_KEY")),
+            base_url=LLM_BASE_URL,
+            timeout=LLM_TIMEOUT_SECONDS,
+            max_retries=LLM_MAX_RETRIES,
+            http_client=http_client,
+        )
+        _CLIENT_LOOP = loop
+    return _CLIENT
+
+
+def _import_sdk() -> None:
+    try:
+        import openai  # noqa: F401
+    except ImportError as exc:
+        print(f"WARNING: OpenAI SDK unavailable: {exc}")
+
+
+def preload_llm_sdk() -> "asyncio.Future[None]":
+    """
+    Imports the OpenAI SDK in a worker thread, without delaying startup.
+
+    Called from the app's startup hook. A request that needs the client while
+    the import is still running waits for it, instead of paying the full
+    import cost itself.
+    """
+    return asyncio.get_running_loop().run_in_executor(None, _import_sdk)
+
+
+async def close_llm_client() -> None:
+    """Closes pooled connections; called from the app's shutdown hook."""
+    global _CLIENT, _CLIENT_LOOP
+    if _CLIENT is not None:
+        await _CLIENT.close()
+    _CLIENT = None
+    _CLIENT_LOOP = None
+
+
+# --- 3. COMPLETIONS ---
+
+async def complete_json(
+    prompt: str,
+    *,
+    task: str = DEFAULT_TASK,
+    model: Optional[str] = None,
+    system_prompt: Optional[str] = JSON_SYSTEM_PROMPT,
+    on_field: Optional[FieldCallback] = None,
+) -> LLMResult:
+    """
+    Sends a prompt in JSON mode and returns the parsed object.
+
+    Args:
+        prompt: The user prompt (must ask for a JSON object).
+        task: Call site, e.g. "multi_campaign"; selects the route (models,
+            latency budget, required keys) in utils/model_routing.py.
+        model: Pins one gateway model, bypassing routing and fallbacks.
+        system_prompt: Optional system message; ``None`` sends the prompt alone.
+        on_field: Streams the reply and calls this with each top-level field
+            as soon as it is complete. When a model fails mid-stream and a
+            fallback answers, fields are reported again from the new reply, so
+            act on the returned data in the end. Not called for cached replies
+            or with ``LLM_STREAMING=False``.
+
+    Returns:
+        LLMResult with the parsed JSON, the model that answered and token usage
+        (zero tokens and ``cached=True`` when answered from the completion cache).
+
+    Raises:
+        LLMClientError: If every model failed or the replies were not usable JSON objects.
+    """
+    models = [model] if model else get_router().plan(task, prompt)
+    if LLM_CACHE_TTL_SECONDS <= 0:
+        return await _complete_routed(prompt, task, models, system_prompt, bool(model), on_field)
+
+    key = hashlib.sha256(json.dumps([sorted(models), system_prompt, prompt]).encode("utf-8")).hexdigest()
+    own_results = []
+
+    async def compute() -> Dict[str, Any]:
+        result = await _complete_routed(prompt, task, models, system_prompt, bool(model), on_field)
+        own_results.append(result)
+        return asdict(result)
+
+    start = time.perf_counter()
+    stored = await _COMPLETION_CACHE.get_or_compute(key, compute)
+    if own_results:
+        return own_results[0]
+    latency_ms = (time.perf_counter() - start) * 1000
+    return LLMResult(**{**stored, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": latency_ms, "cached": True})
+
+
+async def _complete_routed(
+    prompt: str,
+    task: str,
+    models: List[str],
+    system_prompt: Optional[str],
+    pinned: bool,
+    on_field: Optional[FieldCallback] = None,
+) -> LLMResult:
+    """Tries ``models`` in order until one answers within budget with the required keys."""
+    router = get_router()
+    route = router.route(task)
+    last_error: Optional[Exception] = None
+    for attempt, model in enumerate(models, 1):
+        # Fallbacks need time left, so only the last model may use the full client timeout.
+        budget = None if pinned or attempt == len(models) else route.latency_budget_seconds
+        started = time.perf_counter()
+        try:
+            result = await _complete(prompt, model, system_prompt, budget, on_field)
+            missing = required_keys_missing(result.data, route.required_keys)
+            if missing:
+                raise LLMInvalidReplyError(f"LLM reply from {model} lacks {', '.join(missing)}")
+        except asyncio.TimeoutError:
+            router.record(task, model, "timeouts", fallback=attempt > 1)
+            last_error = LLMClientError(f"{model} exceeded its {budget:g}s latency budget")
+        except LLMInvalidReplyError as exc:
+            router.record(task, model, "invalid", fallback=attempt > 1)
+            last_error = exc
+        except LLMClientError as exc:
+            router.record(task, model, "errors", fallback=attempt > 1)
+            last_error = exc
+        else:
+            router.record(
+                task, model, "ok", result.latency_ms / 1000,
+                result.prompt_tokens, result.completion_tokens, fallback=attempt > 1,
+            )
+            result.attempts = attempt
+            return result
+        if attempt < len(models):
+            elapsed = time.perf_counter() - started
+            print(f"WARNING: LLM {model} failed for {task} after {elapsed:.1f}s ({last_error}); trying {models[attempt]}.")
+    raise last_error or LLMClientError("No LLM models configured for this task.")
+
+
+async def _complete(
+    prompt: str,
+    model: str,
+    system_prompt: Optional[str],
+    budget_seconds: Optional[float] = None,
+    on_field: Optional[FieldCallback] = None,
+) -> LLMResult:
+    messages = [{"role": "user", "content": prompt}]
+    if system_prompt:
+        messages.insert(0, {"role": "system", "content": system_prompt})
+    streaming = on_field is not None and LLM_STREAMING
+    first_token_ms: Optional[float] = None
+
+    # Waits for a gateway slot by priority class and tenant (utils/capacity.py); not part of latency_ms.
+    async with get_pool("llm").slot():
+        start = time.perf_counter()
+        try:
+            if streaming:
+                parser, usage, answered_by, first_token = await asyncio.wait_for(
+                    _stream(model, messages, on_field), budget_seconds
+                )
+                # The final parse is the stream's own, so it accepts whatever the stream accepted
+                content, parse = parser.text, parser.result
+                first_token_ms = (first_token - start) * 1000 if first_token is not None else None
+            else:
+                response = await asyncio.wait_for(
+                    get_llm_client().chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        response_format={"type": "json_object"},
+                    ),
+                    budget_seconds,
+                )
+                content = response.choices[0].message.content or ""
+                parse = functools.partial(json.loads, content)
+                usage, answered_by = response.usage, response.model
+        except (LLMClientError, asyncio.TimeoutError):
+            raise
+        except Exception as exc:
+            raise LLMClientError(f"LLM request failed: {exc}") from exc
+        latency_ms = (time.perf_counter() - start) * 1000
+
+    try:
+        data = parse()
+    except json.JSONDecodeError as exc:
+        raise LLMInvalidReplyError(f"LLM returned invalid JSON: {content[:200]!r}") from exc
+    if not isinstance(data, dict):
+        raise LLMInvalidReplyError(f"LLM returned {type(data).__name__}, expected a JSON object")
+
+    return LLMResult(
+        data=data,
+        model=answered_by or model,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        latency_ms=latency_ms,
+        first_token_ms=first_token_ms,
+    )
+
+
+async def _stream(
+    model: str, messages: List[Dict[str, str]], on_field: FieldCallback
+) -> Tuple[JSONObjectStream, Any, Optional[str], Optional[float]]:
+    """Streams one completion, reporting fields as they complete; returns (parser, usage, model, first token time)."""
+    stream = await get_llm_client().chat.completions.create(
+        model=model,
+        messages=messages,
+        response_format={"type": "json_object"},
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    parser = JSONObjectStream()
+    usage: Any = None
+    answered_by: Optional[str] = None
+    first_token: Optional[float] = None
+    async for chunk in stream:
+        answered_by = chunk.model or answered_by
+        if chunk.usage is not None:
+            usage = chunk.usage
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter()
+        for key, value in parser.feed(delta).items():
+            on_field(key, value)
+    return parser, usage, answered_by, first_token
@@ -0,0 +1,82 @@
+"""Lightweight in-process timing metrics for the campaign pipelines.
+
+Endpoints wrap each pipeline step in :func:`stage_timer`, which keeps a bounded
+window of recent durations per stage. The benchmark harness (``benchmark.py``)
+reads these windows to report per-stage latency breakdowns.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterable, Iterator, List
+
+# --- 1. CONFIGURATION ---
+
+MAX_SAMPLES_PER_STAGE = 10_000
+
+_STAGES: Dict[str, Deque[float]] = {}
+_LOCK = threading.Lock()
+
+
+# --- 2. RECORDING ---
+
+def record_stage(name: str, seconds: float) -> None:
+    """Records one duration (in seconds) for a named pipeline stage."""
+    with _LOCK:
+        samples = _STAGES.get(name)
+        if samples is None:
+            samples = _STAGES[name] = deque(maxlen=MAX_SAMPLES_PER_STAGE)
+        samples.append(seconds)
+
+
+@contextmanager
+def stage_timer(name: str) -> Iterator[None]:
+    """Times the enclosed block (sync or async code) as a pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def reset_stages() -> None:
+    """Clears all recorded stage timings."""
+    with _LOCK:
+        _STAGES.clear()
+
+
+# --- 3. REPORTING ---
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """Nearest-rank percentile; returns 0.0 for an empty input."""
+    ordered: List[float] = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(values: Iterable[float], scale: float = 1000.0) -> Dict[str, float]:
+    """Count, mean and p50/p95/p99/max of durations, scaled (default: seconds -> ms)."""
+    samples = [value * scale for value in values]
+    if not samples:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "count": len(samples),
+        "mean": round(sum(samples) / len(samples), 3),
+        "p50": round(percentile(samples, 50), 3),
+        "p95": round(percentile(samples, 95), 3),
+        "p99": round(percentile(samples, 99), 3),
+        "max": round(max(samples), 3),
+    }
+
+
+def snapshot_stages() -> Dict[str, Dict[str, float]]:
+    """Per-stage latency summaries in milliseconds."""
+    with _LOCK:
+        copies = {name: list(samples) for name, samples in _STAGES.items()}
+    return {name: summarize(samples) for name, samples in sorted(copies.items())}
@@ -0,0 +1,258 @@
+"""Per-call-site model selection for the LLM gateway, with fallbacks.
+
+Every :func:`utils.llm_client.complete_json` call names its task (call site),
+e.g. ``"multi_campaign"`` or ``"opportunity_campaign"``. The task's
+:class:`Route` lists the models to try in order and gives each attempt a
+latency budget. When the model is slower than the budget, errors, or returns
+a reply without the required keys, the next model is tried. The last model
+gets the full ``LLM_TIMEOUT_SECONDS``.
+
+The order is adjusted using what :class:`ModelRouter` has observed:
+
+- prompts shorter than ``fast_below_chars`` try the model with the lowest
+  recent median latency first;
+- a model whose recent median latency exceeds the route's budget, or whose
+  recent calls mostly failed, is moved to the back. One call in
+  ``LLM_ROUTING_PROBE_EVERY`` still goes to it first, so it can recover.
+
+Per-model latency, error, timeout, invalid-reply and fallback counters
+(overall and per task) are available from :func:`model_stats` for tuning.
+Defaults can be overridden per task with ``LLM_ROUTE_<TASK>_<FIELD>``, e.g.::
+
+    LLM_ROUTE_OPPORTUNITY_CAMPAIGN_MODELS=autonomous-marketer/gpt-5-mini,autonomous-marketer/gpt-5
+    LLM_ROUTE_MULTI_CAMPAIGN_LATENCY_BUDGET_SECONDS=30
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from dataclasses import dataclass, fields, replace
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from config.settings import settings
+from utils.metrics import percentile, summarize
+
+
+# --- 1. CONFIGURATION ---
+
+PRIMARY_MODEL = settings.get("LLM_MODEL", "autonomous-marketer/gpt-5")
+FAST_MODEL = settings.get("LLM_FAST_MODEL", "autonomous-marketer/gpt-5-mini")
+LLM_ROUTING_WINDOW = settings.get_int("LLM_ROUTING_WINDOW", 50)  # recent calls per model used for routing
+LLM_ROUTING_MIN_SAMPLES = settings.get_int("LLM_ROUTING_MIN_SAMPLES", 5)
+LLM_ROUTING_PROBE_EVERY = settings.get_int("LLM_ROUTING_PROBE_EVERY", 20)
+# A model failing more than this share of its recent calls is demoted.
+LLM_ROUTING_MAX_FAILURE_RATE = settings.get_float("LLM_ROUTING_MAX_FAILURE_RATE", 0.5)
+
+DEFAULT_TASK = "default"
+
+
+@dataclass(frozen=True)
+class Route:
+    """How one call site picks its model."""
+
+    models: Tuple[str, ...]  # Preference order; later models are fallbacks
+    latency_budget_seconds: float  # Per attempt, except the last model (which gets LLM_TIMEOUT_SECONDS)
+    fast_below_chars: int = 0  # Shorter prompts start on the currently fastest model (0 = never)
+    required_keys: Tuple[str, ...] = ()  # Replies missing any of these count as failures
+
+
+def _models(*names: str) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(name for name in names if name))
+
+
+DEFAULT_ROUTES: Dict[str, Route] = {
+    # Per-segment copy in the multi-demographic pipeline: quality first.
+    "multi_campaign": Route(
+        models=_models(PRIMARY_MODEL, FAST_MODEL),
+        latency_budget_seconds=45,
+        required_keys=("headline", "body"),
+    ),
+    # The simple single-campaign endpoint: a short prompt, latency first.
+    "opportunity_campaign": Route(
+        models=_models(FAST_MODEL, PRIMARY_MODEL),
+        latency_budget_seconds=15,
+        fast_below_chars=4000,
+        required_keys=("headline", "body"),
+    ),
+    "response_ad": Route(
+        models=_models(PRIMARY_MODEL, FAST_MODEL),
+        latency_budget_seconds=30,
+        fast_below_chars=1500,
+        required_keys=("ad_copy",),
+    ),
+    DEFAULT_TASK: Route(models=_models(PRIMARY_MODEL, FAST_MODEL), latency_budget_seconds=60),
+}
+
+
+def _load_route(task: str, default: Route) -> Route:
+    """Applies ``LLM_ROUTE_<TASK>_<FIELD>`` overrides to a default route."""
+    overrides: Dict[str, Any] = {}
+    for field in fields(Route):
+        raw = settings.get(f"LLM_ROUTE_{task.upper()}_{field.name.upper()}")
+        if raw is None or raw == "":
+            continue
+        try:
+            if field.name in ("models", "required_keys"):
+                overrides[field.name] = _models(*(item.strip() for item in raw.split(",")))
+            elif field.name == "fast_below_chars":
+                overrides[field.name] = int(raw)
+            else:
+                overrides[field.name] = float(raw)
+        except ValueError:
+            print(f"WARNING: Ignoring invalid LLM route setting for {task}.{field.name}: {raw!r}")
+    return replace(default, **overrides) if overrides else default
+
+
+# --- 2. OBSERVATIONS ---
+
+class _ModelStats:
+    """Recent outcomes of one model (overall or for one task)."""
+
+    def __init__(self) -> None:
+        self.latencies: Deque[float] = deque(maxlen=LLM_ROUTING_WINDOW)  # Successful calls, seconds
+        self.outcomes: Deque[bool] = deque(maxlen=LLM_ROUTING_WINDOW)
+        self.counters = {
+            "calls": 0, "ok": 0, "errors": 0, "timeouts": 0, "invalid": 0,
+            "served_as_fallback": 0, "prompt_tokens": 0, "completion_tokens": 0,
+        }
+
+    def record(
+        self, outcome: str, latency: Optional[float], prompt_tokens: int, completion_tokens: int, fallback: bool
+    ) -> None:
+        self.counters["calls"] += 1
+        self.counters[outcome] += 1
+        if fallback and outcome == "ok":
+            self.counters["served_as_fallback"] += 1
+        self.counters["prompt_tokens"] += prompt_tokens
+        self.counters["completion_tokens"] += completion_tokens
+        self.outcomes.append(outcome == "ok")
+        if outcome == "ok" and latency is not None:
+            self.latencies.append(latency)
+
+    def median_latency(self) -> Optional[float]:
+        if len(self.latencies) < LLM_ROUTING_MIN_SAMPLES:
+            return None
+        return percentile(self.latencies, 50)
+
+    def failure_rate(self) -> float:
+        if len(self.outcomes) < LLM_ROUTING_MIN_SAMPLES:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        calls = self.counters["calls"]
+        return {
+            **self.counters,
+            "success_rate": round(self.counters["ok"] / calls, 3) if calls else None,
+            "latency_ms": summarize(self.latencies),
+        }
+
+
+class ModelRouter:
+    """Orders each task's models using the route and recent per-model observations."""
+
+    def __init__(self, routes: Optional[Dict[str, Route]] = None) -> None:
+        self.routes = routes if routes is not None else {
+            task: _load_route(task, route) for task, route in DEFAULT_ROUTES.items()
+        }
+        self._lock = threading.Lock()
+        self._models: Dict[str, _ModelStats] = {}
+        self._by_task: Dict[Tuple[str, str], _ModelStats] = {}
+        self._calls: Dict[str, int] = {}
+
+    def route(self, task: str) -> Route:
+        return self.routes.get(task) or self.routes[DEFAULT_TASK]
+
+    def _stats(self, model: str) -> _ModelStats:
+        stats = self._models.get(model)
+        if stats is None:
+            stats = self._models[model] = _ModelStats()
+        return stats
+
+    def plan(self, task: str, prompt: str) -> List[str]:
+        """The models to try for one call, in order."""
+        route = self.route(task)
+        models = list(route.models)
+        with self._lock:
+            self._calls[task] = self._calls.get(task, 0) + 1
+            probing = LLM_ROUTING_PROBE_EVERY > 0 and self._calls[task] % LLM_ROUTING_PROBE_EVERY == 0
+            medians = {model: self._stats(model).median_latency() for model in models}
+            unhealthy = {
+                model for model in models
+                if (medians[model] or 0.0) > route.latency_budget_seconds
+                or self._stats(model).failure_rate() > LLM_ROUTING_MAX_FAILURE_RATE
+            }
+        if route.fast_below_chars and len(prompt) < route.fast_below_chars:
+            known = [model for model in models if medians[model] is not None]
+            if known:
+                fastest = min(known, key=lambda model: medians[model])
+                models.remove(fastest)
+                models.insert(0, fastest)
+        if probing:
+            return models  # Let demoted models prove themselves again
+        return [model for model in models if model not in unhealthy] + [model for model in models if model in unhealthy]
+
+    def record(
+        self,
+        task: str,
+        model: str,
+        outcome: str,
+        latency: Optional[float] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        fallback: bool = False,
+    ) -> None:
+        """
+        Records one attempt.
+
+        Args:
+            outcome: "ok", "errors", "timeouts" (over the latency budget) or
+                "invalid" (unparseable reply or missing required keys).
+            fallback: True when the model was not the first one tried for this call.
+        """
+        with self._lock:
+            self._stats(model).record(outcome, latency, prompt_tokens, completion_tokens, fallback)
+            key = (task, model)
+            if key not in self._by_task:
+                self._by_task[key] = _ModelStats()
+            self._by_task[key].record(outcome, latency, prompt_tokens, completion_tokens, fallback)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            by_task: Dict[str, Dict[str, Any]] = {}
+            for (task, model), stats in sorted(self._by_task.items()):
+                by_task.setdefault(task, {})[model] = stats.snapshot()
+            return {
+                "routes": {
+                    task: {
+                        "models": list(route.models),
+                        "latency_budget_seconds": route.latency_budget_seconds,
+                        "fast_below_chars": route.fast_below_chars,
+                        "required_keys": list(route.required_keys),
+                    }
+                    for task, route in self.routes.items()
+                },
+                "models": {model: stats.snapshot() for model, stats in sorted(self._models.items())},
+                "tasks": by_task,
+            }
+
+
+_ROUTER: Optional[ModelRouter] = None
+
+
+def get_router() -> ModelRouter:
+    """Returns the process-wide router, configured from the environment."""
+    global _ROUTER
+    if _ROUTER is None:
+        _ROUTER = ModelRouter()
+    return _ROUTER
+
+
+def model_stats() -> Dict[str, Any]:
+    """Routes plus per-model and per-task latency and quality counters of this worker."""
+    return get_router().snapshot()
+
+
+def required_keys_missing(data: Dict[str, Any], keys: Sequence[str]) -> List[str]:
+    return [key for key in keys if data.get(key) in (None, "", [])]
@@ -0,0 +1,301 @@
+"""Background pre-generation of multi-demographic campaigns for top cities.
+
+Most traffic is for a known list of cities (``PREGEN_CITIES``). For those, a
+scheduler started from the app lifespan periodically:
+
+1. refreshes weather for the whole list in one bulk call (``get_weather_contexts``),
+2. refreshes each city's local event (Linkup) at most every ``PREGEN_EVENT_REFRESH_SECONDS``
+   (a city whose weather is a placeholder or whose event search fails is skipped),
+3. fingerprints the inputs that shape a campaign (season, temperature band,
+   conditions, recommended product, event) and reruns the multi-demographic
+   pipeline only when the fingerprint changed or the result is too old.
+
+Work only happens inside the off-peak ``PREGEN_WINDOW``, evaluated in each
+city's local time. Pipeline runs are spaced out and capped per hour, and their
+provider calls use the batch priority class (utils/capacity.py), so the
+scheduler never competes with interactive traffic for provider rate limits.
+The endpoint then answers those cities from :meth:`PregenerationScheduler.lookup`
+at cache-read latency.
+
+Results, events and a per-interval lease are kept in the shared cache
+(utils/cache.py). When several workers run, each pass is done by whichever
+worker takes the lease, and every worker serves the results.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from config.company_profile import get_product_for_season
+from config.settings import settings
+from utils.cache import SharedCache
+from utils.capacity import BATCH, priority_context
+from utils.geocoding import LocationNotFoundError, get_city_index, local_now, resolve_location
+from utils.event_index import find_event
+from utils.weather_utils import get_weather_contexts, temperature_bucket
+
+
+# --- 1. CONFIGURATION ---
+
+PREGEN_ENABLED = settings.get_bool("PREGEN_ENABLED", False)
+# Comma-separated "City:CC" pairs, e.g. "Sydney:AU,London:GB,New York:US"
+PREGEN_CITIES = settings.get("PREGEN_CITIES", "")
+PREGEN_INTERVAL_SECONDS = settings.get_float("PREGEN_INTERVAL_SECONDS", 900)
+# "HH:MM-HH:MM" in each city's local time (may wrap midnight); empty = any time.
+PREGEN_WINDOW = settings.get("PREGEN_WINDOW", "01:00-06:00")
+PREGEN_EVENT_REFRESH_SECONDS = settings.get_float("PREGEN_EVENT_REFRESH_SECONDS", 21600)
+# Pre-generated results older than this are not served (the pipeline runs live).
+PREGEN_MAX_AGE_SECONDS = settings.get_float("PREGEN_MAX_AGE_SECONDS", 86400)
+PREGEN_MAX_RUNS_PER_HOUR = settings.get_int("PREGEN_MAX_RUNS_PER_HOUR", 20)
+PREGEN_RUN_SPACING_SECONDS = settings.get_float("PREGEN_RUN_SPACING_SECONDS", 10)
+
+# (city, country_code, weather, event) -> pipeline result
+Generator = Callable[[str, str, Dict[str, Any], str], Awaitable[Any]]
+
+
+@dataclass
+class Pregenerated:
+    result: Any  # JSON-compatible form of the generator's result
+    fingerprint: str
+    generated_at: float
+
+
+def parse_cities(spec: str) -> List[Tuple[str, str]]:
+    """Parses "Sydney:AU,London:GB" into canonical (city, country) pairs, skipping unknown cities."""
+    cities = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, country = item.rpartition(":")
+        if not name:
+            print(f"WARNING: PREGEN_CITIES entry '{item}' needs a country code (City:CC); skipped.")
+            continue
+        try:
+            place = resolve_location(name.strip(), country.strip())
+        except LocationNotFoundError as exc:
+            print(f"WARNING: PREGEN_CITIES entry '{item}' skipped: {exc}")
+            continue
+        cities.append((place.name, place.country) if place else (name.strip(), country.strip().upper()))
+    return list(dict.fromkeys(cities))
+
+
+def parse_window(spec: str) -> Optional[Tuple[int, int]]:
+    """Parses "01:00-06:00" into (start, end) minutes after midnight; None means always."""
+    if not spec.strip():
+        return None
+
+    def to_minutes(text: str) -> int:
+        hours, _, minutes = text.strip().partition(":")
+        return int(hours) * 60 + int(minutes or 0)
+
+    start, _, end = spec.partition("-")
+    return to_minutes(start), to_minutes(end)
+
+
+def input_fingerprint(weather: Dict[str, Any], event: str) -> str:
+    """Hash of the inputs whose change should trigger a new campaign."""
+    product = get_product_for_season(weather["season"], weather["temperature_celsius"])
+    inputs = [
+        weather["season"],
+        temperature_bucket(weather["temperature_celsius"]),
+        weather.get("weather_main"),
+        product["name"],
+        event,
+    ]
+    return hashlib.sha1(json.dumps(inputs).encode("utf-8")).hexdigest()
+
+
+def _key(city: str, country_code: Optional[str]) -> str:
+    return f"{city.strip().lower()}|{(country_code or '').upper()}"
+
+
+def _jsonable(result: Any) -> Any:
+    return result.model_dump(mode="json") if hasattr(result, "model_dump") else result
+
+
+# --- 2. THE SCHEDULER ---
+
+class PregenerationScheduler:
+    """Keeps fresh multi-demographic results for a fixed list of cities."""
+
+    def __init__(
+        self,
+        cities: Optional[List[Tuple[str, str]]] = None,
+        window: Optional[Tuple[int, int]] = None,
+        interval_seconds: float = PREGEN_INTERVAL_SECONDS,
+        max_runs_per_hour: int = PREGEN_MAX_RUNS_PER_HOUR,
+        run_spacing_seconds: float = PREGEN_RUN_SPACING_SECONDS,
+    ) -> None:
+        self.cities = cities or []
+        self.window = window
+        self.interval_seconds = interval_seconds
+        self.max_runs_per_hour = max_runs_per_hour
+        self.run_spacing_seconds = run_spacing_seconds
+        self._generate: Optional[Generator] = None
+        self._results = SharedCache("pregen-result", ttl_seconds=PREGEN_MAX_AGE_SECONDS)
+        self._events = SharedCache("pregen-event", ttl_seconds=PREGEN_EVENT_REFRESH_SECONDS)
+        self._leases = SharedCache("pregen-lease", ttl_seconds=interval_seconds)
+        self._runs: Deque[float] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "ticks": 0, "generated": 0, "unchanged": 0, "failed": 0,
+            "deferred_rate_limit": 0, "ticks_elsewhere": 0, "served": 0, "last_tick_at": None,
+        }
+
+    @classmethod
+    def from_env(cls) -> "PregenerationScheduler":
+        return cls(parse_cities(PREGEN_CITIES), parse_window(PREGEN_WINDOW))
+
+    # -- serving ---------------------------------------------------------
+
+    async def lookup(self, city: str, country_code: Optional[str]) -> Optional[Any]:
+        """The latest pre-generated result (JSON form) for a city, if it is fresh enough to serve."""
+        if not self.cities:
+            return None
+        entry = await self._results.get(_key(city, country_code))
+        if entry is None or time.time() - entry["generated_at"] > PREGEN_MAX_AGE_SECONDS:
+            return None
+        self.stats["served"] += 1
+        return entry["result"]
+
+    # -- lifecycle -------------------------------------------------------
+
+    async def start(self, generate: Generator) -> None:
+        self._generate = generate
+        if self._task is None and self.cities:
+            self._task = asyncio.create_task(self._run(), name="pregeneration-scheduler")
+            print(f"Pre-generation scheduler started for {len(self.cities)} cities.")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Provider calls made here queue behind interactive requests.
+                with priority_context(BATCH, tenant="pregeneration"):
+                    await self.tick()
+            except Exception as exc:
+                print(f"WARNING: Pre-generation tick failed: {exc}")
+            await asyncio.sleep(self.interval_seconds)
+
+    # -- one pass --------------------------------------------------------
+
+    def _in_window(self, city: str, country_code: str) -> bool:
+        if self.window is None:
+            return True
+        place = get_city_index().lookup(city, country_code)
+        now = local_now(place) if place else datetime.now()
+        minute = now.hour * 60 + now.minute
+        start, end = self.window
+        return start <= minute < end if start <= end else minute >= start or minute < end
+
+    def _take_run_budget(self) -> bool:
+        now = time.time()
+        while self._runs and now - self._runs[0] > 3600:
+            self._runs.popleft()
+        if len(self._runs) >= self.max_runs_per_hour:
+            return False
+        self._runs.append(now)
+        return True
+
+    async def _event_for(self, city: str, country_code: str) -> Optional[str]:
+        try:
+            # Strict: like mock weather, a failed search skips the city instead of caching the fallback text
+            return await self._events.get_or_compute(
+                _key(city, country_code), lambda: find_event(city, country_code, strict=True)
+            )
+        except Exception as exc:
+            print(f"WARNING: Pre-generation could not refresh events for {city}: {exc}")
+            return None
+
+    async def tick(self) -> None:
+        """Refreshes inputs for the cities in their off-peak window and regenerates changed ones."""
+        # One worker per interval does the pass; the lease expires just before the next one.
+        if not await self._leases.add("tick", os.getpid(), self.interval_seconds * 0.9):
+            self.stats["ticks_elsewhere"] += 1
+            return
+        self.stats["ticks"] += 1
+        self.stats["last_tick_at"] = time.time()
+        # The hourly run budget is shared too, whichever worker ran the previous passes.
+        self._runs = deque(await self._leases.get("runs") or [])
+        due = [location for location in self.cities if self._in_window(*location)]
+        if not due or self._generate is None:
+            return
+
+        weather_by_city = await get_weather_contexts(due)
+        for city, country_code in due:
+            weather = weather_by_city[(city, country_code)]
+            if weather.get("mock"):
+                continue  # Never pre-generate from placeholder weather
+            event = await self._event_for(city, country_code)
+            if event is None:
+                continue
+
+            fingerprint = input_fingerprint(weather, event)
+            current = await self._results.get(_key(city, country_code))
+            # Unchanged inputs are still refreshed past half the max age, so results
+            # made in one off-peak window stay servable until the next one.
+            if (
+                current is not None
+                and current["fingerprint"] == fingerprint
+                and time.time() - current["generated_at"] < PREGEN_MAX_AGE_SECONDS / 2
+            ):
+                self.stats["unchanged"] += 1
+                continue
+            if not self._take_run_budget():
+                self.stats["deferred_rate_limit"] += 1
+                return
+            await self._leases.set("runs", list(self._runs), 3600)
+
+            try:
+                result = await self._generate(city, country_code, weather, event)
+            except Exception as exc:
+                self.stats["failed"] += 1
+                print(f"WARNING: Pre-generation failed for {city}, {country_code}: {exc}")
+            else:
+                entry = Pregenerated(_jsonable(result), fingerprint, time.time())
+                await self._results.set(_key(city, country_code), asdict(entry))
+                self.stats["generated"] += 1
+            await asyncio.sleep(self.run_spacing_seconds)
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """Scheduler state of this worker, plus the age in seconds of each shared result."""
+        entries = await self._results.get_many(_key(*location) for location in self.cities)
+        now = time.time()
+        return {
+            "enabled": self._task is not None,
+            "cities": len(self.cities),
+            "window": PREGEN_WINDOW or None,
+            "runs_last_hour": len(self._runs),
+            "results": {
+                f"{city}, {country}": round(now - entries[_key(city, country)]["generated_at"])
+                for city, country in self.cities
+                if _key(city, country) in entries
+            },
+            **self.stats,
+        }
+
+
+_SCHEDULER: Optional[PregenerationScheduler] = None
+
+
+def get_scheduler() -> PregenerationScheduler:
+    """Returns the process-wide scheduler (empty city list unless PREGEN_ENABLED)."""
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        _SCHEDULER = PregenerationScheduler.from_env() if PREGEN_ENABLED else PregenerationScheduler()
+    return _SCHEDULER
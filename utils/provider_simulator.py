@@ -0,0 +1,522 @@
+"""In-process stand-ins for the external providers used by the marketing agent.
+
+Setting ``SIMULATE_PROVIDERS=True`` routes every outbound provider call (the
+TrueFoundry/OpenAI-compatible LLM gateway, Freepik, Linkup and OpenWeather)
+through :class:`ProviderSimulator` instead of the network, so every endpoint can
+be load tested offline without spending real quota.
+
+Each provider has a :class:`ProviderProfile` describing its latency
+distribution, error rate and rate limit. Defaults roughly match what we see in
+production and can be overridden per provider with environment variables, e.g.::
+
+    SIMULATOR_LLM_LATENCY_MS=2500
+    SIMULATOR_FREEPIK_RENDER_SECONDS=12
+    SIMULATOR_LINKUP_RATE_LIMIT_RPS=5
+    SIMULATOR_WEATHER_ERROR_RATE=0.02
+
+LLM latency can also be scaled per requested model, e.g.
+``SIMULATOR_LLM_MODEL_LATENCY=autonomous-marketer/gpt-5:1.0,autonomous-marketer/gpt-5-mini:0.3``.
+
+LLM requests with ``"stream": true`` are answered as server-sent events: the
+first token arrives after ``SIMULATOR_LLM_FIRST_TOKEN_SHARE`` of the sampled
+latency and the rest of the reply trickles in over the remainder, in the key
+order the prompt asks for.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import struct
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, fields, replace
+from datetime import date, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import httpx
+
+from config.settings import settings
+
+
+# --- 1. CONFIGURATION ---
+
+SIMULATE_PROVIDERS = settings.get_bool("SIMULATE_PROVIDERS", False)
+SIMULATED_API_KEY = "simulated-provider-key"
+SIMULATED_ASSET_HOST = "simulator.local"
+# Streamed LLM replies: share of the latency spent before the first token.
+SIMULATED_LLM_FIRST_TOKEN_SHARE = settings.get_float("SIMULATOR_LLM_FIRST_TOKEN_SHARE", 0.2)
+SIMULATED_LLM_CHUNK_CHARS = 16
+# Finished Freepik tasks can still be polled for this long, then they are forgotten.
+SIMULATED_TASK_RETENTION_SECONDS = 300
+
+
+@dataclass(frozen=True)
+class ProviderProfile:
+    """Latency, failure and throttling behaviour of one simulated provider."""
+
+    latency_ms: float  # Median response latency
+    jitter: float = 0.35  # Sigma of the log-normal latency distribution
+    error_rate: float = 0.0  # Fraction of requests answered with a 503
+    rate_limit_rps: float = 0.0  # Sustained requests/second before 429s (0 = unlimited)
+    burst: int = 10  # Token bucket size for the rate limiter
+    retry_after_seconds: float = 1.0  # Value of the Retry-After header on 429s
+    render_seconds: float = 0.0  # Freepik only: time until a task is COMPLETED
+
+
+DEFAULT_PROFILES: Dict[str, ProviderProfile] = {
+    "llm": ProviderProfile(latency_ms=1800, jitter=0.45),
+    "freepik": ProviderProfile(latency_ms=250, render_seconds=8.0),
+    "linkup": ProviderProfile(latency_ms=1200, jitter=0.4),
+    "weather": ProviderProfile(latency_ms=120, jitter=0.25),
+    "assets": ProviderProfile(latency_ms=40, jitter=0.2),
+}
+
+
+def _load_model_latency(spec: str) -> Dict[str, float]:
+    """Parses "model-a:1.0,model-b:0.3" into per-model LLM latency multipliers."""
+    factors = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, factor = item.rpartition(":")
+        try:
+            factors[model] = float(factor)
+        except ValueError:
+            print(f"WARNING: Ignoring invalid simulator model latency {item!r}")
+    return factors
+
+
+def _load_profile(name: str, default: ProviderProfile) -> ProviderProfile:
+    """Applies ``SIMULATOR_<PROVIDER>_<FIELD>`` overrides to a default profile."""
+    overrides: Dict[str, Any] = {}
+    for field in fields(ProviderProfile):
+        raw = settings.get(f"SIMULATOR_{name.upper()}_{field.name.upper()}")
+        if raw is None or raw == "":
+            continue
+        caster = int if field.type in ("int", int) else float
+        try:
+            overrides[field.name] = caster(raw)
+        except ValueError:
+            print(f"WARNING: Ignoring invalid simulator setting for {name}.{field.name}: {raw!r}")
+    return replace(default, **overrides) if overrides else default
+
+
+# --- 2. THE SIMULATOR ---
+
+class _TokenBucket:
+    """Thread-safe token bucket used to emulate provider rate limits."""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self._rate = rate
+        self._capacity = max(1, capacity)
+        self._tokens = float(self._capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        if self._rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class ProviderSimulator:
+    """Answers provider HTTP requests locally with configurable latency and failures."""
+
+    def __init__(
+        self,
+        profiles: Optional[Dict[str, ProviderProfile]] = None,
+        seed: Optional[int] = None,
+        model_latency: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.profiles = dict(profiles or DEFAULT_PROFILES)
+        self.model_latency = dict(model_latency or {})  # LLM latency multiplier per model
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._buckets = {
+            name: _TokenBucket(profile.rate_limit_rps, profile.burst)
+            for name, profile in self.profiles.items()
+        }
+        self._tasks: Dict[str, Tuple[float, int]] = {}
+        self._cities: Dict[int, Tuple[str, str]] = {}  # OpenWeather city id -> (name, country)
+        self._tasks_lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {
+            name: {"requests": 0, "throttled": 0, "errors": 0} for name in self.profiles
+        }
+
+    @classmethod
+    def from_env(cls) -> "ProviderSimulator":
+        profiles = {name: _load_profile(name, profile) for name, profile in DEFAULT_PROFILES.items()}
+        seed = settings.get("SIMULATOR_SEED")
+        model_latency = _load_model_latency(settings.get("SIMULATOR_LLM_MODEL_LATENCY", ""))
+        return cls(profiles, seed=int(seed) if seed else None, model_latency=model_latency)
+
+    # -- request handling --------------------------------------------------
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        """Synchronous entry point (used by ``httpx.Client`` callers)."""
+        request.read()
+        provider, rejection, delay = self._admit(request)
+        time.sleep(delay)
+        if rejection is None and provider == "llm" and _json_body(request).get("stream"):
+            events = self._llm_events(request)
+            return _event_stream_response(b"".join(events))
+        return rejection or self._respond(provider, request)
+
+    async def handle_async(self, request: httpx.Request) -> httpx.Response:
+        """Asynchronous entry point (used by the ``httpx.AsyncClient`` helpers)."""
+        await request.aread()
+        provider, rejection, delay = self._admit(request)
+        if rejection is None and provider == "llm" and _json_body(request).get("stream"):
+            first_token = delay * SIMULATED_LLM_FIRST_TOKEN_SHARE
+            await asyncio.sleep(first_token)
+            return _event_stream_response(_trickle(self._llm_events(request), delay - first_token))
+        await asyncio.sleep(delay)
+        return rejection or self._respond(provider, request)
+
+    def _admit(self, request: httpx.Request) -> Tuple[str, Optional[httpx.Response], float]:
+        """Routes a request and decides whether it is throttled, failed or served."""
+        provider = self._route(request)
+        if provider not in self.profiles:
+            return provider, _json_response(404, {"error": f"Unknown simulated endpoint {request.url}"}), 0.0
+
+        profile = self.profiles[provider]
+        counters = self.stats[provider]
+        counters["requests"] += 1
+
+        if not self._buckets[provider].try_acquire():
+            counters["throttled"] += 1
+            response = _json_response(429, {"error": "Too Many Requests (simulated)"})
+            response.headers["Retry-After"] = f"{profile.retry_after_seconds:g}"
+            return provider, response, 0.005
+
+        with self._random_lock:
+            failed = self._random.random() < profile.error_rate
+            latency = profile.latency_ms * math.exp(self._random.gauss(0.0, profile.jitter))
+        if provider == "llm" and self.model_latency:
+            latency *= self.model_latency.get(_json_body(request).get("model"), 1.0)
+        if failed:
+            counters["errors"] += 1
+            return provider, _json_response(503, {"error": "Service Unavailable (simulated)"}), latency / 1000.0
+        return provider, None, latency / 1000.0
+
+    @staticmethod
+    def _route(request: httpx.Request) -> str:
+        host = request.url.host
+        path = request.url.path
+        if path.endswith("/chat/completions"):
+            return "llm"
+        if host == "api.freepik.com":
+            return "freepik"
+        if host == "api.linkup.so":
+            return "linkup"
+        if host == "api.openweathermap.org":
+            return "weather"
+        if host == SIMULATED_ASSET_HOST:
+            return "assets"
+        return "unknown"
+
+    def _respond(self, provider: str, request: httpx.Request) -> httpx.Response:
+        handler = getattr(self, f"_respond_{provider}")
+        return handler(request)
+
+    # -- provider payloads -------------------------------------------------
+
+    def _llm_reply(self, request: httpx.Request) -> Tuple[Dict[str, Any], str, str]:
+        """(request body, prompt, completion text) for a chat completion request."""
+        body = _json_body(request)
+        messages = body.get("messages", [])
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        digest = _digest(prompt)
+        headline = _HEADLINES[digest % len(_HEADLINES)]
+        content = {
+            "headline": headline,
+            "body": (
+                "Slow-steeped for smooth, sustained energy, it fits wherever your day takes you. "
+                "Grab one on the way and make the moment yours."
+            ),
+            "tagline": _TAGLINES[digest % len(_TAGLINES)],
+            "image_keywords": ["cold brew can", "condensation", "city skyline", "pastel background", "morning light"],
+            "strategic_notes": "Simulated response: leans on local context and the recommended product.",
+            "confidence_score": 80 + digest % 20,
+            "ad_copy": f"{headline} Smooth energy, no crash, crafted for clarity.",
+            "generated_tagline": _TAGLINES[(digest // 7) % len(_TAGLINES)],
+        }
+
+        # Like a real model, answer in the key order the prompt's JSON template uses.
+        def position(key: str) -> int:
+            found = prompt.find(f'"{key}"')
+            return found if found >= 0 else len(prompt)
+
+        ordered = {key: content[key] for key in sorted(content, key=position)}
+        return body, prompt, json.dumps(ordered)
+
+    def _respond_llm(self, request: httpx.Request) -> httpx.Response:
+        body, prompt, completion_text = self._llm_reply(request)
+        return _json_response(200, {
+            "id": f"chatcmpl-sim-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "simulated"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": completion_text},
+                "finish_reason": "stop",
+            }],
+            "usage": _llm_usage(prompt, completion_text),
+        })
+
+    def _llm_events(self, request: httpx.Request) -> List[bytes]:
+        """The reply as ``chat.completion.chunk`` server-sent events, ending with usage and [DONE]."""
+        body, prompt, completion_text = self._llm_reply(request)
+        chunk_id = f"chatcmpl-sim-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "simulated")
+
+        def event(choices: List[Dict[str, Any]], usage: Optional[Dict[str, int]] = None) -> bytes:
+            chunk = {
+                "id": chunk_id, "object": "chat.completion.chunk", "created": created,
+                "model": model, "choices": choices, "usage": usage,
+            }
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        events = [event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])]
+        for start in range(0, len(completion_text), SIMULATED_LLM_CHUNK_CHARS):
+            piece = completion_text[start:start + SIMULATED_LLM_CHUNK_CHARS]
+            events.append(event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+        events.append(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append(event([], _llm_usage(prompt, completion_text)))
+        events.append(b"data: [DONE]\n\n")
+        return events
+
+    def _respond_freepik(self, request: httpx.Request) -> httpx.Response:
+        profile = self.profiles["freepik"]
+        if request.method == "POST":
+            body = _json_body(request)
+            task_id = str(uuid.uuid4())
+            now = time.monotonic()
+            with self._tasks_lock:
+                self._prune_tasks(now)
+                self._tasks[task_id] = (now + profile.render_seconds, int(body.get("num_images", 1)))
+            return _json_response(200, {"data": {"task_id": task_id, "status": "CREATED", "generated": []}})
+
+        task_id = request.url.path.rstrip("/").rsplit("/", 1)[-1]
+        with self._tasks_lock:
+            task = self._tasks.get(task_id)
+        if task is None:
+            return _json_response(404, {"message": f"Task {task_id} not found (simulated)"})
+
+        ready_at, num_images = task
+        if time.monotonic() < ready_at:
+            return _json_response(200, {"data": {"task_id": task_id, "status": "IN_PROGRESS", "generated": []}})
+        generated = [f"https://{SIMULATED_ASSET_HOST}/freepik/{task_id}-{index}.png" for index in range(num_images)]
+        return _json_response(200, {"data": {"task_id": task_id, "status": "COMPLETED", "generated": generated}})
+
+    def _prune_tasks(self, now: float) -> None:
+        # Oldest first: with a fixed render time, submission order is also ready order.
+        while self._tasks:
+            task_id, (ready_at, _) = next(iter(self._tasks.items()))
+            if now - ready_at < SIMULATED_TASK_RETENTION_SECONDS:
+                break
+            del self._tasks[task_id]
+
+    def _respond_linkup(self, request: httpx.Request) -> httpx.Response:
+        body = _json_body(request)
+        query = str(body.get("q", ""))
+        if body.get("outputType") == "structured":
+            return _json_response(200, _linkup_events(query, body.get("fromDate"), body.get("toDate")))
+        event = _EVENTS[_digest(query) % len(_EVENTS)]
+        return _json_response(200, {
+            "answer": f"{event} is expected to draw large crowds over the coming weeks (simulated result).",
+            "sources": [{"name": "Simulated listings", "url": f"https://{SIMULATED_ASSET_HOST}/events", "snippet": event}],
+        })
+
+    def _respond_weather(self, request: httpx.Request) -> httpx.Response:
+        params = parse_qs(request.url.query.decode())
+        if request.url.path.endswith("/group"):
+            # Multi-city lookup by id (``/group?id=1,2,3``); unknown ids are omitted like upstream.
+            ids = [int(value) for value in params.get("id", [""])[0].split(",") if value.strip().isdigit()]
+            with self._tasks_lock:
+                known = [(city_id, self._cities[city_id]) for city_id in ids if city_id in self._cities]
+            cities = [_weather_payload(city_id, city, country) for city_id, (city, country) in known]
+            return _json_response(200, {"cnt": len(cities), "list": cities})
+
+        location = params.get("q", ["Unknown"])[0]
+        city, _, country = location.partition(",")
+        city_id = _digest(location.lower()) % 9_000_000 + 1_000_000
+        with self._tasks_lock:
+            self._cities[city_id] = (city, country)
+        return _json_response(200, _weather_payload(city_id, city, country))
+
+    def _respond_assets(self, request: httpx.Request) -> httpx.Response:
+        png = _solid_png(_digest(request.url.path))
+        return httpx.Response(200, content=png, headers={"Content-Type": "image/png"})
+
+
+# --- 3. HTTPX TRANSPORT ---
+
+class SimulatorTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """httpx transport (sync and async) that serves requests from a simulator."""
+
+    def __init__(self, simulator: ProviderSimulator) -> None:
+        self.simulator = simulator
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.simulator.handle(request)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.simulator.handle_async(request)
+
+
+_SIMULATOR: Optional[ProviderSimulator] = None
+
+
+def get_simulator() -> ProviderSimulator:
+    """Returns the process-wide simulator, configured from the environment."""
+    global _SIMULATOR
+    if _SIMULATOR is None:
+        _SIMULATOR = ProviderSimulator.from_env()
+    return _SIMULATOR
+
+
+# --- 4. CANNED CONTENT ---
+
+_HEADLINES = [
+    "Your City, Perfectly Chilled.",
+    "Fuel the Moment That Matters.",
+    "Smooth Energy for Every Season.",
+    "Steeped Slow, Made for Now.",
+]
+_TAGLINES = [
+    "Elevate Your Moment",
+    "Brewed for the Way You Move",
+    "Cool Clarity, Anytime",
+    "Your Daily Ritual, Perfected",
+]
+_EVENTS = [
+    "The annual city food and wine festival",
+    "A weekend-long outdoor music festival in the central park",
+    "The international marathon finishing downtown",
+    "A riverside lantern and light festival",
+]
+_VENUES = ["the convention centre", "the central park", "the waterfront", "the old town square"]
+_CONDITIONS = [
+    ("Clear", "clear sky"),
+    ("Clouds", "scattered clouds"),
+    ("Rain", "light rain"),
+    ("Snow", "light snow"),
+]
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "big")
+
+
+def _json_body(request: httpx.Request) -> Dict[str, Any]:
+    try:
+        return json.loads(request.content or b"{}")
+    except ValueError:
+        return {}
+
+
+def _json_response(status_code: int, payload: Dict[str, Any]) -> httpx.Response:
+    return httpx.Response(status_code, json=payload)
+
+
+def _event_stream_response(content: Any) -> httpx.Response:
+    return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=content)
+
+
+async def _trickle(events: List[bytes], seconds: float) -> AsyncIterator[bytes]:
+    """Yields the events spread evenly over ``seconds``, like tokens arriving from a model."""
+    pause = seconds / max(len(events) - 1, 1)
+    for index, event in enumerate(events):
+        if index:
+            await asyncio.sleep(pause)
+        yield event
+
+
+def _llm_usage(prompt: str, completion_text: str) -> Dict[str, int]:
+    return {
+        "prompt_tokens": len(prompt) // 4,
+        "completion_tokens": len(completion_text) // 4,
+        "total_tokens": (len(prompt) + len(completion_text)) // 4,
+    }
+
+
+def _linkup_events(query: str, from_date: Optional[str], to_date: Optional[str]) -> Dict[str, Any]:
+    """Structured event search result: 2-3 events inside [fromDate, toDate]; deterministic per query."""
+    seed = _digest(query)
+    try:
+        start = date.fromisoformat(from_date) if from_date else date.today()
+        end = date.fromisoformat(to_date) if to_date else start + timedelta(days=60)
+    except ValueError:
+        start, end = date.today(), date.today() + timedelta(days=60)
+    span = max((end - start).days, 0)
+    events = []
+    for index in range(2 + seed % 2):
+        first_day = start + timedelta(days=(seed // (index + 3)) % (span + 1))
+        last_day = min(first_day + timedelta(days=(seed >> index) % 3), end)
+        events.append({
+            "name": _EVENTS[(seed + index) % len(_EVENTS)].replace("The ", "", 1).replace("A ", "", 1).capitalize(),
+            "start_date": first_day.isoformat(),
+            "end_date": last_day.isoformat(),
+            "venue": _VENUES[(seed // 5 + index) % len(_VENUES)],
+            "expected_audience": 5000 * (1 + (seed >> (index * 4)) % 20),
+            "source_url": f"https://{SIMULATED_ASSET_HOST}/events/{(seed + index) % 10000}",
+        })
+    return {"events": events}
+
+
+def _weather_payload(city_id: int, city: str, country: str) -> Dict[str, Any]:
+    """Current-weather payload for a city; deterministic per city id."""
+    seed = _digest(str(city_id))
+    condition, description = _CONDITIONS[seed % len(_CONDITIONS)]
+    return {
+        "id": city_id,
+        "name": city,
+        "main": {"temp": round(-5 + (seed % 400) / 10, 1), "humidity": 40 + seed % 50},
+        "weather": [{"main": condition, "description": description}],
+        "sys": {"country": country},
+    }
+
+
+def _solid_png(seed: int, size: int = 64) -> bytes:
+    """Builds a tiny solid-colour PNG so image downloads have real bytes to move."""
+    color = bytes(((seed >> shift) & 0xFF) for shift in (0, 8, 16))
+    raw = b"".join(b"\x00" + color * size for _ in range(size))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+# --- 5. STANDALONE TEST ---
+
+if __name__ == "__main__":
+    async def _smoke_test() -> None:
+        transport = SimulatorTransport(ProviderSimulator(seed=7))
+        async with httpx.AsyncClient(transport=transport) as client:
+            weather = await client.get(
+                "https://api.openweathermap.org/data/2.5/weather", params={"q": "Sydney,AU"}
+            )
+            print(f"Weather: {weather.status_code} {weather.json()}")
+            search = await client.post("https://api.linkup.so/v1/search", json={"q": "events in Sydney"})
+            print(f"Linkup: {search.status_code} {search.json()['answer']}")
+        print(f"Stats: {transport.simulator.stats}")
+
+    asyncio.run(_smoke_test())
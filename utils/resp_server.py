@@ -0,0 +1,162 @@
+"""Minimal in-memory server speaking the Redis protocol (RESP2).
+
+A stand-in for Redis when testing ``CACHE_BACKEND=redis`` locally or in CI.
+It implements only the commands the shared cache uses, plus a few handy ones
+(PING, GET, MGET, SET with EX/PX/NX/XX, DEL, EXISTS, DBSIZE, FLUSHDB/FLUSHALL,
+SELECT, AUTH, QUIT). EVAL runs no Lua: it only accepts the cache's
+compare-and-delete script (``utils.cache.RELEASE_SCRIPT``). Data lives in one
+dict and is lost on exit. Do not use it in production.
+
+Run it with::
+
+    python -m utils.resp_server --port 6379
+
+and point the app at it with ``CACHE_BACKEND=redis CACHE_URL=redis://localhost:6379/0``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# The only script EVAL accepts: delete KEYS[1] if it holds ARGV[1] (same text as utils.cache).
+RELEASE_SCRIPT = (
+    b"if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end"
+)
+
+
+class RespServer:
+    """Asyncio TCP server; one shared keyspace (SELECT is accepted but ignored)."""
+
+    def __init__(self) -> None:
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.commands = 0
+
+    # -- protocol --------------------------------------------------------
+
+    @staticmethod
+    def _encode(reply: Any) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, Exception):
+            return f"-ERR {reply}\r\n".encode("utf-8")
+        if isinstance(reply, str):
+            return f"+{reply}\r\n".encode("utf-8")
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, bytes):
+            return b"$%d\r\n%s\r\n" % (len(reply), reply)
+        return b"*%d\r\n" % len(reply) + b"".join(RespServer._encode(item) for item in reply)
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.strip().split()  # Inline command, e.g. typed via telnet
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if not command:
+                    break
+                self.commands += 1
+                name = command[0].decode("utf-8").upper()
+                writer.write(self._encode(self.execute(name, command[1:])))
+                await writer.drain()
+                if name == "QUIT":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # -- commands --------------------------------------------------------
+
+    def _live(self, key: bytes) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _set(self, args: List[bytes]) -> Any:
+        key, value, options = args[0], args[1], [arg.decode("utf-8").upper() for arg in args[2:]]
+        expires_at = None
+        if "EX" in options:
+            expires_at = time.monotonic() + float(options[options.index("EX") + 1])
+        if "PX" in options:
+            expires_at = time.monotonic() + float(options[options.index("PX") + 1]) / 1000
+        exists = self._live(key) is not None
+        if ("NX" in options and exists) or ("XX" in options and not exists):
+            return None
+        self._data[key] = (value, expires_at)
+        return "OK"
+
+    def _eval(self, args: List[bytes]) -> Any:
+        script, key_count = args[0], int(args[1])
+        if script != RELEASE_SCRIPT or key_count != 1:
+            return ValueError("only the cache's compare-and-delete script is supported")
+        key, expected = args[2], args[3]
+        if self._live(key) != expected:
+            return 0
+        del self._data[key]
+        return 1
+
+    def execute(self, name: str, args: List[bytes]) -> Any:
+        try:
+            if name == "PING":
+                return args[0] if args else "PONG"
+            if name in ("AUTH", "SELECT", "QUIT"):
+                return "OK"
+            if name == "GET":
+                return self._live(args[0])
+            if name == "MGET":
+                return [self._live(key) for key in args]
+            if name == "SET":
+                return self._set(args)
+            if name == "DEL":
+                return sum(self._data.pop(key, None) is not None for key in args)
+            if name == "EVAL":
+                return self._eval(args)
+            if name == "EXISTS":
+                return sum(self._live(key) is not None for key in args)
+            if name == "DBSIZE":
+                return sum(self._live(key) is not None for key in list(self._data))
+            if name in ("FLUSHDB", "FLUSHALL"):
+                self._data.clear()
+                return "OK"
+            return ValueError(f"unknown command '{name}'")
+        except (IndexError, ValueError) as exc:
+            return ValueError(f"wrong arguments for '{name}': {exc}")
+
+
+async def serve(host: str = "127.0.0.1", port: int = 6379) -> None:
+    server = RespServer()
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"RESP stand-in listening on {host}:{port} (Ctrl+C to stop)")
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    options = parser.parse_args()
+    try:
+        asyncio.run(serve(options.host, options.port))
+    except KeyboardInterrupt:
+        pass
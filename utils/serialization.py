@@ -0,0 +1,245 @@
+"""Fast JSON responses, response compression and field projection.
+
+Campaign payloads are mostly long strings (competitor analysis, event text,
+body copy), repeated for every demographic segment. Three pieces keep them
+cheap to send:
+
+- :class:`FastJSONResponse` encodes with orjson (falling back to the standard
+  library when it is not installed). Endpoints that assemble their responses
+  from data they already validated return it directly, so FastAPI does not
+  validate and re-encode the payload a second time.
+- :class:`CompressionMiddleware` compresses JSON and text responses with
+  brotli (when the optional ``brotli`` package is installed and the client
+  accepts it) or gzip. Unlike Starlette's ``GZipMiddleware`` it leaves images,
+  ranged file responses and event streams alone.
+- :func:`parse_fields` and :func:`project` implement ``?fields=`` projections,
+  e.g. ``fields=id,city,campaign.headline`` for list views that do not need
+  the heavy text.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import typing
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config.settings import settings
+
+try:
+    import orjson
+except ImportError:  # Standard-library encoder; same output, slower
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+
+# --- 1. CONFIGURATION ---
+
+COMPRESSION_ENABLED = settings.get_bool("COMPRESSION_ENABLED", True)
+# Smaller bodies are sent as-is; compressing them costs more than it saves.
+COMPRESSION_MIN_BYTES = settings.get_int("COMPRESSION_MIN_BYTES", 1024)
+GZIP_LEVEL = settings.get_int("GZIP_LEVEL", 6)
+BROTLI_QUALITY = settings.get_int("BROTLI_QUALITY", 5)
+
+_COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/csv")
+
+# Nested dicts of selected field names; None selects the whole value.
+FieldTree = Dict[str, Optional["FieldTree"]]
+
+
+# --- 2. ENCODING ---
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON for dicts, lists and pydantic models (no validation)."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with :func:`dumps`; accepts pydantic models as content."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# --- 3. FIELD PROJECTION ---
+
+def _model_in(annotation: Any) -> Optional[type]:
+    """The pydantic model inside ``Model``, ``Optional[Model]`` or ``List[Model]``, if any."""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in typing.get_args(annotation):
+        model = _model_in(arg)
+        if model is not None:
+            return model
+    return None
+
+
+def parse_fields(spec: Optional[str], model: Optional[type] = None) -> Optional[FieldTree]:
+    """
+    Parses ``"city,season,campaigns.headline"`` into a :data:`FieldTree`.
+
+    Args:
+        spec: Comma-separated field paths; nested fields use dots. Empty means all fields.
+        model: Optional pydantic model the paths are checked against. Free-form
+            dict fields (e.g. ``Dict[str, Any]``) accept any nested name.
+
+    Returns:
+        The field tree, or None when every field is wanted.
+
+    Raises:
+        ValueError: If a path names a field the model does not have.
+    """
+    paths = [path.strip() for path in (spec or "").split(",") if path.strip()]
+    if not paths:
+        return None
+    tree: FieldTree = {}
+    for path in paths:
+        node, current = tree, model
+        parts = path.split(".")
+        for depth, name in enumerate(parts):
+            if current is not None:
+                field = current.model_fields.get(name)
+                if field is None:
+                    known = ", ".join(current.model_fields)
+                    raise ValueError(f"Unknown field '{'.'.join(parts[:depth + 1])}'. Available: {known}")
+                current = _model_in(field.annotation)
+            if depth == len(parts) - 1:
+                node[name] = None
+            elif node.get(name, {}) is None:
+                break  # The whole parent is already selected
+            else:
+                node = node.setdefault(name, {})
+    return tree
+
+
+def project(content: Any, fields: Optional[FieldTree]) -> Any:
+    """
+    Keeps only the selected fields of a dict, model or list of them.
+
+    Lists are projected item by item, so ``campaigns.headline`` selects the
+    headline of every campaign. Fields missing from the content are skipped.
+    """
+    if fields is None:
+        return content
+    if isinstance(content, BaseModel):
+        content = content.model_dump()
+    if isinstance(content, list):
+        return [project(item, fields) for item in content]
+    if not isinstance(content, dict):
+        return content
+    return {name: project(content[name], sub) for name, sub in fields.items() if name in content}
+
+
+# --- 4. COMPRESSION ---
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Picks "br" or "gzip" from an Accept-Encoding header (None = send uncompressed)."""
+    accepted: Dict[str, float] = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _compressible(headers: Union[Headers, MutableHeaders]) -> bool:
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    return (
+        content_type.startswith(_COMPRESSIBLE_TYPES)
+        and "content-encoding" not in headers
+        and "content-range" not in headers
+    )
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing JSON and text responses of at least ``minimum_size`` bytes.
+
+    The body is buffered until complete (campaign payloads are a few dozen KB),
+    then sent in one piece with ``Content-Encoding`` and ``Vary: Accept-Encoding``.
+    Other content types are passed through untouched as they stream.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.stats = {"compressed": 0, "bytes_in": 0, "bytes_out": 0}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                if _compressible(Headers(raw=message["headers"])):
+                    start = message  # Held until the body is complete
+                else:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) >= self.minimum_size:
+                compressed = compress(body, encoding)
+                self.stats["compressed"] += 1
+                self.stats["bytes_in"] += len(body)
+                self.stats["bytes_out"] += len(compressed)
+                body = compressed
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
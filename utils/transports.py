@@ -0,0 +1,50 @@
+"""Selects the HTTP transport used for outbound provider calls.
+
+Every provider helper builds its ``httpx`` clients with the transports returned
+here, so switching the whole app to a stand-in is a single setting rather than
+a change at each call site:
+
+- ``SIMULATE_PROVIDERS=True`` serves traffic from ``provider_simulator``.
+- ``CASSETTE_MODE=record`` tees real (or simulated) traffic into a cassette.
+- ``CASSETTE_MODE=replay`` serves traffic from a cassette with no network access.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+import httpx
+
+from utils.cassettes import CASSETTE_MODE, RecordingTransport, ReplayTransport, get_cassette
+from utils.provider_simulator import SIMULATE_PROVIDERS, SIMULATED_API_KEY, SimulatorTransport, get_simulator
+
+# True when no real provider is contacted, so real credentials are not required.
+OFFLINE_PROVIDERS = SIMULATE_PROVIDERS or CASSETTE_MODE == "replay"
+
+
+def resolve_api_key(value: Optional[str]) -> Optional[str]:
+    """Returns a placeholder key when providers are offline so no real credentials are needed."""
+    if value:
+        return value
+    return SIMULATED_API_KEY if OFFLINE_PROVIDERS else value
+
+
+def get_async_transport() -> Optional[httpx.AsyncBaseTransport]:
+    """Transport for ``httpx.AsyncClient``; ``None`` means the real network."""
+    if CASSETTE_MODE == "replay":
+        return ReplayTransport(get_cassette())
+    inner = SimulatorTransport(get_simulator()) if SIMULATE_PROVIDERS else None
+    if CASSETTE_MODE == "record":
+        return RecordingTransport(get_cassette(), inner or httpx.AsyncHTTPTransport())
+    return inner
+
+
+def get_sync_transport() -> Optional[httpx.BaseTransport]:
+    """Transport for ``httpx.Client`` (e.g. the OpenAI SDK); ``None`` means the real network."""
+    if CASSETTE_MODE == "replay":
+        return ReplayTransport(get_cassette())
+    inner = SimulatorTransport(get_simulator()) if SIMULATE_PROVIDERS else None
+    if CASSETTE_MODE == "record":
+        return RecordingTransport(get_cassette(), inner or httpx.HTTPTransport())
+    return inner
+
@@ -1,17 +1,28 @@
-import os
 import asyncio
 import httpx
-from dotenv import load_dotenv
-from typing import Dict, Any, Optional
-from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 
-# --- 1. CONFIGURATION ---
+from config.settings import settings
+from utils.cache import SharedCache
+from utils.geocoding import get_city_index, local_month
+from utils.transports import get_async_transport, resolve_api_key
 
-load_dotenv()
+# --- 1. CONFIGURATION ---
 
 # Using OpenWeatherMap API (free tier available)
-WEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+WEATHER_API_KEY = resolve_api_key(settings.get("OPENWEATHER_API_KEY"))
 WEATHER_API_BASE = "https://api.openweathermap.org/data/2.5"
+WEATHER_CACHE_TTL_SECONDS = settings.get_float("WEATHER_CACHE_TTL_SECONDS", 600)
+WEATHER_MAX_CONCURRENCY = settings.get_int("WEATHER_MAX_CONCURRENCY", 8)
+WEATHER_GROUP_CHUNK_SIZE = 20  # OpenWeather's /group endpoint accepts at most 20 city ids
+
+Location = Tuple[str, Optional[str]]
+
+# Current conditions per city, and OpenWeather city ids (which never change), keyed
+# "city|CC" and shared between workers when CACHE_BACKEND is file or redis.
+_WEATHER_CACHE = SharedCache("weather", ttl_seconds=WEATHER_CACHE_TTL_SECONDS)
+_CITY_IDS = SharedCache("weather-city-id", ttl_seconds=30 * 24 * 3600)
 
 
 # --- 2. WEATHER DATA FUNCTIONS ---
@@ -26,62 +37,182 @@ async def get_weather_context(city: str, country_code: Optional[str] = None) ->
     
     Returns:
         Dictionary containing weather data and seasonal context
+        (cached per city for WEATHER_CACHE_TTL_SECONDS; concurrent misses for
+        the same city make a single OpenWeather call)
     """
     if not WEATHER_API_KEY:
         print("WARNING: OPENWEATHER_API_KEY not found. Using mock weather data.")
         return _get_mock_weather(city, country_code)
     
-    location = f"{city},{country_code}" if country_code else city
-    
+    key = _location_key(city, country_code)
+
+    async def fetch() -> Dict[str, Any]:
+        async with httpx.AsyncClient(timeout=30.0, transport=get_async_transport()) as client:
+            data = await _fetch_current(client, city, country_code)
+        if "id" in data:
+            await _CITY_IDS.set(key, data["id"])
+        return _build_weather_context(city, country_code, data)
+
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Get current weather
-            weather_url = f"{WEATHER_API_BASE}/weather"
-            params = {
-                "q": location,
-                "appid": WEATHER_API_KEY,
-                "units": "metric"
-            }
-            
-            response = await client.get(weather_url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Extract relevant information
-            temp_celsius = data["main"]["temp"]
-            temp_fahrenheit = (temp_celsius * 9/5) + 32
-            weather_desc = data["weather"][0]["description"]
-            weather_main = data["weather"][0]["main"]
-            humidity = data["main"]["humidity"]
-            
-            # Determine season based on hemisphere and month
-            month = datetime.now().month
-            is_southern = _is_southern_hemisphere(country_code)
-            season = _get_season(month, is_southern)
-            
-            return {
-                "city": city,
-                "country_code": country_code,
-                "temperature_celsius": round(temp_celsius, 1),
-                "temperature_fahrenheit": round(temp_fahrenheit, 1),
-                "weather_description": weather_desc,
-                "weather_main": weather_main,
-                "humidity": humidity,
-                "season": season,
-                "hemisphere": "southern" if is_southern else "northern",
-                "context": _generate_weather_context(temp_celsius, weather_main, season)
-            }
-            
+        context = await _WEATHER_CACHE.get_or_compute(key, fetch)
     except httpx.HTTPStatusError as e:
         print(f"Weather API Error: {e.response.status_code}")
         return _get_mock_weather(city, country_code)
     except Exception as e:
         print(f"Error fetching weather: {e}")
         return _get_mock_weather(city, country_code)
+    return {**context, "city": city, "country_code": country_code}
+
+
+async def get_weather_contexts(locations: Iterable[Location]) -> Dict[Location, Dict[str, Any]]:
+    """
+    Fetches weather and seasonal context for many cities at once.
+    
+    Cached cities are answered from the cache. Cities with a known OpenWeather id
+    are fetched with the multi-city ``/group`` endpoint, 20 ids per call; the
+    rest are looked up individually once, which also records their id for the
+    next batch. All results are written to the cache in one pass.
+    
+    Args:
+        locations: (city, country_code) pairs, e.g. [("Sydney", "AU"), ("London", "GB")]
+    
+    Returns:
+        Dictionary mapping each requested pair to the same structure as
+        get_weather_context (mock data for cities that could not be fetched)
+    """
+    requested = list(dict.fromkeys((city, country_code) for city, country_code in locations))
+    if not WEATHER_API_KEY:
+        print("WARNING: OPENWEATHER_API_KEY not found. Using mock weather data.")
+        return {location: _get_mock_weather(*location) for location in requested}
+
+    keys = {location: _location_key(*location) for location in requested}
+    contexts = await _WEATHER_CACHE.get_many(set(keys.values()))
+    missing = {key: location for location, key in keys.items() if key not in contexts}
+
+    if missing:
+        payloads = await _fetch_many(missing)
+        fetched = {
+            key: _build_weather_context(*missing[key], data) for key, data in payloads.items()
+        }
+        await _WEATHER_CACHE.set_many(fetched)
+        await _CITY_IDS.set_many({key: data["id"] for key, data in payloads.items() if "id" in data})
+        contexts.update(fetched)
+
+    results = {}
+    for location, key in keys.items():
+        context = contexts.get(key)
+        if context is None:
+            results[location] = _get_mock_weather(*location)
+        else:
+            results[location] = {**context, "city": location[0], "country_code": location[1]}
+    return results
+
+
+async def _fetch_many(missing: Dict[str, Location]) -> Dict[str, Dict[str, Any]]:
+    """Raw OpenWeather payloads for the given cache keys (failed cities are left out)."""
+    semaphore = asyncio.Semaphore(WEATHER_MAX_CONCURRENCY)
+    known_ids = await _CITY_IDS.get_many(missing)
+    keys_by_id = {city_id: key for key, city_id in known_ids.items()}
+    ids = list(keys_by_id)
+    chunks = [ids[i:i + WEATHER_GROUP_CHUNK_SIZE] for i in range(0, len(ids), WEATHER_GROUP_CHUNK_SIZE)]
+    payloads: Dict[str, Dict[str, Any]] = {}
+
+    async def fetch_group(client: httpx.AsyncClient, chunk: List[int]) -> None:
+        async with semaphore:
+            try:
+                response = await client.get(
+                    f"{WEATHER_API_BASE}/group",
+                    params={"id": ",".join(map(str, chunk)), "appid": WEATHER_API_KEY, "units": "metric"},
+                )
+                response.raise_for_status()
+                entries = response.json().get("list", [])
+            except Exception as e:
+                print(f"Error fetching weather for {len(chunk)} cities: {e}")
+                return
+        for data in entries:
+            key = keys_by_id.get(data.get("id"))
+            if key is not None:
+                payloads[key] = data
+
+    async def fetch_one(client: httpx.AsyncClient, key: str) -> None:
+        async with semaphore:
+            try:
+                payloads[key] = await _fetch_current(client, *missing[key])
+            except Exception as e:
+                print(f"Error fetching weather for {missing[key][0]}: {e}")
+
+    async with httpx.AsyncClient(timeout=30.0, transport=get_async_transport()) as client:
+        unresolved = [key for key in missing if key not in known_ids]
+        await asyncio.gather(
+            *(fetch_group(client, chunk) for chunk in chunks),
+            *(fetch_one(client, key) for key in unresolved),
+        )
+        # Ids the group endpoint did not answer for are looked up by name instead.
+        leftovers = [key for key in known_ids if key not in payloads]
+        if leftovers:
+            await asyncio.gather(*(fetch_one(client, key) for key in leftovers))
+    return payloads
+
+
+async def _fetch_current(client: httpx.AsyncClient, city: str, country_code: Optional[str]) -> Dict[str, Any]:
+    """Current weather for one city from OpenWeather's ``/weather`` endpoint."""
+    location = f"{city},{country_code}" if country_code else city
+    params = {
+        "q": location,
+        "appid": WEATHER_API_KEY,
+        "units": "metric"
+    }
+    response = await client.get(f"{WEATHER_API_BASE}/weather", params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+def _location_key(city: str, country_code: Optional[str]) -> str:
+    return f"{city.strip().lower()}|{country_code.upper() if country_code else ''}"
+
+
+def _build_weather_context(city: str, country_code: Optional[str], data: Dict[str, Any]) -> Dict[str, Any]:
+    """Turns an OpenWeather current-weather payload into the weather context structure."""
+    is_southern, month = _hemisphere_and_month(city, country_code, data)
+    season = _get_season(month, is_southern)
+    temp_celsius = data["main"]["temp"]
+    temp_fahrenheit = (temp_celsius * 9/5) + 32
+    weather_main = data["weather"][0]["main"]
+    
+    return {
+        "city": city,
+        "country_code": country_code,
+        "temperature_celsius": round(temp_celsius, 1),
+        "temperature_fahrenheit": round(temp_fahrenheit, 1),
+        "weather_description": data["weather"][0]["description"],
+        "weather_main": weather_main,
+        "humidity": data["main"]["humidity"],
+        "season": season,
+        "hemisphere": "southern" if is_southern else "northern",
+        "context": _generate_weather_context(temp_celsius, weather_main, season)
+    }
+
+
+def _hemisphere_and_month(
+    city: str, country_code: Optional[str], data: Optional[Dict[str, Any]] = None
+) -> Tuple[bool, int]:
+    """
+    Whether the city is south of the equator, and its current local month.
+    
+    Uses the city's coordinates and timezone from the geocoding index, then
+    OpenWeather's ``coord``/``timezone`` fields, then the country list below.
+    """
+    place = get_city_index().lookup(city, country_code)
+    if place is not None:
+        return place.lat < 0, local_month(place)
+    if data and "coord" in data and "timezone" in data:
+        local_time = datetime.now(timezone.utc) + timedelta(seconds=data["timezone"])
+        return data["coord"]["lat"] < 0, local_time.month
+    return _is_southern_hemisphere(country_code), datetime.now().month
 
 
 def _is_southern_hemisphere(country_code: Optional[str]) -> bool:
-    """Determines if a country is in the southern hemisphere."""
+    """Fallback for cities missing from the geocoding index: countries mostly south of the equator."""
     southern_countries = ["AU", "NZ", "ZA", "AR", "BR", "CL", "UY", "PY", "BO", "PE"]
     return country_code in southern_countries if country_code else False
 
@@ -110,6 +241,19 @@ def _get_season(month: int, is_southern: bool) -> str:
             return "spring"
 
 
+def temperature_bucket(temp: float) -> str:
+    """Coarse temperature band used to index and compare campaign inputs."""
+    if temp < 5:
+        return "freezing"
+    elif temp < 15:
+        return "cold"
+    elif temp < 25:
+        return "mild"
+    elif temp < 30:
+        return "warm"
+    return "hot"
+
+
 def _generate_weather_context(temp: float, weather: str, season: str) -> str:
     """Generates marketing-relevant weather context."""
     contexts = []
@@ -144,8 +288,7 @@ def _generate_weather_context(temp: float, weather: str, season: str) -> str:
 
 def _get_mock_weather(city: str, country_code: Optional[str]) -> Dict[str, Any]:
     """Returns mock weather data for testing/fallback."""
-    month = datetime.now().month
-    is_southern = _is_southern_hemisphere(country_code)
+    is_southern, month = _hemisphere_and_month(city, country_code)
     season = _get_season(month, is_southern)
     
     # Mock data based on typical conditions
@@ -194,5 +337,11 @@ if __name__ == "__main__":
             print(f"  Season: {weather['season']} ({weather['hemisphere']} hemisphere)")
             print(f"  Context: {weather['context']}")
             print()
+        
+        # Bulk lookup: New York, Sydney and London now come from the cache
+        batch = await get_weather_contexts(locations + [("Tokyo", "JP"), ("Cape Town", "ZA")])
+        print(f"Bulk lookup for {len(batch)} cities:")
+        for (city, country), weather in batch.items():
+            print(f"  {city}, {country}: {weather['temperature_celsius']}°C, {weather['season']}")
     
     asyncio.run(test_weather())